@@ -1,7 +1,69 @@
-from django.contrib import admin
-from .models import Course, Student, Attendance, Fee
+from django.contrib import admin, messages
+from django.shortcuts import redirect, render
+from django.urls import path
 
-admin.site.register(Course)
-admin.site.register(Student)
+from . import importer, jobs
+from .models import Course, Student, Attendance, Fee, FeeSchedule, Job, WaitlistEntry
+
+
+class StudentAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/coaching/student/change_list.html'
+    list_display = ('name', 'email', 'phone')
+    search_fields = ('name', 'email')
+
+    def get_urls(self):
+        urls = [path('import/', self.admin_site.admin_view(self.import_view), name='coaching_student_import')]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            return redirect('admin:coaching_student_changelist')
+        report = None
+        if request.method == 'POST' and request.FILES.get('file'):
+            upload = request.FILES['file']
+            try:
+                report = importer.import_students(importer.read_rows(upload.file, upload.name))
+            except importer.ImportFileError as exc:
+                messages.error(request, str(exc))
+            else:
+                level = messages.WARNING if report.error_count or report.waitlisted else messages.SUCCESS
+                messages.add_message(request, level, str(report))
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import students',
+            'report': report,
+            'columns': importer.COLUMNS,
+        }
+        return render(request, 'admin/coaching/student/import.html', context)
+
+
+class CourseAdmin(admin.ModelAdmin):
+
+    def save_model(self, request, obj, form, change):
+        # Only the edited fields: seats_taken may have moved (coaching.enrollment) while the form was open
+        if change:
+            obj.save(update_fields=form.changed_data)
+        else:
+            obj.save()
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_by', 'locked_at', 'heartbeat_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    @admin.action(description='Retry selected jobs')
+    def retry_jobs(self, request, queryset):
+        count = jobs.retry(queryset)
+        self.message_user(request, f'{count} jobs queued again.')
+
+
+admin.site.register(Course, CourseAdmin)
+admin.site.register(Student, StudentAdmin)
 admin.site.register(Attendance)
 admin.site.register(Fee)
+admin.site.register(FeeSchedule)
+admin.site.register(WaitlistEntry)
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+
+from .db import CommitBatch
+from .models import Attendance, Course, Result, Student, StudentCourseStats
+
+BATCH_SIZE = 500
+
+STAT_FIELDS = ['sessions_total', 'sessions_present', 'results_count', 'marks_total', 'updated_at']
+
+
+def _chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _collect(attendance_qs, result_qs, stats=None):
+    """Aggregate attendance and results into ``{(student_id, course_id): stats}``."""
+    stats = stats if stats is not None else {}
+    attendance_rows = (
+        attendance_qs.exclude(course__isnull=True)
+        .values('student_id', 'course_id')
+        .annotate(total=Count('id'), present=Count('id', filter=Q(status=True)))
+        .order_by()
+    )
+    for row in attendance_rows.iterator():
+        item = stats.setdefault((row['student_id'], row['course_id']), StudentCourseStats(
+            student_id=row['student_id'], course_id=row['course_id']))
+        item.sessions_total = row['total']
+        item.sessions_present = row['present']
+    result_rows = (
+        result_qs.filter(marks__isnull=False)
+        .values('student_id', 'course_id')
+        .annotate(count=Count('id'), total=Sum('marks'))
+        .order_by()
+    )
+    for row in result_rows.iterator():
+        item = stats.setdefault((row['student_id'], row['course_id']), StudentCourseStats(
+            student_id=row['student_id'], course_id=row['course_id']))
+        item.results_count = row['count']
+        item.marks_total = row['total'] or Decimal('0')
+    return stats
+
+
+def _save(rows):
+    StudentCourseStats.objects.bulk_create(
+        rows,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['student_id', 'course_id'],
+        update_fields=STAT_FIELDS,
+    )
+
+
+def refresh_course(course_id, student_ids):
+    """Recompute the stats rows of ``student_ids`` in one course.
+
+    Cost is proportional to the attendance and result rows of those students
+    in that course, not to the size of either table.
+    """
+    if not Course.objects.filter(id=course_id).exists():
+        return
+    for ids in _chunks(set(student_ids)):
+        ids = list(Student.objects.filter(id__in=ids).values_list('id', flat=True))
+        # Start from zeroed rows so pairs whose last record was deleted are reset too
+        stats = {(sid, course_id): StudentCourseStats(student_id=sid, course_id=course_id) for sid in ids}
+        _collect(
+            Attendance.objects.filter(course_id=course_id, student_id__in=ids),
+            Result.objects.filter(course_id=course_id, student_id__in=ids),
+            stats,
+        )
+        _save(list(stats.values()))
+
+
+def refresh_pairs(pairs):
+    by_course = defaultdict(set)
+    for student_id, course_id in pairs:
+        by_course[course_id].add(student_id)
+    for course_id, student_ids in by_course.items():
+        refresh_course(course_id, student_ids)
+
+
+# (student_id, course_id) pairs touched by the current transaction
+_pending = CommitBatch(refresh_pairs)
+
+
+def mark_dirty(student_id, course_id):
+    """Schedule a refresh of one (student, course) pair once the transaction commits.
+
+    A cascade delete or a loop of saves in a single transaction costs one
+    refresh per distinct pair rather than per row; pairs from a transaction
+    that rolls back are dropped with it.
+    """
+    if course_id is not None:
+        _pending.add((student_id, course_id))
+
+
+def rebuild():
+    """Drop and recompute the whole stats table. Returns the number of rows written."""
+    with transaction.atomic():
+        StudentCourseStats.objects.all().delete()
+        rows = list(_collect(Attendance.objects.all(), Result.objects.all()).values())
+        _save(rows)
+    return len(rows)
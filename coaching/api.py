@@ -0,0 +1,194 @@
+from collections import defaultdict
+
+from django.db.models import Q
+
+from . import feed
+from .models import Announcement, Assignment, Attendance, Course, Message, Result, Student
+from .pagination import paginate
+from .profiles import get_student
+from .roles import is_teacher
+
+# Most ids one batch request may ask for
+MAX_BATCH = 100
+
+
+class APIError(Exception):
+    """A bad API request; the message is returned to the client with ``status``."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_staff(user):
+    return user.is_superuser or is_teacher(user)
+
+
+class Resource:
+    """A model exposed read-only as JSON rows fetched with values(), never as model instances.
+
+    ``fields`` maps public field names to ORM lookups, so related names are
+    joined in SQL only when a client asks for them. ``many`` fields are
+    id lists loaded with one extra query per page. ``ordering`` is the
+    keyset pagination key and should match an index.
+    """
+
+    def __init__(self, model, fields, ordering, filters=None, many=None, scope=None):
+        self.model = model
+        self.fields = fields
+        self.ordering = ordering
+        self.filters = filters or {}
+        self.many = many or {}
+        self.scope = scope
+
+    @property
+    def field_names(self):
+        return list(self.fields) + list(self.many)
+
+    def parse_fields(self, value):
+        if not value:
+            return self.field_names
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in self.fields and name not in self.many]
+        if unknown:
+            raise APIError(f'Unknown fields: {", ".join(unknown)}. Available: {", ".join(self.field_names)}.')
+        return names
+
+    def queryset(self, request):
+        queryset = self.model.objects.all()
+        return self.scope(request, queryset) if self.scope else queryset
+
+    def filter(self, queryset, params):
+        for param, lookup in self.filters.items():
+            value = params.get(param)
+            if value:
+                if not value.isdigit():
+                    raise APIError(f'{param} must be an id.')
+                queryset = queryset.filter(**{lookup: int(value)})
+        return queryset
+
+    def values(self, queryset, names):
+        """The values() queryset for ``names``, plus the ordering keys pagination needs."""
+        lookups = {self.fields[name] for name in names if name in self.fields}
+        lookups.update(field.lstrip('-') for field in self.ordering)
+        lookups.add('id')
+        return queryset.values(*sorted(lookups))
+
+    def serialize(self, rows, names):
+        rows = list(rows)
+        related = {}
+        for name in names:
+            if name in self.many:
+                through, source, target = self.many[name]
+                ids = defaultdict(list)
+                links = through.objects.filter(**{f'{source}__in': [row['id'] for row in rows]}).order_by(target)
+                for owner, value in links.values_list(source, target):
+                    ids[owner].append(value)
+                related[name] = ids
+        return [
+            {name: related[name][row['id']] if name in related else row[self.fields[name]] for name in names}
+            for row in rows
+        ]
+
+
+def _own_student(request, queryset, lookup):
+    if is_staff(request.user):
+        return queryset
+    student = get_student(request)
+    return queryset.filter(**{lookup: student}) if student else queryset.none()
+
+
+def _announcements(request, queryset):
+    if request.user.is_superuser:
+        return queryset
+    return queryset.filter(Q(for_all=True) | Q(for_all=False, for_role__in=feed.roles_for(request.user)))
+
+
+def _messages(request, queryset):
+    return queryset.filter(Q(sender=request.user) | Q(receiver=request.user))
+
+
+RESOURCES = {
+    'courses': Resource(Course, {
+        'id': 'id', 'name': 'name', 'description': 'description', 'start_date': 'start_date',
+        'end_date': 'end_date', 'image': 'image', 'capacity': 'capacity', 'seats_taken': 'seats_taken',
+    }, ('name', 'id')),
+    'students': Resource(Student, {
+        'id': 'id', 'name': 'name', 'email': 'email', 'phone': 'phone', 'address': 'address', 'dob': 'dob',
+        'gender': 'gender', 'date_joined': 'date_joined', 'user_id': 'user_id',
+    }, ('name', 'id'), filters={'course': 'enrolled_courses'},
+        many={'course_ids': (Student.enrolled_courses.through, 'student_id', 'course_id')},
+        scope=lambda request, queryset: _own_student(request, queryset, 'pk')),
+    'attendance': Resource(Attendance, {
+        'id': 'id', 'date': 'date', 'present': 'status', 'student_id': 'student_id', 'student_name': 'student__name',
+        'course_id': 'course_id', 'course_name': 'course__name',
+    }, ('-date', '-id'), filters={'course': 'course_id', 'student': 'student_id'},
+        scope=lambda request, queryset: _own_student(request, queryset, 'student')),
+    'results': Resource(Result, {
+        'id': 'id', 'student_id': 'student_id', 'student_name': 'student__name', 'course_id': 'course_id',
+        'course_name': 'course__name', 'marks': 'marks', 'description': 'description', 'file': 'file',
+        'uploaded_at': 'uploaded_at',
+    }, ('-uploaded_at', '-id'), filters={'course': 'course_id', 'student': 'student_id'},
+        scope=lambda request, queryset: _own_student(request, queryset, 'student')),
+    'assignments': Resource(Assignment, {
+        'id': 'id', 'title': 'title', 'description': 'description', 'file': 'file', 'course_id': 'course_id',
+        'course_name': 'course__name', 'due_date': 'due_date', 'marks': 'marks', 'assigned_by_id': 'assigned_by_id',
+        'created_at': 'created_at',
+    }, ('due_date', 'id'), filters={'course': 'course_id'}),
+    'announcements': Resource(Announcement, {
+        'id': 'id', 'title': 'title', 'content': 'content', 'file': 'file', 'created_at': 'created_at',
+        'created_by_id': 'created_by_id', 'created_by': 'created_by__username', 'for_all': 'for_all',
+        'for_role': 'for_role',
+    }, ('-created_at', '-id'), scope=_announcements),
+    'messages': Resource(Message, {
+        'id': 'id', 'conversation_id': 'conversation_id', 'sender_id': 'sender_id', 'sender': 'sender__username',
+        'receiver_id': 'receiver_id', 'receiver': 'receiver__username', 'content': 'content',
+        'reply_to_id': 'reply_to_id', 'sent_at': 'sent_at', 'read_at': 'read_at',
+    }, ('-sent_at', '-id'), filters={'conversation': 'conversation_id'}, scope=_messages),
+}
+
+
+def get_resource(name):
+    if name not in RESOURCES:
+        raise APIError(f'Unknown resource {name!r}; choose one of {", ".join(RESOURCES)}.', status=404)
+    return RESOURCES[name]
+
+
+def parse_ids(value):
+    ids = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if not part.isdigit():
+            raise APIError('ids must be a comma-separated list of ids.')
+        ids.append(int(part))
+    if not ids:
+        raise APIError('ids is required.')
+    if len(ids) > MAX_BATCH:
+        raise APIError(f'At most {MAX_BATCH} ids per request.')
+    return list(dict.fromkeys(ids))
+
+
+def list_rows(request, resource):
+    """One cursor-paginated page as ``{'results', 'next', 'previous'}``."""
+    names = resource.parse_fields(request.GET.get('fields'))
+    queryset = resource.filter(resource.queryset(request), request.GET)
+    page = paginate(request, resource.values(queryset, names), resource.ordering)
+    return {
+        'results': resource.serialize(page.object_list, names),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }
+
+
+def batch_rows(request, resource):
+    """The rows for ``?ids=``, in the order asked for; ids that do not exist or are not visible are listed as missing."""
+    names = resource.parse_fields(request.GET.get('fields'))
+    ids = parse_ids(request.GET.get('ids'))
+    rows = {row['id']: row for row in resource.values(resource.queryset(request).filter(id__in=ids), names)}
+    found = [rows[pk] for pk in ids if pk in rows]
+    return {
+        'results': resource.serialize(found, names),
+        'missing': [pk for pk in ids if pk not in rows],
+    }
@@ -0,0 +1,45 @@
+from django.db import transaction
+
+from . import analytics
+from .models import Attendance, Student
+
+# Rows per INSERT statement; keeps each statement under SQLite's bound-parameter limit
+BATCH_SIZE = 500
+
+
+def course_roster(course):
+    """Students enrolled in ``course``, i.e. the only ones a session can cover."""
+    return Student.objects.filter(enrolled_courses=course).order_by('name', 'id')
+
+
+def mark_session(course, date, present_ids):
+    """Record one attendance session for every student enrolled in ``course``.
+
+    Rows are written with batched upserts keyed on (student, course, date), so
+    resubmitting the same session updates the existing marks instead of adding
+    duplicates. Returns the number of students marked.
+    """
+    present_ids = set(present_ids)
+    roster_ids = list(course_roster(course).values_list('id', flat=True))
+    rows = [
+        Attendance(student_id=student_id, course=course, date=date, status=student_id in present_ids)
+        for student_id in roster_ids
+    ]
+    with transaction.atomic():
+        Attendance.objects.bulk_create(
+            rows,
+            batch_size=BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=['student_id', 'course_id', 'date'],
+            update_fields=['status'],
+        )
+        # bulk_create skips post_save, so refresh the session's stats in one pass
+        analytics.refresh_course(course.id, roster_ids)
+    return len(rows)
+
+
+def present_student_ids(course, date):
+    """IDs of students already marked present for a session, to pre-fill the form."""
+    return set(
+        Attendance.objects.filter(course=course, date=date, status=True).values_list('student_id', flat=True)
+    )
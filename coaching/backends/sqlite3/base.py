@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite with the SQLITE_PRAGMAS settings applied per connection and write-locking transactions."""
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # A deferred transaction that reads and then writes cannot wait for the lock and fails at
+        # once with "database is locked"; BEGIN IMMEDIATE takes it up front, so busy_timeout applies
+        self.cursor().execute('BEGIN IMMEDIATE')
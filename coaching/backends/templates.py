@@ -0,0 +1,28 @@
+import time
+
+from django.template.backends import django
+
+
+class Template(django.Template):
+
+    def render(self, context=None, request=None):
+        from coaching import metrics
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_rendered(time.perf_counter() - start)
+
+
+class DjangoTemplates(django.DjangoTemplates):
+    """The Django template engine, timing each top-level render for coaching.metrics.
+
+    Included and extended templates render inside their parent, so each
+    response's template time is counted once.
+    """
+
+    def from_string(self, template_code):
+        return Template(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return Template(super().get_template(template_name).template, self)
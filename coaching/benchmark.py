@@ -0,0 +1,190 @@
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Case, Count, When
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .models import ConversationMember, Course, Student
+from .seeding import USERNAME_PREFIX
+
+DEFAULT_REPEAT = 20
+# Relative p95 slowdown tolerated before a route counts as regressed, and an absolute floor under
+# which timing noise is ignored
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_MS = 5.0
+
+
+class Route:
+    """How to request one URL pattern: who is logged in, its URL arguments and query string."""
+
+    def __init__(self, user=None, kwargs=None, params=None):
+        self.user = user
+        self.kwargs = kwargs
+        self.params = params
+
+
+# Every pattern in coaching/urls.py is either benchmarked or skipped with a reason.
+# Callables receive the Fixtures so they can pick ids from the seeded data.
+ROUTES = {
+    'home': Route(),
+    'about': Route(),
+    'contact': Route(),
+    'teacher_login': Route(),
+    'student_login': Route(),
+    'admin_login': Route(),
+    'teacher_register': Route(),
+    'student_register': Route(),
+    'course_list': Route('student'),
+    'student_list': Route('teacher'),
+    'teacher_list': Route('teacher'),
+    'teacher_dashboard': Route('teacher'),
+    'student_dashboard': Route('student'),
+    'admin_dashboard': Route('admin'),
+    'admin_manage_teachers': Route('admin'),
+    'add_course': Route('admin'),
+    'edit_course': Route('admin', kwargs=lambda f: {'course_id': f.course_id}),
+    'delete_course': Route('admin', kwargs=lambda f: {'course_id': f.course_id}),
+    'mark_attendance': Route('teacher', params=lambda f: {'course_id': f.course_id}),
+    'view_analytics': Route('student'),
+    'search': Route('student', params=lambda f: {'q': 'practice'}),
+    'metrics': Route('admin'),
+    'api_list': Route('teacher', kwargs=lambda f: {'resource': 'results'}, params=lambda f: {'per_page': 100}),
+    'api_batch': Route('teacher', kwargs=lambda f: {'resource': 'students'},
+                       params=lambda f: {'ids': ','.join(map(str, f.student_ids)), 'fields': 'id,name,course_ids'}),
+    'fee_report': Route('admin'),
+    'student_fees': Route('student'),
+    'export_data': Route('teacher', kwargs=lambda f: {'name': 'results'}, params=lambda f: {'course': f.course_id}),
+    'upload_study_material': Route('teacher'),
+    'study_materials': Route('student'),
+    'assignments_list': Route('student'),
+    'upload_assignment': Route('teacher'),
+    'messages_view': Route('student'),
+    'message_thread': Route('student', kwargs=lambda f: {'conversation_id': f.conversation_id}),
+    'results_view': Route('teacher'),
+    'upload_result': Route('teacher'),
+    'announcements_view': Route('student'),
+}
+SKIPPED = {
+    'logout': 'ends the session',
+    'enroll_course': 'POST only',
+    'unenroll_course': 'POST only',
+    'upload_start': 'POST only',
+    'upload_chunk': 'needs an upload session',
+    'upload_complete': 'POST only',
+    'serve_file': 'seeded rows have no files on disk',
+}
+
+
+class Fixtures:
+    """Users and ids picked from whatever data the database holds (see the seed_data command)."""
+
+    def __init__(self):
+        # Prefer seeded accounts, so runs against the same seed measure the same users
+        seeded_first = (Case(When(username__startswith=USERNAME_PREFIX, then=0), default=1), 'id')
+        self.users = {
+            'admin': User.objects.filter(is_superuser=True).order_by(*seeded_first).first(),
+            'teacher': User.objects.filter(groups__name='Teachers').order_by(*seeded_first).first(),
+            'student': User.objects.filter(student_profile__isnull=False).order_by(*seeded_first).first(),
+        }
+        # The busiest course gives the per-course pages realistic sizes
+        Enrollment = Student.enrolled_courses.through
+        self.course_id = (
+            Enrollment.objects.values('course_id').annotate(students=Count('id')).order_by('-students', 'course_id')
+            .values_list('course_id', flat=True).first()
+        ) or Course.objects.order_by('id').values_list('id', flat=True).first()
+        self.student_ids = list(Student.objects.order_by('id').values_list('id', flat=True)[:100])
+        member = ConversationMember.objects.filter(user=self.users['student']).order_by('id').first()
+        self.conversation_id = member.conversation_id if member else None
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def _get(client, url, params):
+    queries = []
+
+    def count(execute, sql, sql_params, many, context):
+        queries.append(sql)
+        return execute(sql, sql_params, many, context)
+
+    with connection.execute_wrapper(count):
+        start = time.perf_counter()
+        response = client.get(url, params)
+        # Streamed bodies are produced while they are consumed, so that belongs in the timing
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        elapsed = (time.perf_counter() - start) * 1000
+    return response.status_code, elapsed, len(queries), len(body)
+
+
+def measure(client, url, params=None, repeat=DEFAULT_REPEAT):
+    """Time ``repeat`` GETs of ``url`` after one warm-up request."""
+    _get(client, url, params)
+    timings = []
+    for _ in range(repeat):
+        status, elapsed, queries, size = _get(client, url, params)
+        timings.append(elapsed)
+    return {
+        'status': status,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': queries,
+        'bytes': size,
+    }
+
+
+def run(repeat=DEFAULT_REPEAT, names=None, progress=None):
+    """Benchmark the routes (all of ROUTES by default) against the current database; returns the report."""
+    fixtures = Fixtures()
+    report = {'repeat': repeat, 'routes': {}, 'skipped': dict(SKIPPED)}
+    # The test client sends Host: testserver
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for name in names or ROUTES:
+            route = ROUTES[name]
+            client = Client(raise_request_exception=False)
+            user = fixtures.users.get(route.user) if route.user else None
+            if route.user and user is None:
+                report['skipped'][name] = f'no {route.user} user in the database'
+                continue
+            if user is not None:
+                client.force_login(user)
+            try:
+                url = reverse(name, kwargs=route.kwargs(fixtures) if route.kwargs else None)
+            except Exception:
+                report['skipped'][name] = 'no seeded data for its URL arguments'
+                continue
+            params = route.params(fixtures) if route.params else None
+            result = measure(client, url, params, repeat)
+            result.update(url=url, user=route.user or 'anonymous')
+            report['routes'][name] = result
+            if progress:
+                progress(name, result)
+    return report
+
+
+def compare(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of ``report`` against ``baseline`` as human-readable lines.
+
+    More queries is always a regression; latency regresses when p95 grows by
+    more than ``tolerance`` and by more than the noise floor.
+    """
+    problems = []
+    for name, old in sorted(baseline.get('routes', {}).items()):
+        new = report['routes'].get(name)
+        if new is None:
+            problems.append(f'{name}: missing from this run')
+            continue
+        if new['status'] != old['status']:
+            problems.append(f'{name}: status {old["status"]} -> {new["status"]}')
+        if new['queries'] > old['queries']:
+            problems.append(f'{name}: queries {old["queries"]} -> {new["queries"]}')
+        limit = max(old['p95_ms'] * (1 + tolerance), old['p95_ms'] + NOISE_FLOOR_MS)
+        if new['p95_ms'] > limit:
+            problems.append(f'{name}: p95 {old["p95_ms"]}ms -> {new["p95_ms"]}ms')
+    return problems
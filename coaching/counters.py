@@ -0,0 +1,45 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Course, Student
+
+# Safety net: a count that drifted (e.g. rows written with bulk_create elsewhere) corrects itself within an hour
+COUNTER_TIMEOUT = 60 * 60
+COUNTER_KEY = 'coaching:count:{}'
+# Dashboard card fragments; they vary on the counts they show, so a change renders a fresh copy
+FRAGMENT_TIMEOUT = 10 * 60
+
+MODELS = {
+    'students': Student,
+    'courses': Course,
+}
+NAME_BY_MODEL = {model: name for name, model in MODELS.items()}
+
+
+def get_counts(*names):
+    """``{name: row count}``, counted with COUNT(*) only when the cache does not hold the value."""
+    keys = {name: COUNTER_KEY.format(name) for name in names}
+    cached = cache.get_many(keys.values())
+    counts = {}
+    for name, key in keys.items():
+        if key in cached:
+            counts[name] = cached[key]
+        else:
+            counts[name] = MODELS[name].objects.count()
+            cache.add(key, counts[name], COUNTER_TIMEOUT)
+    return counts
+
+
+def invalidate_on_commit(*names):
+    """Drop counters once the current transaction commits; the next read counts the table again.
+
+    The cache is shared by every process, and incr() on the file backend is a
+    read followed by a write, so concurrent increments from two workers could
+    lose one. Dropping the value is safe under any backend and costs one
+    COUNT(*) per write.
+    """
+    transaction.on_commit(lambda: invalidate(*names))
+
+
+def invalidate(*names):
+    cache.delete_many([COUNTER_KEY.format(name) for name in names or MODELS])
@@ -0,0 +1,123 @@
+import contextvars
+import functools
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+# Set on responses to writes; while present, reads stay on the primary so users see their own changes
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_from_replica = contextvars.ContextVar('read_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+class replica_reads:
+    """Within this block, ORM reads go to the replica unless the primary is mid-transaction."""
+
+    def __enter__(self):
+        self._token = _read_from_replica.set(True)
+
+    def __exit__(self, *exc_info):
+        _read_from_replica.reset(self._token)
+
+
+def read_from_replica(view):
+    """View decorator: serve safe requests from the replica.
+
+    Requests made right after a write by the same browser (see
+    ``PinPrimaryMiddleware``) keep reading from the primary.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not replica_configured() or _pinned(request):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _pinned(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+class PinPrimaryMiddleware:
+    """After a write request, pin the browser's reads to the primary for DATABASE_REPLICA_LAG seconds."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and replica_configured():
+            lag = settings.DATABASE_REPLICA_LAG
+            response.set_cookie(PIN_COOKIE, str(time.time() + lag), max_age=lag, httponly=True, samesite='Lax')
+        return response
+
+
+class ReplicaRouter:
+    """Send reads made under ``replica_reads`` to the replica and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and replica_configured() and not connections[PRIMARY].in_atomic_block:
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return obj1._state.db in (PRIMARY, REPLICA) and obj2._state.db in (PRIMARY, REPLICA)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary and is never migrated directly
+        return db == PRIMARY
+
+
+class _Batch:
+    def __init__(self, callback):
+        self.callback = callback
+        self.items = set()
+
+    def __call__(self):
+        items, self.items = self.items, set()
+        if items:
+            self.callback(items)
+
+
+class CommitBatch:
+    """Collect items during a transaction and pass them to ``callback`` once, when it commits.
+
+    Each thread gets its own batch, so many saves in one transaction cost a
+    single callback. The batch is registered as an on_commit callback with
+    every item; once a rollback has discarded all of those registrations, its
+    items are dropped and the next write starts a new batch.
+    """
+
+    def __init__(self, callback, using=PRIMARY):
+        self.callback = callback
+        self.using = using
+        self._local = threading.local()
+
+    def add(self, item):
+        batch = getattr(self._local, 'batch', None)
+        if batch is None or not self._registered(batch):
+            batch = self._local.batch = _Batch(self.callback)
+        batch.items.add(item)
+        # Outside a transaction this runs at once; later registrations of a flushed batch do nothing
+        transaction.on_commit(batch, using=self.using)
+
+    def _registered(self, batch):
+        # Newest first: in a loop of writes the batch's last registration is near the end
+        return any(entry[1] is batch for entry in reversed(connections[self.using].run_on_commit))
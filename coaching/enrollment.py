@@ -0,0 +1,134 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Course, Student, WaitlistEntry
+from .profiles import invalidate_enrollments
+
+Enrollment = Student.enrolled_courses.through
+
+# Outcomes of enroll() and unenroll()
+ENROLLED = 'enrolled'
+WAITLISTED = 'waitlisted'
+ALREADY_ENROLLED = 'already_enrolled'
+ALREADY_WAITLISTED = 'already_waitlisted'
+UNENROLLED = 'unenrolled'
+LEFT_WAITLIST = 'left_waitlist'
+NOT_ENROLLED = 'not_enrolled'
+
+
+def _take_seat(course_id):
+    """Claim a seat with one conditional UPDATE; False when the course is full.
+
+    The database re-checks the condition under its write lock (SQLite) or row
+    lock (elsewhere), so concurrent requests cannot take more seats than exist.
+    """
+    free = Q(capacity__isnull=True) | Q(seats_taken__lt=F('capacity'))
+    return Course.objects.filter(free, pk=course_id).update(seats_taken=F('seats_taken') + 1) == 1
+
+
+def recount(course_ids=None):
+    """Set seats_taken from the enrollment rows of ``course_ids`` (every course by default)."""
+    taken = Enrollment.objects.filter(course_id=OuterRef('pk')).order_by().values('course_id').annotate(
+        n=Count('id')).values('n')
+    courses = Course.objects.all() if course_ids is None else Course.objects.filter(pk__in=course_ids)
+    courses.update(seats_taken=Coalesce(Subquery(taken), 0))
+
+
+def enroll(student, course):
+    """Enroll ``student`` in ``course`` if a seat is free, otherwise add them to its waitlist.
+
+    Returns ENROLLED, WAITLISTED, ALREADY_ENROLLED or ALREADY_WAITLISTED.
+    """
+    try:
+        with transaction.atomic():
+            if Enrollment.objects.filter(student_id=student.pk, course_id=course.pk).exists():
+                return ALREADY_ENROLLED
+            if not _take_seat(course.pk):
+                _, created = WaitlistEntry.objects.get_or_create(course_id=course.pk, student_id=student.pk)
+                return WAITLISTED if created else ALREADY_WAITLISTED
+            Enrollment.objects.create(student_id=student.pk, course_id=course.pk)
+            WaitlistEntry.objects.filter(course_id=course.pk, student_id=student.pk).delete()
+    except IntegrityError:
+        # The same student enrolled from another request first; rolling back returned the seat
+        return ALREADY_ENROLLED
+    invalidate_enrollments(student.pk)
+    return ENROLLED
+
+
+def unenroll(student, course):
+    """Drop ``student`` from ``course`` (or from its waitlist), promoting the next waiting student into the seat.
+
+    Returns UNENROLLED, LEFT_WAITLIST or NOT_ENROLLED.
+    """
+    with transaction.atomic():
+        if not Enrollment.objects.filter(student_id=student.pk, course_id=course.pk).delete()[0]:
+            left = WaitlistEntry.objects.filter(course_id=course.pk, student_id=student.pk).delete()[0]
+            return LEFT_WAITLIST if left else NOT_ENROLLED
+        recount([course.pk])
+        promote(course.pk)
+    invalidate_enrollments(student.pk)
+    return UNENROLLED
+
+
+def promote(course_id):
+    """Move waitlisted students into free seats, oldest entry first. Returns the promoted student ids."""
+    promoted = []
+    with transaction.atomic():
+        while True:
+            entry = WaitlistEntry.objects.filter(course_id=course_id).order_by('created_at', 'id').first()
+            if entry is None or not _take_seat(course_id):
+                break
+            # A concurrent promotion may have taken this entry, or an admin enrolled the student directly
+            if not WaitlistEntry.objects.filter(pk=entry.pk).delete()[0] or not _insert(entry.student_id, course_id):
+                recount([course_id])
+                continue
+            promoted.append(entry.student_id)
+    invalidate_enrollments(*promoted)
+    return promoted
+
+
+def _insert(student_id, course_id):
+    try:
+        with transaction.atomic():
+            Enrollment.objects.create(student_id=student_id, course_id=course_id)
+    except IntegrityError:
+        return False
+    return True
+
+
+def resync(course_ids):
+    """Recount seats after enrollments changed outside enroll()/unenroll() and fill any freed seats.
+
+    Run by the m2m_changed handler, so admin edits and ``enrolled_courses.set()``
+    stay in step. Those paths are trusted and may take a course past its
+    capacity; promotion then waits until enough students leave.
+    """
+    course_ids = set(course_ids)
+    if not course_ids:
+        return
+    with transaction.atomic():
+        recount(course_ids)
+        drop_enrolled_from_waitlists(course_ids)
+        for course_id in course_ids:
+            promote(course_id)
+
+
+def drop_enrolled_from_waitlists(course_ids, student_ids=None):
+    """Delete waitlist entries of students who are now enrolled in the course they were waiting for."""
+    entries = WaitlistEntry.objects.filter(course_id__in=course_ids, student__enrolled_courses=F('course_id'))
+    if student_ids is not None:
+        entries = entries.filter(student_id__in=student_ids)
+    entries.delete()
+
+
+def waitlist_positions(student, course_ids=None):
+    """``{course_id: position}`` of the student's waitlist entries, 1 being next in line."""
+    ahead = WaitlistEntry.objects.filter(course_id=OuterRef('course_id')).filter(
+        Q(created_at__lt=OuterRef('created_at')) | Q(created_at=OuterRef('created_at'), id__lte=OuterRef('id'))
+    ).order_by().values('course_id').annotate(n=Count('id')).values('n')
+    rows = WaitlistEntry.objects.filter(student=student)
+    if course_ids is not None:
+        rows = rows.filter(course_id__in=course_ids)
+    rows = rows.annotate(position=Subquery(ahead))
+    return dict(rows.values_list('course_id', 'position'))
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections
+from django.db.models import Q
+from django.http import parse_cookie
+from django.utils import timezone
+
+from . import feed
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+# Served by the ASGI application (see coaching_management/asgi.py), outside Django's URL routing
+PATH = '/events/'
+# Milliseconds a disconnected browser waits before reconnecting
+RETRY_MS = 3000
+
+
+def message_created(message):
+    Event.objects.create(kind=Event.MESSAGE, user_id=message.receiver_id, payload={
+        'id': message.pk, 'conversation_id': message.conversation_id, 'sender': message.sender.username,
+        'content': message.content[:200], 'sent_at': message.sent_at,
+    })
+
+
+def announcement_created(announcement):
+    Event.objects.create(kind=Event.ANNOUNCEMENT, role=Event.ALL if announcement.for_all else announcement.for_role, payload={
+        'id': announcement.pk, 'title': announcement.title, 'created_at': announcement.created_at,
+    })
+
+
+def purge(days):
+    return Event.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
+
+
+def _row(event):
+    return {'id': event.pk, 'kind': event.kind, 'user_id': event.user_id, 'role': event.role, 'payload': event.payload}
+
+
+def _audience(user_id, roles):
+    return Q(user_id=user_id) | Q(user__isnull=True, role__in=[Event.ALL, *roles])
+
+
+def _latest_id():
+    close_old_connections()
+    return Event.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def _events_after(last_id, limit):
+    # Raw ASGI requests send no request_started/finished, so expire connections here instead
+    close_old_connections()
+    return [_row(event) for event in Event.objects.filter(id__gt=last_id).order_by('id')[:limit]]
+
+
+def _replay(user_id, roles, after, upto, limit):
+    close_old_connections()
+    events = Event.objects.filter(_audience(user_id, roles), id__gt=after, id__lte=upto).order_by('id')[:limit]
+    return [_row(event) for event in events]
+
+
+def _user_for_session(session_key):
+    close_old_connections()
+    engine = import_module(settings.SESSION_ENGINE)
+    # get_user only needs request.session; it also checks the session hash, so a changed password logs out
+    user = auth.get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+    if not user.is_authenticated:
+        return None
+    return user, frozenset(feed.roles_for(user))
+
+
+class Subscription:
+    """One connected browser: its audience and a bounded queue of events waiting to be sent."""
+
+    def __init__(self, user_id, roles):
+        self.user_id = user_id
+        self.roles = roles
+        self.queue = asyncio.Queue(settings.EVENTS_QUEUE_SIZE)
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: end the stream; the browser reconnects and replays from its Last-Event-ID
+            self.queue = None
+
+
+class Broker:
+    """Fans events out to the subscriptions of this process.
+
+    A single task polls the Event table for rows newer than the last one
+    seen, so the database sees one cheap primary-key range query per
+    interval however many browsers are connected. Events are written by
+    any process, so every worker sees every event.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.task = None
+        self.last_id = None
+        self.subscriptions = set()
+        self.by_user = defaultdict(set)
+        self.by_role = defaultdict(set)
+
+    def _bind(self):
+        # Subscriptions and the poll task belong to one event loop; start afresh on another
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.__init__()
+            self.loop = loop
+
+    async def subscribe(self, subscription):
+        """Register ``subscription``; returns the id of the last event it will not receive live."""
+        self._bind()
+        if self.last_id is None:
+            self.last_id = await sync_to_async(_latest_id)()
+        self.subscriptions.add(subscription)
+        self.by_user[subscription.user_id].add(subscription)
+        for role in subscription.roles:
+            self.by_role[role].add(subscription)
+        if self.task is None:
+            self.task = asyncio.ensure_future(self.run())
+        return self.last_id
+
+    def unsubscribe(self, subscription):
+        self.subscriptions.discard(subscription)
+        self.by_user[subscription.user_id].discard(subscription)
+        if not self.by_user[subscription.user_id]:
+            del self.by_user[subscription.user_id]
+        for role in subscription.roles:
+            self.by_role[role].discard(subscription)
+
+    def publish(self, event):
+        if event['user_id'] is not None:
+            targets = self.by_user.get(event['user_id'], ())
+        elif event['role'] == Event.ALL:
+            targets = self.subscriptions
+        else:
+            targets = self.by_role.get(event['role'], ())
+        for subscription in list(targets):
+            if subscription.queue is not None:
+                subscription.put(event)
+
+    async def poll(self):
+        events = await sync_to_async(_events_after)(self.last_id, settings.EVENTS_POLL_BATCH)
+        for event in events:
+            self.publish(event)
+            self.last_id = event['id']
+        return len(events)
+
+    async def run(self):
+        try:
+            while self.subscriptions:
+                await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+                try:
+                    await self.poll()
+                except Exception:
+                    logger.exception('Polling for events failed')
+        finally:
+            self.task = None
+
+
+broker = Broker()
+
+
+def format_event(event):
+    data = json.dumps(event['payload'], cls=DjangoJSONEncoder, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n".encode()
+
+
+def _last_event_id(scope, headers):
+    # EventSource sends the header on reconnect; the query parameter lets a new page resume too
+    value = headers.get(b'last-event-id', b'').decode('latin-1')
+    if not value:
+        for pair in scope.get('query_string', b'').decode('latin-1').split('&'):
+            name, _, item = pair.partition('=')
+            if name == 'last_event_id':
+                value = item
+    return int(value) if value.isdigit() else None
+
+
+async def _plain(send, status, text):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+    await send({'type': 'http.response.body', 'body': text.encode()})
+
+
+async def stream(scope, receive, send):
+    """ASGI application streaming the logged-in user's events as text/event-stream."""
+    if scope['method'] != 'GET':
+        return await _plain(send, 405, 'Method not allowed.')
+    headers = dict(scope['headers'])
+    session_key = parse_cookie(headers.get(b'cookie', b'').decode('latin-1')).get(settings.SESSION_COOKIE_NAME)
+    found = await sync_to_async(_user_for_session)(session_key) if session_key else None
+    if found is None:
+        return await _plain(send, 401, 'Authentication required.')
+    user, roles = found
+
+    subscription = Subscription(user.pk, roles)
+    upto = await broker.subscribe(subscription)
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            # Stop nginx from buffering the stream
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode(), 'more_body': True})
+        after = _last_event_id(scope, headers)
+        if after is not None and after < upto:
+            missed = await sync_to_async(_replay)(user.pk, roles, after, upto, settings.EVENTS_REPLAY_LIMIT)
+            for event in missed:
+                await send({'type': 'http.response.body', 'body': format_event(event), 'more_body': True})
+        while not disconnected.done():
+            queue = subscription.queue
+            if queue is None:
+                break
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, disconnected}, timeout=settings.EVENTS_HEARTBEAT,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                body = format_event(getter.result())
+            else:
+                getter.cancel()
+                if disconnected in done:
+                    break
+                # A comment line keeps proxies from timing out an idle stream
+                body = b': heartbeat\n\n'
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broker.unsubscribe(subscription)
+        disconnected.cancel()
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def route(django_application):
+    """Wrap the Django ASGI application so PATH is answered by ``stream`` without a thread per connection."""
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] == PATH:
+            return await stream(scope, receive, send)
+        return await django_application(scope, receive, send)
+    return application
@@ -0,0 +1,145 @@
+import csv
+import datetime
+import tempfile
+
+from django.db import models
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Attendance, Fee, Result
+
+# Rows fetched from the database cursor, and written to the response, at a time
+CHUNK_SIZE = 2000
+FORMATS = ('csv', 'xlsx')
+# Spreadsheet programs run a cell starting with one of these as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportError(Exception):
+    """Bad export parameters; the message is safe to show to the user."""
+
+
+class Export:
+    """One exportable table: which columns to read and how its filters map to lookups."""
+
+    def __init__(self, model, columns, date_field):
+        self.model = model
+        self.headers = [header for header, _ in columns]
+        self.fields = [field for _, field in columns]
+        self.date_field = date_field
+
+    def _bound(self, date):
+        # Datetime columns are bounded by aware local midnights, so a range covers whole days
+        if isinstance(self.model._meta.get_field(self.date_field), models.DateTimeField):
+            return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
+        return date
+
+    def rows(self, course=None, student=None, date_from=None, date_to=None):
+        queryset = self.model.objects.all()
+        # Fix the database now: a streamed response reads after the view (and its replica routing) returned
+        queryset = queryset.using(queryset.db)
+        if course:
+            queryset = queryset.filter(course_id=course)
+        if student:
+            queryset = queryset.filter(student_id=student)
+        if date_from:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': self._bound(date_from)})
+        if date_to:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': self._bound(date_to + datetime.timedelta(days=1))})
+        # values_list joins names in SQL and skips model instances; iterator() reads the cursor in chunks
+        queryset = queryset.order_by(self.date_field, 'id').values_list(*self.fields)
+        return queryset.iterator(chunk_size=CHUNK_SIZE)
+
+
+EXPORTS = {
+    'results': Export(Result, [
+        ('Result ID', 'id'), ('Student ID', 'student_id'), ('Student', 'student__name'), ('Email', 'student__email'),
+        ('Course', 'course__name'), ('Marks', 'marks'), ('Description', 'description'), ('Uploaded at', 'uploaded_at'),
+    ], 'uploaded_at'),
+    'attendance': Export(Attendance, [
+        ('Attendance ID', 'id'), ('Date', 'date'), ('Student ID', 'student_id'), ('Student', 'student__name'),
+        ('Course', 'course__name'), ('Present', 'status'),
+    ], 'date'),
+    # A course filter selects the payments allocated to that course
+    'fees': Export(Fee, [
+        ('Fee ID', 'id'), ('Paid on', 'paid_on'), ('Student ID', 'student_id'), ('Student', 'student__name'),
+        ('Email', 'student__email'), ('Course', 'course__name'), ('Amount', 'amount'),
+    ], 'paid_on'),
+}
+
+
+def parse_filters(params):
+    """Validated filter keyword arguments from a dict of strings (GET params or command options)."""
+    filters = {}
+    for name in ('course', 'student'):
+        value = params.get(name) or ''
+        if value:
+            if not str(value).isdigit():
+                raise ExportError(f'{name} must be an id.')
+            filters[name] = int(value)
+    for name, key in (('from', 'date_from'), ('to', 'date_to')):
+        value = params.get(name) or ''
+        if value:
+            try:
+                filters[key] = parse_date(str(value))
+            except ValueError:
+                filters[key] = None
+            if filters[key] is None:
+                raise ExportError(f'{name} must be a date in YYYY-MM-DD format.')
+    return filters
+
+
+def get_export(name):
+    if name not in EXPORTS:
+        raise ExportError(f'Unknown export {name!r}; choose one of {", ".join(EXPORTS)}.')
+    return EXPORTS[name]
+
+
+def escape_formula(value):
+    """Prefix text that a spreadsheet would evaluate with ``'`` so it opens as plain text."""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """File-like object whose write() hands the line back, so csv.writer output can be yielded."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(export, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(export.headers)
+    lines = []
+    for row in rows:
+        lines.append(writer.writerow([escape_formula(value) for value in row]))
+        if len(lines) >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def write_xlsx(export, rows):
+    """Write the rows to a temporary .xlsx file and return it, rewound.
+
+    XLSX is a zip archive that cannot be emitted incrementally, so it is
+    built on disk with openpyxl's write-only mode, which keeps memory flat.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ExportError('XLSX export requires openpyxl (pip install openpyxl); use format=csv.')
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(export.headers)
+    for row in rows:
+        # Excel has no time zones; write aware datetimes as UTC wall time
+        sheet.append([value.replace(tzinfo=None) if isinstance(value, datetime.datetime) else escape_formula(value)
+                      for value in row])
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
@@ -0,0 +1,90 @@
+import hashlib
+import time
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.db import transaction
+from django.middleware.csrf import get_token
+
+from .models import Announcement
+from .roles import get_roles
+
+# Newest announcements kept per partition, and so shown in the feed
+FEED_LIMIT = 100
+# Partitions and the stamp live in the shared cache (CACHES in settings), so an announcement
+# posted through any process changes the feed and its ETag for every worker
+FEED_TIMEOUT = 24 * 60 * 60
+ALL = 'all'
+FEED_KEY = 'coaching:feed:{}'
+STAMP_KEY = 'coaching:feed:stamp'
+
+# Announcement.for_role values granted by each group
+ROLE_GROUPS = {'Students': 'student', 'Teachers': 'teacher'}
+PARTITIONS = [ALL] + [value for value, _ in Announcement._meta.get_field('for_role').choices]
+
+
+def roles_for(user):
+    """``for_role`` values the user can see, derived from the cached role set."""
+    roles = {ROLE_GROUPS[name] for name in get_roles(user) if name in ROLE_GROUPS}
+    if user.is_superuser:
+        roles.add('admin')
+    return roles
+
+
+def _partition(name):
+    key = FEED_KEY.format(name)
+    rows = cache.get(key)
+    if rows is None:
+        announcements = Announcement.objects.select_related('created_by')
+        if name == ALL:
+            announcements = announcements.filter(for_all=True)
+        else:
+            # Role partitions hold only targeted announcements so partitions never overlap
+            announcements = announcements.filter(for_all=False, for_role=name)
+        rows = list(announcements.order_by('-created_at', '-id')[:FEED_LIMIT])
+        cache.set(key, rows, FEED_TIMEOUT)
+    return rows
+
+
+def get_feed(roles):
+    """Announcements for everyone plus those targeted at ``roles``, newest first."""
+    rows = list(_partition(ALL))
+    for role in sorted(roles):
+        rows.extend(_partition(role))
+    rows.sort(key=lambda a: (a.created_at, a.id), reverse=True)
+    return rows[:FEED_LIMIT]
+
+
+def get_stamp():
+    """Time of the last feed change; (re)initialised to now if the cache lost it."""
+    stamp = cache.get(STAMP_KEY)
+    if stamp is None:
+        stamp = time.time()
+        cache.add(STAMP_KEY, stamp, None)
+        stamp = cache.get(STAMP_KEY, stamp)
+    return stamp
+
+
+def invalidate():
+    cache.delete_many([FEED_KEY.format(name) for name in PARTITIONS])
+    cache.set(STAMP_KEY, time.time(), None)
+
+
+def invalidate_on_commit():
+    transaction.on_commit(invalidate)
+
+
+def etag(request, *args, **kwargs):
+    """Validator for the whole announcements page, or None when it must not be answered with a 304.
+
+    Besides the feed, the page shows the user's navbar, a CSRF token that
+    changes on login and logout, and any flash messages, so all of them are
+    part of the tag. Pages with pending messages get no ETag: the render
+    consumes them.
+    """
+    if len(messages.get_messages(request)):
+        return None
+    get_token(request)
+    roles = ','.join(sorted(roles_for(request.user)))
+    key = f"{get_stamp()}:{request.user.pk}:{roles}:{request.META['CSRF_COOKIE']}"
+    return hashlib.md5(key.encode()).hexdigest()
@@ -0,0 +1,137 @@
+import datetime
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Func, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .db import CommitBatch
+from .models import Fee, FeeMonthlyTotal, FeeSchedule, Student
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=MONEY)
+# Balances below a cent are rounding noise from summing decimals in SQLite, not debt
+MIN_BALANCE = Decimal('0.01')
+
+
+def month_start(value):
+    if isinstance(value, str):
+        value = datetime.date.fromisoformat(value)
+    return value.replace(day=1)
+
+
+def _next_month(month):
+    return (month + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _total(queryset, field='amount'):
+    """A scalar subquery summing ``field`` over ``queryset``; no GROUP BY, so it stays correlated."""
+    return Coalesce(Subquery(queryset.order_by().values(total=Func(F(field), function='SUM'))[:1], output_field=MONEY), ZERO)
+
+
+def with_balances(students=None, as_of=None):
+    """Annotate students with ``due``, ``paid`` and ``balance``, all summed in SQL.
+
+    ``due`` totals the schedules of the student's enrolled courses that fell due
+    by ``as_of`` (today by default); ``paid`` totals every payment. Each is one
+    correlated subquery reading the student's own rows through an index, so the
+    cost grows with the students asked for rather than with the fee tables.
+    """
+    as_of = as_of or timezone.localdate()
+    students = Student.objects.all() if students is None else students
+    due = FeeSchedule.objects.filter(course__student=OuterRef('pk'), due_date__lte=as_of)
+    paid = Fee.objects.filter(student=OuterRef('pk'))
+    return students.annotate(due=_total(due), paid=_total(paid)).annotate(
+        balance=ExpressionWrapper(F('due') - F('paid'), output_field=MONEY))
+
+
+def defaulters(course_id=None, as_of=None):
+    """Students owing at least MIN_BALANCE, for keyset pagination by ('-balance', 'id')."""
+    students = Student.objects.all()
+    if course_id:
+        students = students.filter(enrolled_courses=course_id)
+    return with_balances(students, as_of).filter(balance__gte=MIN_BALANCE)
+
+
+def ledger(student, as_of=None):
+    """One student's schedules and payments, newest first, with totals as of ``as_of``."""
+    as_of = as_of or timezone.localdate()
+    schedules = list(
+        FeeSchedule.objects.filter(course__student=student).select_related('course').order_by('-due_date', '-id'))
+    payments = list(Fee.objects.filter(student=student).select_related('course').order_by('-paid_on', '-id'))
+    due = sum((item.amount for item in schedules if item.due_date <= as_of), Decimal('0'))
+    paid = sum((item.amount for item in payments), Decimal('0'))
+    return {
+        'schedules': schedules, 'payments': payments, 'as_of': as_of,
+        'due': due, 'paid': paid, 'balance': due - paid,
+    }
+
+
+def monthly_totals(months=12, course_id=None):
+    """``[{'month', 'payments', 'amount'}]`` for the last ``months`` months, read from the rollup table."""
+    since = month_start(timezone.localdate())
+    for _ in range(months - 1):
+        since = (since - datetime.timedelta(days=1)).replace(day=1)
+    rows = FeeMonthlyTotal.objects.filter(month__gte=since)
+    if course_id:
+        rows = rows.filter(course_id=course_id)
+    return list(
+        rows.values('month').annotate(payments=Sum('payments'), amount=Sum('amount')).order_by('-month'))
+
+
+def _bucket(month, course_id):
+    fees = Fee.objects.filter(paid_on__gte=month, paid_on__lt=_next_month(month))
+    return fees.filter(course__isnull=True) if course_id is None else fees.filter(course_id=course_id)
+
+
+def refresh(buckets):
+    """Recompute the rollup rows of ``(month, course_id)`` buckets from the Fee rows in them.
+
+    Each bucket is one range read on (course, paid_on), so a write costs the
+    payments of one course in one month. Rows are upserted in place (one row
+    per bucket, see FeeMonthlyTotal's constraints); an emptied bucket loses
+    its row.
+    """
+    with transaction.atomic():
+        for month, course_id in buckets:
+            totals = _bucket(month, course_id).aggregate(payments=Count('id'), amount=Sum('amount'))
+            # course_id=None matches the unallocated row (IS NULL)
+            existing = FeeMonthlyTotal.objects.filter(month=month, course_id=course_id)
+            if not totals['payments']:
+                existing.delete()
+                continue
+            values = {'payments': totals['payments'], 'amount': totals['amount'], 'updated_at': timezone.now()}
+            if existing.update(**values):
+                continue
+            try:
+                with transaction.atomic():
+                    FeeMonthlyTotal.objects.create(month=month, course_id=course_id, **values)
+            except IntegrityError:
+                # A concurrent refresh inserted the row first
+                existing.update(**values)
+
+
+# (month, course_id) buckets touched by the current transaction
+_pending = CommitBatch(refresh)
+
+
+def mark_dirty(paid_on, course_id):
+    """Schedule a refresh of the bucket holding a payment once the transaction commits."""
+    if paid_on is not None:
+        _pending.add((month_start(paid_on), course_id))
+
+
+def rebuild():
+    """Drop and recompute the whole rollup table in one grouped query. Returns the number of rows written."""
+    rows = (
+        Fee.objects.annotate(month=TruncMonth('paid_on')).values('month', 'course_id')
+        .annotate(payments=Count('id'), amount=Sum('amount')).order_by()
+    )
+    with transaction.atomic():
+        FeeMonthlyTotal.objects.all().delete()
+        created = FeeMonthlyTotal.objects.bulk_create(
+            [FeeMonthlyTotal(month=month_start(row['month']), course_id=row['course_id'], payments=row['payments'],
+                             amount=row['amount']) for row in rows.iterator()],
+            batch_size=500)
+    return len(created)
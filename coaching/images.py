@@ -0,0 +1,120 @@
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import jobs
+from .models import Course
+
+# Square thumbnail edges in pixels: the catalog card shows 74px, 148px covers 2x screens
+THUMBNAIL_SIZES = (74, 148)
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+
+def _fallback_format(image):
+    # JPEG has no alpha channel; keep transparent sources as PNG
+    return 'png' if image.mode in ('RGBA', 'LA') else 'jpeg'
+
+
+def _load(field):
+    """First frame of the source image, converted to RGB or RGBA."""
+    field.open('rb')
+    try:
+        with Image.open(field) as image:
+            image.seek(0)
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+                image = image.convert('RGBA')
+                # Palette GIFs often declare a transparent index they never use
+                if image.getextrema()[3][0] < 255:
+                    return image
+            return image.convert('RGB')
+    finally:
+        field.close()
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=6)
+    elif fmt == 'jpeg':
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def derive(course):
+    """Write thumbnails for ``course.image`` next to it and return the variant map.
+
+    File names carry a digest of the source name, so a new upload gets new
+    URLs and browsers never show a stale thumbnail.
+    """
+    field = course.image
+    storage = field.storage
+    source = _load(field)
+    stem = os.path.splitext(field.name)[0]
+    digest = hashlib.sha1(field.name.encode()).hexdigest()[:8]
+    fallback = _fallback_format(source)
+    variants = {'source': field.name, 'fallback': fallback, 'webp': {}, fallback: {}}
+    for size in THUMBNAIL_SIZES:
+        thumb = ImageOps.fit(source, (size, size), Image.LANCZOS)
+        for fmt in ('webp', fallback):
+            name = f'{stem}.{digest}.{size}.{"jpg" if fmt == "jpeg" else fmt}'
+            if storage.exists(name):
+                storage.delete(name)
+            variants[fmt][str(size)] = storage.save(name, ContentFile(_encode(thumb, fmt)))
+    return variants
+
+
+def _variant_names(variants):
+    return {name for fmt in ('webp', variants.get('fallback')) for name in variants.get(fmt, {}).values()}
+
+
+def refresh(course):
+    """Bring the stored variants in line with ``course.image``; a no-op when they already match."""
+    variants = course.image_variants or {}
+    name = course.image.name if course.image else ''
+    if variants.get('source', '') == name:
+        return variants
+    new = {}
+    if name:
+        try:
+            new = derive(course)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            # Unreadable uploads keep being served as the original file
+            new = {'source': name}
+    for stale in _variant_names(variants) - _variant_names(new):
+        course.image.storage.delete(stale)
+    # update() rather than save() so the post_save hook does not run again
+    Course.objects.filter(pk=course.pk).update(image_variants=new)
+    course.image_variants = new
+    return new
+
+
+def refresh_on_commit(course):
+    # Decoding and resizing can take seconds for large uploads; run it on the job queue
+    jobs.enqueue_on_commit('course_images.derive', course_id=course.pk)
+
+
+def sources(course):
+    """``srcset`` strings for a course card; empty when no thumbnails exist."""
+    variants = course.image_variants or {}
+    fallback = variants.get('fallback')
+    if not fallback or variants.get('source') != (course.image.name if course.image else ''):
+        return {}
+    storage = course.image.storage
+
+    def srcset(fmt):
+        return ', '.join(f'{storage.url(name)} {size}w' for size, name in sorted(variants[fmt].items(), key=lambda item: int(item[0])))
+
+    smallest = variants[fallback][str(min(THUMBNAIL_SIZES))]
+    return {
+        'webp': srcset('webp'),
+        'fallback': srcset(fallback),
+        'fallback_type': f'image/{fallback}',
+        'src': storage.url(smallest),
+    }
@@ -0,0 +1,235 @@
+import csv
+import datetime
+import io
+import os
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import counters, enrollment
+from .models import Course, Student, WaitlistEntry
+from .profiles import invalidate_enrollments
+
+Enrollment = Student.enrolled_courses.through
+
+# Rows validated and written per transaction
+CHUNK_SIZE = 1000
+# Errors kept on the report; later ones are only counted
+MAX_REPORTED_ERRORS = 1000
+
+COLUMNS = ('name', 'email', 'phone', 'address', 'dob', 'gender', 'courses')
+# Separator between course names or ids in the ``courses`` column
+COURSE_SEPARATOR = ';'
+
+
+class ImportFileError(Exception):
+    """The file as a whole cannot be read; no rows were imported."""
+
+
+class ImportReport:
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.existing = 0
+        self.enrollments = 0
+        self.waitlisted = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return (f'{self.rows} rows: {self.created} students created, {self.existing} already existed, '
+                f'{self.enrollments} enrollments added, {self.waitlisted} waitlisted for full courses, '
+                f'{self.error_count} rows rejected.')
+
+
+def _normalise_header(header):
+    return [(column or '').strip().lower() for column in header]
+
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    try:
+        reader = csv.reader(text)
+        header = _normalise_header(next(reader, []))
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, row))
+    finally:
+        text.detach()
+
+
+def _xlsx_rows(fileobj):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError('Reading .xlsx files requires openpyxl (pip install openpyxl).')
+    # read_only streams rows from the sheet XML instead of loading the workbook
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = _normalise_header(str(cell) if cell is not None else '' for cell in next(rows, ()))
+        for line, row in enumerate(rows, start=2):
+            if any(value is not None for value in row):
+                yield line, {column: '' if value is None else value for column, value in zip(header, row)}
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """``(line, row dict)`` pairs from a binary CSV or XLSX file, read lazily."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.xlsx':
+        return _xlsx_rows(fileobj)
+    if extension in ('.csv', '.txt', ''):
+        return _csv_rows(fileobj)
+    raise ImportFileError(f'Unsupported file type {extension!r}; upload a .csv or .xlsx file.')
+
+
+def _course_lookup():
+    # Courses are few; map both names and ids so the file may use either
+    lookup = {}
+    for pk, name in Course.objects.values_list('id', 'name'):
+        lookup[name.strip().lower()] = pk
+        lookup[str(pk)] = pk
+    return lookup
+
+
+def _cell(row, column):
+    value = row.get(column, '')
+    if isinstance(value, datetime.datetime):
+        # XLSX date cells arrive as datetimes
+        return value.date().isoformat()
+    return str(value).strip()
+
+
+def _parse(row, courses):
+    """A validated unsaved Student and its course ids, or raise ValidationError."""
+    email = _cell(row, 'email')
+    if '@' in email:
+        local, domain = email.rsplit('@', 1)
+        email = f'{local}@{domain.lower()}'
+    student = Student(
+        name=_cell(row, 'name'), email=email, phone=_cell(row, 'phone'),
+        address=_cell(row, 'address') or None, dob=_cell(row, 'dob') or None, gender=_cell(row, 'gender') or None,
+    )
+    # Uniqueness is settled per chunk against the database, not per row
+    student.full_clean(exclude=['user', 'enrolled_courses'], validate_unique=False)
+    course_ids = set()
+    for token in filter(None, (part.strip() for part in _cell(row, 'courses').split(COURSE_SEPARATOR))):
+        course_id = courses.get(token.lower())
+        if course_id is None:
+            raise ValidationError({'courses': f'Unknown course {token!r}.'})
+        course_ids.add(course_id)
+    return student, course_ids
+
+
+def _format_error(exc):
+    if hasattr(exc, 'message_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in exc.message_dict.items())
+    return ' '.join(exc.messages)
+
+
+def _import_chunk(chunk, courses, report, on_error):
+    parsed = {}
+    for line, row in chunk:
+        report.rows += 1
+        try:
+            student, course_ids = _parse(row, courses)
+        except ValidationError as exc:
+            message = _format_error(exc)
+            report.add_error(line, message)
+            if on_error:
+                on_error(line, message)
+            continue
+        if student.email in parsed:
+            # Repeated email within the file: one student, enrolled in every listed course
+            parsed[student.email][1].update(course_ids)
+        else:
+            parsed[student.email] = (student, course_ids)
+    if not parsed:
+        return
+
+    with transaction.atomic():
+        existing = set(Student.objects.filter(email__in=parsed).values_list('email', flat=True))
+        new = [student for email, (student, _) in parsed.items() if email not in existing]
+        # ignore_conflicts keeps a concurrent registration of the same email from failing the chunk
+        Student.objects.bulk_create(new, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+        ids = dict(Student.objects.filter(email__in=parsed).values_list('email', 'id'))
+        wanted = [
+            (ids[email], course_id)
+            for email, (_, course_ids) in parsed.items() if email in ids
+            for course_id in sorted(course_ids)
+        ]
+        links, waiting = _allot_seats(wanted) if wanted else ([], [])
+        Enrollment.objects.bulk_create(links, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+        # Full courses waitlist the rest, behind everyone already waiting, as enroll() would
+        WaitlistEntry.objects.bulk_create(waiting, batch_size=CHUNK_SIZE, ignore_conflicts=True)
+        # bulk_create sends no signals; keep the cached counts and enrollment sets in step by hand
+        if len(ids) != len(existing):
+            counters.invalidate_on_commit('students')
+        if links:
+            invalidate_enrollments(*{link.student_id for link in links})
+            course_ids = {link.course_id for link in links}
+            enrollment.recount(course_ids)
+            enrollment.drop_enrolled_from_waitlists(course_ids, ids.values())
+    report.existing += len(existing)
+    report.created += len(ids) - len(existing)
+    report.enrollments += len(links)
+    report.waitlisted += len(waiting)
+
+
+def _allot_seats(wanted):
+    """Split ``(student_id, course_id)`` pairs into new Enrollment rows and, past capacity, WaitlistEntry rows.
+
+    Pairs already enrolled are dropped. The course rows are locked until the
+    chunk commits (SQLite's write transaction already excludes other writers),
+    so concurrent enroll() calls cannot take the seats counted free here.
+    """
+    student_ids = {student_id for student_id, _ in wanted}
+    course_ids = {course_id for _, course_id in wanted}
+    enrolled = set(Enrollment.objects.filter(student_id__in=student_ids, course_id__in=course_ids).values_list(
+        'student_id', 'course_id'))
+    free = {
+        pk: None if capacity is None else max(capacity - taken, 0)
+        for pk, capacity, taken in Course.objects.select_for_update().filter(pk__in=course_ids).values_list(
+            'id', 'capacity', 'seats_taken')
+    }
+    links, waiting = [], []
+    for student_id, course_id in wanted:
+        if (student_id, course_id) in enrolled or course_id not in free:
+            # Already enrolled, or the course was deleted since the lookup
+            continue
+        if free[course_id] == 0:
+            waiting.append(WaitlistEntry(student_id=student_id, course_id=course_id))
+            continue
+        if free[course_id] is not None:
+            free[course_id] -= 1
+        links.append(Enrollment(student_id=student_id, course_id=course_id))
+    return links, waiting
+
+
+def import_students(rows, chunk_size=CHUNK_SIZE, on_error=None):
+    """Create students and enrollments from ``(line, row)`` pairs, ``chunk_size`` rows at a time.
+
+    Existing students (matched by email) are not modified but are enrolled in
+    any new courses. Enrollments respect course capacity, in file order; once
+    a course is full the remaining students join its waitlist. Invalid rows
+    are reported and skipped; each chunk is written in its own transaction,
+    so memory use does not depend on the file size. ``on_error(line, message)`` is called for every rejected row.
+    """
+    report = ImportReport()
+    courses = _course_lookup()
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _import_chunk(chunk, courses, report, on_error)
+    return report
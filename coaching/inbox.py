@@ -0,0 +1,70 @@
+from django.db import transaction
+from django.db.models import Case, F, PositiveIntegerField, Sum, When
+from django.utils import timezone
+
+from .models import Conversation, ConversationMember, Message
+
+
+def conversation_key(user_id, other_id):
+    low, high = sorted((user_id, other_id))
+    return f'{low}:{high}'
+
+
+def get_conversation(user, other):
+    """The conversation between two users, created with its member rows on first use."""
+    conversation, created = Conversation.objects.get_or_create(key=conversation_key(user.pk, other.pk))
+    if created:
+        ConversationMember.objects.bulk_create([
+            ConversationMember(conversation=conversation, user_id=user_id, peer_id=peer_id)
+            for user_id, peer_id in {(user.pk, other.pk), (other.pk, user.pk)}
+        ])
+    return conversation
+
+
+def send_message(sender, receiver, content, reply_to=None):
+    """Store a message and bump the conversation pointers and the receiver's unread count."""
+    with transaction.atomic():
+        conversation = get_conversation(sender, receiver)
+        message = Message.objects.create(
+            sender=sender, receiver=receiver, content=content, reply_to=reply_to, conversation=conversation)
+        Conversation.objects.filter(pk=conversation.pk).update(last_message=message, last_message_at=message.sent_at)
+        ConversationMember.objects.filter(conversation=conversation).update(
+            last_message_at=message.sent_at,
+            unread_count=Case(
+                When(user=receiver, then=F('unread_count') + 1),
+                default=F('unread_count'),
+                output_field=PositiveIntegerField(),
+            ),
+        )
+    return message
+
+
+def inbox(user):
+    """The user's conversations, newest activity first when ordered by (-last_message_at, -id)."""
+    return ConversationMember.objects.filter(user=user).select_related(
+        'peer', 'conversation__last_message')
+
+
+def get_membership(user, conversation_id):
+    return ConversationMember.objects.select_related('peer', 'conversation').filter(
+        user=user, conversation_id=conversation_id).first()
+
+
+def thread(conversation):
+    """Messages of one conversation; page it by (-sent_at, -id) on the thread index."""
+    return Message.objects.filter(conversation=conversation).select_related('sender')
+
+
+def mark_read(membership):
+    if not membership.unread_count:
+        return
+    with transaction.atomic():
+        Message.objects.filter(
+            conversation_id=membership.conversation_id, receiver_id=membership.user_id, read_at__isnull=True,
+        ).update(read_at=timezone.now())
+        ConversationMember.objects.filter(pk=membership.pk).update(unread_count=0)
+    membership.unread_count = 0
+
+
+def unread_total(user):
+    return ConversationMember.objects.filter(user=user).aggregate(total=Sum('unread_count'))['total'] or 0
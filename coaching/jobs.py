@@ -0,0 +1,162 @@
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Registered task name -> function taking the job's kwargs
+TASKS = {}
+
+
+def task(name):
+    """Register a function as a background task under ``name``; kwargs must be JSON-serialisable."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, priority=0, delay=None, max_attempts=3, **kwargs):
+    """Queue a task; inside a transaction the worker sees it only once it commits."""
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name!r}.')
+    run_at = timezone.now() + (delay or timedelta(0))
+    return Job.objects.create(name=name, kwargs=kwargs, priority=priority, run_at=run_at, max_attempts=max_attempts)
+
+
+def enqueue_on_commit(name, **options):
+    transaction.on_commit(lambda: enqueue(name, **options))
+
+
+def worker_name(index=0):
+    return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+
+def claim(worker):
+    """Lock and return the next ready job, or ``None``.
+
+    The candidate is locked with a conditional UPDATE on its status, which
+    works on every backend; if another worker won the race the next
+    candidate is tried.
+    """
+    ready = Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now()).order_by('-priority', 'run_at', 'id')
+    for pk in ready.values_list('pk', flat=True)[:10]:
+        now = timezone.now()
+        locked = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now, heartbeat_at=now, attempts=F('attempts') + 1)
+        if locked:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+class Heartbeat(threading.Thread):
+    """Touch a running job's heartbeat_at every JOB_HEARTBEAT_INTERVAL seconds until stopped.
+
+    A long job keeps its lock this way, while one whose worker died stops
+    beating and is picked up by ``requeue_stale``.
+    """
+
+    def __init__(self, job):
+        super().__init__(name=f'heartbeat-{job.pk}', daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT_INTERVAL):
+                try:
+                    Job.objects.filter(pk=self.job.pk, status=Job.RUNNING, locked_by=self.job.locked_by).update(
+                        heartbeat_at=timezone.now())
+                except Exception:
+                    # e.g. "database is locked" while the job holds a long write; the next tick tries again
+                    logger.exception('Heartbeat for job %s failed', self.job)
+        finally:
+            # This thread's own connection
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """Run a claimed job and record the outcome; failures are retried with exponential backoff."""
+    heartbeat = Heartbeat(job)
+    heartbeat.start()
+    try:
+        func = TASKS[job.name]
+        func(**job.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s failed (attempt %s of %s)', job, job.attempts, job.max_attempts, exc_info=True)
+        update = {'last_error': error, 'locked_by': '', 'locked_at': None, 'heartbeat_at': None}
+        if job.attempts < job.max_attempts:
+            backoff = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            update.update(status=Job.QUEUED, run_at=timezone.now() + timedelta(seconds=backoff))
+        else:
+            update.update(status=Job.FAILED, finished_at=timezone.now())
+    else:
+        update = {'status': Job.DONE, 'finished_at': timezone.now(), 'last_error': '', 'locked_by': '', 'locked_at': None,
+                  'heartbeat_at': None}
+    finally:
+        heartbeat.stop()
+    # Only while this worker still owns the job; if it was released and claimed again, the new owner records the outcome
+    owned = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(**update)
+    if not owned:
+        logger.warning('Job %s was released while running; discarding its result', job)
+        return job
+    for field, value in update.items():
+        setattr(job, field, value)
+    return job
+
+
+def requeue_stale():
+    """Release running jobs whose worker stopped sending heartbeats; returns how many were released.
+
+    The takeover counts as an attempt (``claim`` already counted it), so a job
+    that keeps killing its worker is marked failed after max_attempts instead
+    of being requeued forever.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, heartbeat_at__lt=now - timedelta(seconds=settings.JOB_HEARTBEAT_TIMEOUT))
+    released = {'locked_by': '', 'locked_at': None, 'heartbeat_at': None, 'last_error': 'The worker stopped responding.'}
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(status=Job.FAILED, finished_at=now, **released)
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(status=Job.QUEUED, run_at=now, **released)
+    return failed + requeued
+
+
+def run_pending(worker=None, limit=None):
+    """Run ready jobs in this process until none are left (or ``limit`` ran); returns the count."""
+    worker = worker or worker_name()
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+        # Long-lived workers must not hold a connection past CONN_MAX_AGE or a server restart
+        close_old_connections()
+    return count
+
+
+def retry(queryset):
+    """Requeue finished or failed jobs to run again now."""
+    return queryset.exclude(status=Job.RUNNING).update(
+        status=Job.QUEUED, run_at=timezone.now(), attempts=0, last_error='', finished_at=None)
+
+
+def purge(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()[0]
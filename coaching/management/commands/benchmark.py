@@ -0,0 +1,52 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coaching import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Request every route through the test client and report p50/p95 latency, query count and '
+            'response size as JSON, optionally checked against a baseline report.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('routes', nargs='*', help='URL names to run; all by default.')
+        parser.add_argument('--repeat', type=int, default=benchmark.DEFAULT_REPEAT, help='Timed requests per route.')
+        parser.add_argument('-o', '--output', help='Write the JSON report to this file instead of stdout.')
+        parser.add_argument('--baseline', help='Earlier report; exit with an error if any route regressed.')
+        parser.add_argument('--tolerance', type=float, default=benchmark.DEFAULT_TOLERANCE,
+                            help='Allowed relative p95 slowdown against the baseline.')
+
+    def handle(self, *args, **options):
+        unknown = sorted(set(options['routes']) - set(benchmark.ROUTES))
+        if unknown:
+            raise CommandError(f'Unknown routes: {", ".join(unknown)}.')
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as source:
+                baseline = json.load(source)
+            if options['routes']:
+                # Only the routes being run are compared
+                baseline['routes'] = {name: result for name, result in baseline.get('routes', {}).items()
+                                      if name in options['routes']}
+
+        def progress(name, result):
+            self.stderr.write(f'{name:<24} {result["status"]} {result["p50_ms"]:>8.2f}ms {result["p95_ms"]:>8.2f}ms '
+                              f'{result["queries"]:>4} queries {result["bytes"]:>8} bytes')
+
+        report = benchmark.run(options['repeat'], options['routes'] or None, progress=progress)
+        # Stable key order keeps reports diffable
+        text = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as target:
+                target.write(text + '\n')
+        else:
+            self.stdout.write(text)
+
+        if baseline is not None:
+            problems = benchmark.compare(report, baseline, options['tolerance'])
+            if problems:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(problems))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from coaching import images
+from coaching.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or stale course image thumbnails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate thumbnails that are already up to date.')
+
+    def handle(self, *args, **options):
+        count = 0
+        for course in Course.objects.exclude(image='').exclude(image__isnull=True).iterator():
+            if options['force']:
+                course.image_variants = {**course.image_variants, 'source': None}
+            before = course.image_variants.get('source')
+            if images.refresh(course).get('source') != before:
+                count += 1
+        self.stdout.write(self.style.SUCCESS(f'Derived thumbnails for {count} courses.'))
@@ -0,0 +1,38 @@
+import shutil
+
+from django.core.management.base import BaseCommand, CommandError
+
+from coaching import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream results, attendance or fees to CSV or XLSX, optionally filtered by course, student and date range.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(exports.EXPORTS))
+        parser.add_argument('--format', choices=exports.FORMATS, default='csv')
+        parser.add_argument('--course', help='Course id.')
+        parser.add_argument('--student', help='Student id.')
+        parser.add_argument('--from', dest='from', help='First date, YYYY-MM-DD.')
+        parser.add_argument('--to', help='Last date, YYYY-MM-DD, inclusive.')
+        parser.add_argument('-o', '--output', help='File to write; defaults to stdout for CSV.')
+
+    def handle(self, *args, **options):
+        export = exports.get_export(options['name'])
+        try:
+            rows = export.rows(**exports.parse_filters(options))
+            if options['format'] == 'xlsx':
+                if not options['output']:
+                    raise CommandError('XLSX output needs --output.')
+                with exports.write_xlsx(export, rows) as source, open(options['output'], 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                return
+        except exports.ExportError as exc:
+            raise CommandError(exc)
+        if not options['output']:
+            for chunk in exports.iter_csv(export, rows):
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as target:
+            for chunk in exports.iter_csv(export, rows):
+                target.write(chunk)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coaching import importer
+
+
+class Command(BaseCommand):
+    help = ('Import students and their enrollments from a CSV or XLSX file with the columns '
+            'name, email, phone, address, dob, gender and courses (names or ids separated by ";").')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        def on_error(line, message):
+            self.stderr.write(f'line {line}: {message}')
+
+        try:
+            with open(options['path'], 'rb') as fileobj:
+                rows = importer.read_rows(fileobj, options['path'])
+                report = importer.import_students(rows, chunk_size=options['chunk_size'], on_error=on_error)
+        except (OSError, importer.ImportFileError) as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(str(report)))
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from coaching import events
+
+
+class Command(BaseCommand):
+    help = 'Delete pushed events older than the given number of days; clients offline longer reload instead of replaying.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.EVENTS_RETENTION_DAYS)
+
+    def handle(self, *args, **options):
+        count = events.purge(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} events.'))
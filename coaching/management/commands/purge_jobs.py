@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from coaching import jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete finished background jobs older than the given number of days; failed jobs are kept.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=7)
+
+    def handle(self, *args, **options):
+        count = jobs.purge(options['days'])
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} jobs.'))
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from coaching import uploads
+from coaching.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete resumable uploads that were completed or abandoned, along with their part files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=48, help='Drop unfinished uploads idle for longer than this.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = UploadSession.objects.filter(completed_at__isnull=False) | UploadSession.objects.filter(updated_at__lt=cutoff)
+        count = 0
+        for session in stale.iterator():
+            uploads.discard(session)
+            count += 1
+        stale.delete()
+        self.stdout.write(self.style.SUCCESS(f'Purged {count} uploads.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from coaching import analytics
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-student, per-course analytics table from Attendance and Result.'
+
+    def handle(self, *args, **options):
+        count = analytics.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt analytics for {count} student/course pairs.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from coaching import fees
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly fee totals from the Fee table.'
+
+    def handle(self, *args, **options):
+        count = fees.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} monthly fee totals.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coaching import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index; needed after bulk inserts, which bypass the save signals.'
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError('The search index needs SQLite FTS5; other databases search with icontains.')
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} documents.'))
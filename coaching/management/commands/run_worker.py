@@ -0,0 +1,92 @@
+import multiprocessing
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from coaching import jobs
+
+# How often the supervisor puts back jobs abandoned by a crashed worker
+STALE_CHECK_INTERVAL = 60
+
+
+class Stop:
+    """Set from a signal handler; a worker exits once its current job finishes."""
+
+    requested = False
+
+    @classmethod
+    def on(cls, *signals):
+        for signum in signals:
+            signal.signal(signum, cls.request)
+
+    @classmethod
+    def request(cls, signum=None, frame=None):
+        cls.requested = True
+
+
+def _work(index, poll_interval, burst, requeue=False):
+    worker = jobs.worker_name(index)
+    last_check = time.monotonic()
+    while not Stop.requested:
+        # A lone worker has no supervisor to put back jobs abandoned by other crashed workers
+        if requeue and time.monotonic() - last_check > STALE_CHECK_INTERVAL:
+            jobs.requeue_stale()
+            last_check = time.monotonic()
+        if not jobs.run_pending(worker, limit=1):
+            if burst:
+                break
+            time.sleep(poll_interval)
+    connections.close_all()
+
+
+def _child(index, poll_interval, burst):
+    # Ctrl-C reaches the whole process group; children wait for the supervisor's SIGTERM instead
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Stop.on(signal.SIGTERM)
+    _work(index, poll_interval, burst)
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue with a pool of worker processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.JOB_WORKERS, help='Worker processes to run.')
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL,
+                            help='Seconds an idle worker waits before checking the queue again.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        jobs.requeue_stale()
+        Stop.on(signal.SIGINT, signal.SIGTERM)
+        if options['workers'] <= 1:
+            _work(0, options['poll_interval'], options['burst'], requeue=True)
+            self.stdout.write('Worker stopped.')
+            return
+
+        # Forked children must open their own database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        pool = [
+            context.Process(target=_child, args=(index, options['poll_interval'], options['burst']))
+            for index in range(options['workers'])
+        ]
+        for process in pool:
+            process.start()
+        self.stdout.write(f'Started {len(pool)} workers.')
+        last_check = time.monotonic()
+        stopping = False
+        while any(process.is_alive() for process in pool):
+            if Stop.requested and not stopping:
+                stopping = True
+                self.stdout.write('Stopping after the current jobs...')
+                for process in pool:
+                    process.terminate()
+            for process in pool:
+                process.join(timeout=0.5)
+            if not stopping and time.monotonic() - last_check > STALE_CHECK_INTERVAL:
+                jobs.requeue_stale()
+                last_check = time.monotonic()
+        self.stdout.write('Workers stopped.')
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from coaching import seeding
+
+
+class Command(BaseCommand):
+    help = 'Seed a synthetic institute (courses, people, attendance, results, messages, ...) for benchmarking.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--courses', type=int, default=20)
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--teachers', type=int, default=10)
+        parser.add_argument('--attendance-days', type=int, default=20,
+                            help='Days of attendance recorded for every enrollment.')
+        parser.add_argument('--results', type=int, default=5000)
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--announcements', type=int, default=200)
+        parser.add_argument('--materials-per-course', type=int, default=20)
+        parser.add_argument('--assignments-per-course', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--password', default=seeding.DEFAULT_PASSWORD, help='Password of every seeded account.')
+
+    def handle(self, *args, **options):
+        sizes = {name: options[name] for name in (
+            'courses', 'students', 'teachers', 'attendance_days', 'results', 'messages', 'announcements',
+            'materials_per_course', 'assignments_per_course', 'seed', 'password')}
+        if any(value < 0 for name, value in sizes.items() if name != 'password'):
+            raise CommandError('Sizes must not be negative.')
+        try:
+            counts = seeding.seed(**sizes)
+        except seeding.SeedError as exc:
+            raise CommandError(exc)
+        for name, count in counts.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded. Log in as {seeding.USERNAME_PREFIX}admin-0, {seeding.USERNAME_PREFIX}teacher-0 or '
+            f'{seeding.USERNAME_PREFIX}student-0.'))
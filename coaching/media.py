@@ -0,0 +1,156 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+from . import feed
+from .models import Announcement, Assignment, Result, StudyMaterial
+from .profiles import get_enrolled_ids, get_student
+from .roles import is_teacher
+
+# Bytes read per iteration when Python streams a byte range itself
+BLOCK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# URL kind -> model holding the ``file`` field
+KINDS = {
+    'material': StudyMaterial,
+    'assignment': Assignment,
+    'result': Result,
+    'announcement': Announcement,
+}
+
+
+def can_access(request, kind, obj):
+    """Whether the current user may download ``obj``'s file."""
+    user = request.user
+    if kind == 'announcement' and obj.for_all:
+        return True
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser or is_teacher(user):
+        return True
+    if kind == 'announcement':
+        return obj.for_role in feed.roles_for(user)
+    if kind == 'result':
+        student = get_student(request)
+        return student is not None and obj.student_id == student.id
+    return obj.course_id in get_enrolled_ids(request)
+
+
+def etag(stat):
+    # Uploaded names are never rewritten in place, so size and mtime identify the bytes
+    return '"%x-%x"' % (stat.st_mtime_ns, stat.st_size)
+
+
+def parse_range(header, size):
+    """``(start, end)`` for a single ``bytes=`` range, ``None`` to send the whole file.
+
+    Raises ``ValueError`` when the range cannot be satisfied. Multi-range
+    requests are answered with the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        length = int(last)
+        if not length:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or last < first:
+        raise ValueError(header)
+    return first, last
+
+
+def _if_range_matches(request, tag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"'):
+        return value == tag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+def _content_disposition(filename):
+    try:
+        filename.encode('ascii')
+        return 'inline; filename="{}"'.format(filename.replace('\\', '\\\\').replace('"', r'\"'))
+    except UnicodeEncodeError:
+        return "inline; filename*=utf-8''{}".format(quote(filename))
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            block = fh.read(min(BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+def _offload(response, field):
+    backend = settings.MEDIA_SENDFILE
+    if backend == 'x-sendfile':
+        response['X-Sendfile'] = field.path
+    elif backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(field.name)
+    else:
+        raise ValueError(f'Unknown MEDIA_SENDFILE backend {backend!r}.')
+
+
+def serve(request, field):
+    """Send ``field``'s file with validators, byte ranges and optional proxy offload."""
+    path = field.path
+    stat = os.stat(path)
+    tag = etag(stat)
+    last_modified = http_date(stat.st_mtime)
+    not_modified = get_conditional_response(request, etag=tag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        return not_modified
+
+    filename = os.path.basename(field.name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    size = stat.st_size
+    byte_range = None
+    if settings.MEDIA_SENDFILE:
+        # The proxy handles Range itself once it owns the transfer
+        response = HttpResponse(content_type=content_type)
+        _offload(response, field)
+    else:
+        try:
+            if _if_range_matches(request, tag, stat.st_mtime):
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+            response['Content-Length'] = size
+        elif byte_range is None:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = _content_disposition(filename)
+    response['ETag'] = tag
+    response['Last-Modified'] = last_modified
+    # Access is checked per request, so shared caches must not keep a copy
+    response['Cache-Control'] = 'private, no-cache'
+    return response
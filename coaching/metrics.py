@@ -0,0 +1,282 @@
+import atexit
+import contextvars
+import heapq
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+
+slow_logger = logging.getLogger('coaching.metrics.slow')
+
+# Label for requests that resolved outside coaching/urls.py (admin, media, ...) or not at all;
+# keeps label cardinality bounded by the URL names we own
+OTHER = 'other'
+UNMATCHED = 'unmatched'
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'coaching_requests_total': ('counter', 'Requests served, by view, method and status.', None),
+    'coaching_request_duration_seconds': ('histogram', 'Time from request to response (last byte if streamed).', SECONDS_BUCKETS),
+    'coaching_request_queries': ('histogram', 'SQL statements executed per request.', QUERY_BUCKETS),
+    'coaching_request_sql_seconds': ('histogram', 'Time spent in SQL per request.', SECONDS_BUCKETS),
+    'coaching_request_template_seconds': ('histogram', 'Time spent rendering templates per request.', SECONDS_BUCKETS),
+    'coaching_response_size_bytes': ('histogram', 'Response body size.', BYTES_BUCKETS),
+}
+
+
+class Registry:
+    """Counters and histograms of this process, safe to update from several threads.
+
+    With METRICS_DIR set, every process periodically writes its values to a
+    file there and a scrape adds up the files of all processes, so any
+    worker can answer for the whole pool.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            # Per-bucket counts followed by sum and count; made cumulative on export
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [0] * (len(buckets) + 3)
+            index = next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+            state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return [[name, labels, list(value) if isinstance(value, list) else value]
+                    for (name, labels), value in self.values.items()]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+    def _path(self, directory):
+        return os.path.join(directory, f'metrics-{os.getpid()}.json')
+
+    def flush(self, force=False):
+        directory = getattr(settings, 'METRICS_DIR', None)
+        now = time.monotonic()
+        if not directory or (not force and now - self.last_flush < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.last_flush = now
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so a scrape never reads a half-written file
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as target:
+            json.dump(self.snapshot(), target)
+        os.replace(temp, self._path(directory))
+
+    def collect(self):
+        """Merged ``{(name, labels): value}`` over this process and, with METRICS_DIR, all others."""
+        snapshots = [self.snapshot()]
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory and os.path.isdir(directory):
+            own = self._path(directory)
+            for entry in os.scandir(directory):
+                if entry.name.startswith('metrics-') and entry.name.endswith('.json') and entry.path != own:
+                    try:
+                        with open(entry.path) as source:
+                            snapshots.append(json.load(source))
+                    except (OSError, ValueError):
+                        # Deleted or replaced while listing
+                        continue
+        merged = {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot:
+                if name not in METRICS:
+                    continue
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if isinstance(value, list):
+                    current = merged.setdefault(key, [0] * len(value))
+                    merged[key] = [a + b for a, b in zip(current, value)]
+                else:
+                    merged[key] = merged.get(key, 0) + value
+        return merged
+
+
+registry = Registry()
+atexit.register(registry.flush, force=True)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(values):
+    """Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        series = sorted((labels, value) for (metric, labels), value in values.items() if metric == name)
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in series:
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], value):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{name}_bucket{_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(value[-2])}')
+            lines.append(f'{name}_count{_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """What one request spent in SQL and templates."""
+
+    def __init__(self, keep_statements=0):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.bytes = 0
+        self.keep_statements = keep_statements
+        # Min-heap of (seconds, sql) holding the slowest statements
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.sql_seconds += elapsed
+            if self.keep_statements:
+                item = (elapsed, sql)
+                if len(self.statements) < self.keep_statements:
+                    heapq.heappush(self.statements, item)
+                elif item > self.statements[0]:
+                    heapq.heapreplace(self.statements, item)
+
+    def capture(self):
+        """Context manager timing every SQL statement on every configured database."""
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def template_rendered(seconds):
+    """Called by coaching.backends.templates for every top-level template render."""
+    stats = _current.get()
+    if stats is not None:
+        stats.template_seconds += seconds
+
+
+_url_names = None
+
+
+def view_label(request):
+    global _url_names
+    if _url_names is None:
+        from . import urls
+        _url_names = {pattern.name for pattern in urls.urlpatterns if pattern.name}
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED
+    return match.url_name if not match.namespace and match.url_name in _url_names else OTHER
+
+
+def record(view, method, status, seconds, stats):
+    labels = (('view', view),)
+    registry.inc('coaching_requests_total', (('view', view), ('method', method), ('status', str(status))))
+    registry.observe('coaching_request_duration_seconds', labels, seconds)
+    registry.observe('coaching_request_queries', labels, stats.queries)
+    registry.observe('coaching_request_sql_seconds', labels, stats.sql_seconds)
+    registry.observe('coaching_request_template_seconds', labels, stats.template_seconds)
+    registry.observe('coaching_response_size_bytes', labels, stats.bytes)
+    registry.flush()
+
+    threshold = settings.METRICS_SLOW_REQUEST_MS
+    if threshold is not None and seconds * 1000 >= threshold:
+        statements = ''.join(
+            f'\n  {elapsed * 1000:8.2f}ms  {sql[:500]}' for elapsed, sql in sorted(stats.statements, reverse=True))
+        slow_logger.warning(
+            'Slow request %s %s (%s): %.0fms, %s queries in %.0fms, templates %.0fms%s',
+            method, view, status, seconds * 1000, stats.queries, stats.sql_seconds * 1000,
+            stats.template_seconds * 1000, statements)
+
+
+class MetricsMiddleware:
+    """Record latency, SQL, template time and response size of every request, labelled by URL name.
+
+    Keep it first in MIDDLEWARE so the timings include the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        keep = settings.METRICS_SLOW_SQL_COUNT if settings.METRICS_SLOW_REQUEST_MS is not None else 0
+        stats = RequestStats(keep)
+        start = time.perf_counter()
+        token = _current.set(stats)
+        try:
+            with stats.capture():
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        view = view_label(request)
+        if isinstance(response, FileResponse):
+            # Left unwrapped so the server can still send the file itself (wsgi.file_wrapper, sendfile)
+            stats.bytes = int(response.get('Content-Length') or 0)
+            record(view, request.method, response.status_code, time.perf_counter() - start, stats)
+        elif response.streaming:
+            # Exports and ranged downloads do their work while the body is read
+            response.streaming_content = self._stream(response.streaming_content, request, response, view, stats, start)
+        else:
+            stats.bytes = len(response.content)
+            record(view, request.method, response.status_code, time.perf_counter() - start, stats)
+        return response
+
+    def _stream(self, content, request, response, view, stats, start):
+        try:
+            with stats.capture():
+                for chunk in content:
+                    stats.bytes += len(chunk)
+                    yield chunk
+        finally:
+            record(view, request.method, response.status_code, time.perf_counter() - start, stats)
@@ -0,0 +1,23 @@
+# Generated by Django 4.1 on 2026-10-18 08:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0005_student_address_student_date_joined_student_dob_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendance',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='coaching.course'),
+        ),
+        migrations.AddConstraint(
+            model_name='attendance',
+            constraint=models.UniqueConstraint(fields=('student', 'course', 'date'), name='unique_attendance_per_session'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1 on 2026-10-18 08:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0006_attendance_course'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentCourseStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sessions_total', models.PositiveIntegerField(default=0)),
+                ('sessions_present', models.PositiveIntegerField(default=0)),
+                ('results_count', models.PositiveIntegerField(default=0)),
+                ('marks_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_stats', to='coaching.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='course_stats', to='coaching.student')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='studentcoursestats',
+            constraint=models.UniqueConstraint(fields=('student', 'course'), name='unique_stats_per_student_course'),
+        ),
+    ]
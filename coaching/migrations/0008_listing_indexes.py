@@ -0,0 +1,49 @@
+# Generated by Django 4.1 on 2026-10-18 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0007_studentcoursestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['due_date'], name='assignment_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='assignment',
+            index=models.Index(fields=['course', 'due_date'], name='assignment_course_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['name'], name='course_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['uploaded_at'], name='result_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['course', 'uploaded_at'], name='result_course_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', 'uploaded_at'], name='result_student_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['name'], name='student_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['uploaded_at'], name='material_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studymaterial',
+            index=models.Index(fields=['course', 'uploaded_at'], name='material_course_uploaded_idx'),
+        ),
+    ]
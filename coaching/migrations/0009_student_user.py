@@ -0,0 +1,37 @@
+# Generated by Django 4.1 on 2026-10-18 08:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_students_to_users(apps, schema_editor):
+    # Students used to be matched to their login by email; make that link explicit
+    Student = apps.get_model('coaching', 'Student')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    user_ids = {}
+    for pk, email in User.objects.exclude(email='').order_by('-pk').values_list('pk', 'email').iterator():
+        user_ids[email] = pk  # lowest pk wins when several accounts share an email
+    linked = []
+    for student in Student.objects.filter(user__isnull=True).only('pk', 'email').iterator():
+        if student.email in user_ids:
+            student.user_id = user_ids.pop(student.email)
+            linked.append(student)
+    Student.objects.bulk_update(linked, ['user'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('coaching', '0008_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='user',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='student_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_students_to_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,117 @@
+# Generated by Django 4.1 on 2026-10-18 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def build_conversations(apps, schema_editor):
+    # Group existing messages into conversations; history is treated as already read
+    Message = apps.get_model('coaching', 'Message')
+    Conversation = apps.get_model('coaching', 'Conversation')
+    ConversationMember = apps.get_model('coaching', 'ConversationMember')
+    conversations = {}
+    pending = []
+    messages = Message.objects.order_by('sent_at', 'id').only('id', 'sender_id', 'receiver_id', 'sent_at')
+    for message in messages.iterator():
+        low, high = sorted((message.sender_id, message.receiver_id))
+        key = f'{low}:{high}'
+        conversation = conversations.get(key)
+        if conversation is None:
+            conversation = conversations[key] = Conversation.objects.create(key=key, last_message_at=message.sent_at)
+            ConversationMember.objects.bulk_create([
+                ConversationMember(conversation=conversation, user_id=user_id, peer_id=peer_id, last_message_at=message.sent_at)
+                for user_id, peer_id in {(low, high), (high, low)}
+            ])
+        conversation.last_message_id = message.id
+        conversation.last_message_at = message.sent_at
+        message.conversation_id = conversation.id
+        message.read_at = message.sent_at
+        pending.append(message)
+        if len(pending) >= 500:
+            Message.objects.bulk_update(pending, ['conversation', 'read_at'])
+            pending = []
+    Message.objects.bulk_update(pending, ['conversation', 'read_at'])
+    Conversation.objects.bulk_update(conversations.values(), ['last_message', 'last_message_at'], batch_size=500)
+    for conversation in conversations.values():
+        ConversationMember.objects.filter(conversation=conversation).update(last_message_at=conversation.last_message_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('coaching', '0009_student_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConversationMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['receiver', 'sent_at'], name='message_receiver_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'sent_at'], name='message_sender_sent_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='coaching.conversation'),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='peer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversationmember',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='coaching.message'),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='coaching.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'sent_at'], name='message_thread_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmember',
+            index=models.Index(fields=['user', 'last_message_at'], name='member_inbox_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationmember',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='unique_conversation_member'),
+        ),
+        migrations.RunPython(build_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# Frozen copies of coaching.search's layout as of this migration; later edits there must not change history
+TABLE = 'coaching_search'
+KIND_SLOTS = 8
+# model -> (kind code, title column, body column)
+DOCUMENTS = {
+    'Course': (1, 'name', 'description'),
+    'StudyMaterial': (2, 'title', 'description'),
+    'Assignment': (3, 'title', 'description'),
+    'Announcement': (4, 'title', 'content'),
+}
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        f"title, body, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    schema_editor.execute(f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+    # One INSERT ... SELECT per model, reading the historical tables; `manage.py rebuild_search_index` redoes it
+    for model_name, (code, title, body) in DOCUMENTS.items():
+        db_table = apps.get_model('coaching', model_name)._meta.db_table
+        schema_editor.execute(
+            f"INSERT OR REPLACE INTO {TABLE}(rowid, title, body) "
+            f"SELECT id * {KIND_SLOTS} + {code}, COALESCE({title}, ''), COALESCE({body}, '') FROM {db_table}"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0014_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
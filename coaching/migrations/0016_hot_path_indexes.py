@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0015_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('for_all', True)), fields=['created_at'], name='announcement_all_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='announcement',
+            index=models.Index(condition=models.Q(('for_all', False)), fields=['for_role', 'created_at'], name='announcement_role_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='result',
+            index=models.Index(fields=['student', 'course', 'uploaded_at'], name='result_student_course_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.1 on 2026-10-18 09:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_monthly_totals(apps, schema_editor):
+    # Existing payments predate the course field, so they all land in the unallocated rows
+    Fee = apps.get_model('coaching', 'Fee')
+    FeeMonthlyTotal = apps.get_model('coaching', 'FeeMonthlyTotal')
+    rows = Fee.objects.annotate(month=TruncMonth('paid_on')).values('month').annotate(
+        payments=Count('id'), amount=Sum('amount')).order_by()
+    FeeMonthlyTotal.objects.bulk_create(
+        [FeeMonthlyTotal(month=row['month'], payments=row['payments'], amount=row['amount']) for row in rows],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0017_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeMonthlyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('payments', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FeeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('due_date', models.DateField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='fee',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='coaching.course'),
+        ),
+        migrations.AddIndex(
+            model_name='fee',
+            index=models.Index(fields=['course', 'paid_on'], name='fee_course_paid_on_idx'),
+        ),
+        migrations.AddField(
+            model_name='feeschedule',
+            name='course',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_schedules', to='coaching.course'),
+        ),
+        migrations.AddField(
+            model_name='feemonthlytotal',
+            name='course',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fee_totals', to='coaching.course'),
+        ),
+        migrations.AddIndex(
+            model_name='feeschedule',
+            index=models.Index(fields=['course', 'due_date'], name='feeschedule_course_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feemonthlytotal',
+            index=models.Index(fields=['month', 'course'], name='feemonthlytotal_month_idx'),
+        ),
+        migrations.RunPython(build_monthly_totals, migrations.RunPython.noop),
+    ]
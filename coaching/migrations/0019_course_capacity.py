@@ -0,0 +1,51 @@
+# Generated by Django 4.1 on 2026-10-18 09:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_seats_taken(apps, schema_editor):
+    Course = apps.get_model('coaching', 'Course')
+    Enrollment = apps.get_model('coaching', 'Student').enrolled_courses.through
+    taken = Enrollment.objects.filter(course_id=OuterRef('pk')).order_by().values('course_id').annotate(n=Count('id')).values('n')
+    Course.objects.update(seats_taken=Coalesce(Subquery(taken), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0018_fee_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='capacity',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='course',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='coaching.course')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='coaching.student')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='waitlistentry',
+            index=models.Index(fields=['course', 'created_at', 'id'], name='waitlist_course_created_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='waitlistentry',
+            constraint=models.UniqueConstraint(fields=('course', 'student'), name='unique_waitlist_entry'),
+        ),
+        migrations.RunPython(count_seats_taken, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.1 on 2026-10-18 10:00
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def rebuild_monthly_totals(apps, schema_editor):
+    # Concurrent refreshes could leave two rows for a bucket; recompute them before making buckets unique
+    Fee = apps.get_model('coaching', 'Fee')
+    FeeMonthlyTotal = apps.get_model('coaching', 'FeeMonthlyTotal')
+    rows = Fee.objects.annotate(month=TruncMonth('paid_on')).values('month', 'course_id').annotate(
+        payments=Count('id'), amount=Sum('amount')).order_by()
+    FeeMonthlyTotal.objects.all().delete()
+    FeeMonthlyTotal.objects.bulk_create(
+        [FeeMonthlyTotal(month=row['month'], course_id=row['course_id'], payments=row['payments'],
+                         amount=row['amount']) for row in rows],
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0019_course_capacity'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_monthly_totals, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='feemonthlytotal',
+            name='feemonthlytotal_month_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='feemonthlytotal',
+            constraint=models.UniqueConstraint(fields=('month', 'course'), name='unique_fee_total_per_month_course'),
+        ),
+        migrations.AddConstraint(
+            model_name='feemonthlytotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('month',), name='unique_unallocated_fee_total_per_month'),
+        ),
+    ]
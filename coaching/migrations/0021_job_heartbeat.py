@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 10:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def start_heartbeats(apps, schema_editor):
+    # Jobs running during the upgrade count from when they were claimed, so a dead worker's job is still released
+    Job = apps.get_model('coaching', 'Job')
+    Job.objects.filter(status='running').update(heartbeat_at=F('locked_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('coaching', '0020_fee_total_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(start_heartbeats, migrations.RunPython.noop),
+    ]
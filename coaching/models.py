@@ -1,8 +1,13 @@
+import uuid
+
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
 
 # Create your models here.
 
 from django.contrib.auth.models import User  # For user roles
+from django.utils import timezone
 
 # Course Model
 class Course(models.Model):
@@ -11,12 +16,29 @@ class Course(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     image = models.ImageField(upload_to='course_images/', blank=True, null=True)  # New field for course image
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)  # Thumbnails derived from image, see coaching.images
+    capacity = models.PositiveIntegerField(null=True, blank=True)  # Seats on offer; None means unlimited
+    # Enrolled students, moved only by coaching.enrollment's conditional UPDATEs; edits save with
+    # update_fields so an instance loaded before an enrollment cannot write a stale count back
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='course_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def seats_left(self):
+        if self.capacity is None:
+            return None
+        return max(self.capacity - self.seats_taken, 0)
+
 # Student Model
 class Student(models.Model):
+    user = models.OneToOneField(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='student_profile')  # Login account
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15)
@@ -26,21 +48,60 @@ class Student(models.Model):
     date_joined = models.DateTimeField(auto_now_add=True, null=True)
     enrolled_courses = models.ManyToManyField(Course)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], name='student_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 # Attendance Model
 class Attendance(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, null=True, blank=True)  # Null only for rows recorded before attendance was per course
     date = models.DateField()
     status = models.BooleanField(default=True)  # Present/Absent
 
+    class Meta:
+        constraints = [
+            # One mark per student per course session; lets a resubmit upsert instead of duplicating
+            models.UniqueConstraint(fields=['student', 'course', 'date'], name='unique_attendance_per_session'),
+        ]
+        indexes = [
+            # Date-range exports, overall and per course
+            models.Index(fields=['date'], name='attendance_date_idx'),
+            models.Index(fields=['course', 'date'], name='attendance_course_date_idx'),
+        ]
+
 # Fee Model
 class Fee(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    course = models.ForeignKey(Course, null=True, blank=True, on_delete=models.SET_NULL)  # Course the payment is for, if any
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     paid_on = models.DateField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['paid_on'], name='fee_paid_on_idx'),
+            models.Index(fields=['course', 'paid_on'], name='fee_course_paid_on_idx'),
+        ]
+
+# An amount every student enrolled in a course owes from due_date on; a course may have several instalments
+class FeeSchedule(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='fee_schedules')
+    description = models.CharField(max_length=200, blank=True)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    due_date = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'due_date'], name='feeschedule_course_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.course} - {self.amount} due {self.due_date}"
+
 class StudyMaterial(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
@@ -49,6 +110,13 @@ class StudyMaterial(models.Model):
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination keys for study_materials, with and without a course filter
+            models.Index(fields=['uploaded_at'], name='material_uploaded_idx'),
+            models.Index(fields=['course', 'uploaded_at'], name='material_course_uploaded_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -63,6 +131,12 @@ class Assignment(models.Model):
     marks = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['due_date'], name='assignment_due_idx'),
+            models.Index(fields=['course', 'due_date'], name='assignment_course_due_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -73,10 +147,48 @@ class Message(models.Model):
     reply_to = models.ForeignKey('self', null=True, blank=True, on_delete=models.SET_NULL)
     sent_at = models.DateTimeField(auto_now_add=True)
     is_announcement = models.BooleanField(default=False)
+    conversation = models.ForeignKey('Conversation', null=True, blank=True, on_delete=models.CASCADE, related_name='messages')
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['receiver', 'sent_at'], name='message_receiver_sent_idx'),
+            models.Index(fields=['sender', 'sent_at'], name='message_sender_sent_idx'),
+            models.Index(fields=['conversation', 'sent_at'], name='message_thread_sent_idx'),
+        ]
 
     def __str__(self):
         return f"From {self.sender} to {self.receiver}"
 
+# Conversation between two users, kept in step by coaching.inbox so the inbox never scans Message
+class Conversation(models.Model):
+    key = models.CharField(max_length=50, unique=True)  # "<lower user id>:<higher user id>"
+    last_message = models.ForeignKey(Message, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    last_message_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
+
+# One row per participant: the inbox is a range scan over (user, last_message_at)
+class ConversationMember(models.Model):
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    unread_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='unique_conversation_member'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'last_message_at'], name='member_inbox_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} in {self.conversation}"
+
 class Result(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     course = models.ForeignKey(Course, on_delete=models.CASCADE)
@@ -85,6 +197,15 @@ class Result(models.Model):
     description = models.TextField(blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_at'], name='result_uploaded_idx'),
+            models.Index(fields=['course', 'uploaded_at'], name='result_course_uploaded_idx'),
+            models.Index(fields=['student', 'uploaded_at'], name='result_student_uploaded_idx'),
+            # A student's results in one course, newest first
+            models.Index(fields=['student', 'course', 'uploaded_at'], name='result_student_course_idx'),
+        ]
+
     def __str__(self):
         return f"{self.student} - {self.course}"
 
@@ -97,6 +218,142 @@ class Announcement(models.Model):
     for_all = models.BooleanField(default=True)
     for_role = models.CharField(max_length=20, blank=True, choices=[('student','Student'),('teacher','Teacher'),('admin','Admin')])
 
+    class Meta:
+        # One per feed partition (see coaching.feed), each read newest first. Partial, because
+        # Django renders for_all=True as a bare boolean that SQLite cannot match to an index column
+        indexes = [
+            models.Index(fields=['created_at'], condition=Q(for_all=True), name='announcement_all_created_idx'),
+            models.Index(fields=['for_role', 'created_at'], condition=Q(for_all=False), name='announcement_role_created_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+
+# Materialized per-student, per-course analytics; maintained by coaching.analytics
+class StudentCourseStats(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='course_stats')
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='student_stats')
+    sessions_total = models.PositiveIntegerField(default=0)
+    sessions_present = models.PositiveIntegerField(default=0)
+    results_count = models.PositiveIntegerField(default=0)
+    marks_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'course'], name='unique_stats_per_student_course'),
+        ]
+
+    @property
+    def attendance(self):
+        if not self.sessions_total:
+            return 0
+        return round(100 * self.sessions_present / self.sessions_total, 1)
+
+    @property
+    def progress(self):
+        # Average marks across graded results; marks are out of 100
+        if not self.results_count:
+            return 0
+        return round(self.marks_total / self.results_count, 1)
+
+    def __str__(self):
+        return f"{self.student} - {self.course}"
+
+# A resumable upload in progress; its bytes live in CHUNKED_UPLOAD_DIR until completed
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64)
+    received = models.PositiveBigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+# A unit of deferred work; claimed and run by the run_worker command, see coaching.jobs
+class Job(models.Model):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    name = models.CharField(max_length=100)  # Registered task name
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)  # Higher runs first
+    run_at = models.DateTimeField(default=timezone.now)  # Not picked up before this; pushed back on retry
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Touched by the worker while the job runs
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='job_ready_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+# A change pushed to connected browsers by coaching.events; kept briefly so reconnecting clients can catch up
+class Event(models.Model):
+    MESSAGE = 'message'
+    ANNOUNCEMENT = 'announcement'
+    KIND_CHOICES = [(MESSAGE, 'Message'), (ANNOUNCEMENT, 'Announcement')]
+    ALL = 'all'  # role of events for every connected user
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE, related_name='+')  # Sole recipient, if any
+    role = models.CharField(max_length=20, blank=True)  # Otherwise every user with this feed role, or ALL
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk}"
+
+# Fees collected per calendar month and course (null for unallocated payments), kept in step by coaching.fees
+class FeeMonthlyTotal(models.Model):
+    month = models.DateField()  # First day of the month
+    course = models.ForeignKey(Course, null=True, blank=True, on_delete=models.CASCADE, related_name='fee_totals')
+    payments = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'course'], name='unique_fee_total_per_month_course'),
+            # NULLs never clash in a unique index, so unallocated payments need their own
+            models.UniqueConstraint(fields=['month'], condition=models.Q(course__isnull=True),
+                                    name='unique_unallocated_fee_total_per_month'),
+        ]
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.course or 'unallocated'}: {self.amount}"
+
+# A student waiting for a seat in a full course; promoted in created_at order by coaching.enrollment
+class WaitlistEntry(models.Model):
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'student'], name='unique_waitlist_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['course', 'created_at', 'id'], name='waitlist_course_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student} waiting for {self.course}"
@@ -0,0 +1,162 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+DEFAULT_PER_PAGE = 25
+MAX_PER_PAGE = 100
+
+
+class KeysetPage:
+    """One page of rows plus the opaque cursors pointing at its neighbours."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class CursorEncoder(DjangoJSONEncoder):
+
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds; a cursor must keep every digit or it skips
+        # rows stamped within the same millisecond as the page boundary
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps({'v': values, 'b': backwards}, cls=CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(values, backwards)`` or ``None`` for a missing or malformed cursor."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return list(payload['v']), bool(payload.get('b'))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        return None
+
+
+def _parse_ordering(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def _seek(keys, values, backwards):
+    """Filter selecting the rows strictly after ``values`` in ``keys`` order.
+
+    Expands the row-value comparison ``(k1, k2, ...) > (v1, v2, ...)`` into ORs,
+    and repeats the first key as a plain range condition so the database can
+    seek straight into the index instead of scanning up to the cursor.
+    """
+    def op(desc):
+        return 'lt' if desc != backwards else 'gt'
+
+    first, first_desc = keys[0]
+    leading = Q(**{f"{first}__{op(first_desc)}e": values[0]})
+    after = Q()
+    for i, (name, desc) in enumerate(keys):
+        clause = Q(**{f'{name}__{op(desc)}': values[i]})
+        for j in range(i):
+            clause &= Q(**{keys[j][0]: values[j]})
+        after |= clause
+    return leading & after
+
+
+def _clean_values(queryset, keys, values):
+    """The cursor's values converted by their ordering fields, or ``None`` if any is not a valid value.
+
+    Cursors come from the client, so a tampered one must fall back to the first
+    page rather than reach the query as a string, a dict or a null.
+    """
+    cleaned = []
+    for (name, _), value in zip(keys, values):
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        annotation = queryset.query.annotations.get(name)
+        field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(name)
+        try:
+            value = field.to_python(value)
+            field.run_validators(value)
+        except (ValidationError, TypeError, ValueError):
+            return None
+        if value is None:
+            return None
+        cleaned.append(value)
+    return cleaned
+
+
+def _key(row, keys):
+    if isinstance(row, dict):
+        return [row[name] for name, _ in keys]
+    return [getattr(row, name) for name, _ in keys]
+
+
+def get_per_page(request, default=DEFAULT_PER_PAGE):
+    try:
+        per_page = int(request.GET.get('per_page', default))
+    except (TypeError, ValueError):
+        per_page = default
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def paginate(request, queryset, ordering, per_page=None, param='cursor'):
+    """Keyset-paginate ``queryset`` by ``ordering`` using the cursor in ``request.GET``.
+
+    ``ordering`` must end in a unique column (normally ``id``) and should match an
+    index, so every page costs one index seek plus ``per_page`` rows no matter how
+    deep into the listing it is. Works on model querysets and ``values()`` alike.
+    """
+    keys = _parse_ordering(ordering)
+    per_page = per_page or get_per_page(request)
+    cursor = decode_cursor(request.GET.get(param))
+    if cursor:
+        values = _clean_values(queryset, keys, cursor[0]) if len(cursor[0]) == len(keys) else None
+        cursor = (values, cursor[1]) if values is not None else None
+    backwards = bool(cursor and cursor[1])
+    if backwards:
+        queryset = queryset.order_by(*[name if desc else f'-{name}' for name, desc in keys])
+    else:
+        queryset = queryset.order_by(*ordering)
+    if cursor:
+        queryset = queryset.filter(_seek(keys, cursor[0], backwards))
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, cursor is not None
+    if not rows:
+        return KeysetPage(rows)
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(_key(rows[-1], keys)) if has_next else None,
+        previous_cursor=encode_cursor(_key(rows[0], keys), backwards=True) if has_previous else None,
+    )
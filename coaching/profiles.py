@@ -0,0 +1,51 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Student
+
+ENROLLED_KEY = 'coaching:enrolled:{}'
+ENROLLED_TIMEOUT = 60 * 60
+
+
+def get_student(request):
+    """The logged-in user's Student profile, or ``None``; loaded at most once per request."""
+    if not hasattr(request, '_cached_student'):
+        student = None
+        if request.user.is_authenticated:
+            student = Student.objects.filter(user=request.user).first()
+        request._cached_student = student
+    return request._cached_student
+
+
+def enrolled_course_ids(student_id):
+    """IDs of the courses a student is enrolled in, as a set, shared across requests through the cache.
+
+    Entries are dropped by the signal handlers whenever enrollments change; the cache is
+    shared by every process (CACHES in settings), so the drop reaches all workers.
+    """
+    key = ENROLLED_KEY.format(student_id)
+    ids = cache.get(key)
+    if ids is None:
+        ids = set(Student.enrolled_courses.through.objects.filter(student_id=student_id).values_list('course_id', flat=True))
+        cache.set(key, ids, ENROLLED_TIMEOUT)
+    return ids
+
+
+def get_enrolled_ids(request):
+    """IDs of the courses the current student is enrolled in, as a set; loaded at most once per request."""
+    if not hasattr(request, '_cached_enrolled_ids'):
+        student = get_student(request)
+        request._cached_enrolled_ids = enrolled_course_ids(student.pk) if student is not None else set()
+    return request._cached_enrolled_ids
+
+
+def invalidate_enrollments(*student_ids):
+    keys = [ENROLLED_KEY.format(pk) for pk in student_ids]
+    if keys:
+        cache.delete_many(keys)
+        # Again after commit, in case a read inside the transaction re-cached uncommitted rows
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget_enrollments(request):
+    request.__dict__.pop('_cached_enrolled_ids', None)
@@ -0,0 +1,38 @@
+from django.core.cache import cache
+
+ROLE_CACHE_TIMEOUT = 60 * 60
+ROLE_CACHE_KEY = 'coaching:roles:{}'
+
+
+def get_roles(user):
+    """Names of the groups ``user`` belongs to, as a frozenset.
+
+    Resolved at most once per request (memoized on the user object, which
+    lives for one request) and shared across requests through the cache.
+    Cache entries are dropped by the signal handlers whenever group
+    membership changes, so the cache must be shared by every process (see
+    CACHES in settings) or other workers would keep granting revoked roles.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    roles = getattr(user, '_coaching_roles', None)
+    if roles is None:
+        key = ROLE_CACHE_KEY.format(user.pk)
+        roles = cache.get(key)
+        if roles is None:
+            roles = frozenset(user.groups.values_list('name', flat=True))
+            cache.set(key, roles, ROLE_CACHE_TIMEOUT)
+        user._coaching_roles = roles
+    return roles
+
+
+def has_role(user, name):
+    return name in get_roles(user)
+
+
+def is_teacher(user):
+    return has_role(user, 'Teachers')
+
+
+def invalidate_roles(*user_ids):
+    cache.delete_many([ROLE_CACHE_KEY.format(pk) for pk in user_ids])
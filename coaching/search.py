@@ -0,0 +1,182 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Announcement, Assignment, Course, StudyMaterial
+
+TABLE = 'coaching_search'
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+# Each document's rowid is pk * KIND_SLOTS + kind code, so one integer key covers every model
+KIND_SLOTS = 8
+# kind -> (code, model, title field, body field)
+KINDS = {
+    'course': (1, Course, 'name', 'description'),
+    'material': (2, StudyMaterial, 'title', 'description'),
+    'assignment': (3, Assignment, 'title', 'description'),
+    'announcement': (4, Announcement, 'title', 'content'),
+}
+KIND_BY_CODE = {code: kind for kind, (code, *_) in KINDS.items()}
+KIND_BY_MODEL = {model: kind for kind, (_, model, *_) in KINDS.items()}
+
+# Title matches weigh more than body matches in the bm25 ranking
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+# Most matches a query may have and still be ordered by relevance; keeps every search well under 50ms
+RANK_LIMIT = 5000
+
+# Snippet markers; control characters never occur in user text, so escaping cannot break them
+MARK_START, MARK_END = '\x02', '\x03'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def enabled():
+    """Full-text search needs SQLite's FTS5; other backends fall back to icontains."""
+    return connection.vendor == 'sqlite'
+
+
+def create_table(cursor):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+        f"title, body, tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # Make the built-in rank column use weighted bm25 so ORDER BY rank stays on FTS5's fast path
+    cursor.execute(f"INSERT INTO {TABLE}({TABLE}, rank) VALUES ('rank', 'bm25({TITLE_WEIGHT}, {BODY_WEIGHT})')")
+
+
+def _rowid(kind, pk):
+    return pk * KIND_SLOTS + KINDS[kind][0]
+
+
+def _document(kind, obj):
+    _, _, title_field, body_field = KINDS[kind]
+    return _rowid(kind, obj.pk), getattr(obj, title_field) or '', getattr(obj, body_field) or ''
+
+
+def index(obj):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT OR REPLACE INTO {TABLE}(rowid, title, body) VALUES (%s, %s, %s)',
+                       _document(KIND_BY_MODEL[type(obj)], obj))
+
+
+def remove(obj):
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE} WHERE rowid = %s', [_rowid(KIND_BY_MODEL[type(obj)], obj.pk)])
+
+
+def rebuild(batch_size=2000):
+    """Re-index every document; returns how many were indexed."""
+    count = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        for kind, (_, model, title_field, body_field) in KINDS.items():
+            rows = model.objects.values_list('pk', title_field, body_field).order_by('pk').iterator(chunk_size=batch_size)
+            batch = []
+            for pk, title, body in rows:
+                batch.append((_rowid(kind, pk), title or '', body or ''))
+                if len(batch) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {TABLE}(rowid, title, body) VALUES (%s, %s, %s)', batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {TABLE}(rowid, title, body) VALUES (%s, %s, %s)', batch)
+                count += len(batch)
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def to_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation typed by users are
+    treated as plain text rather than query syntax.
+    """
+    tokens = TOKEN_RE.findall(text or '')
+    if not tokens:
+        return ''
+    return ' '.join(f'"{token}"' for token in tokens) + '*'
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class Hit:
+    def __init__(self, kind, obj, snippet):
+        self.kind = kind
+        self.object = obj
+        self.snippet = snippet
+
+    @property
+    def title(self):
+        return getattr(self.object, KINDS[self.kind][2])
+
+
+def _fts_ids(query, kinds, limit):
+    where = f'{TABLE} MATCH %s'
+    params = [query]
+    if len(kinds) < len(KINDS):
+        codes = [KINDS[kind][0] for kind in kinds]
+        where += f" AND (rowid %% {KIND_SLOTS}) IN ({', '.join(['%s'] * len(codes))})"
+        params += codes
+    with connection.cursor() as cursor:
+        # bm25 must score every match before sorting; a query matching more than RANK_LIMIT
+        # documents is too broad for ranking to help, so it lists the newest matches instead
+        cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM {TABLE} WHERE {where} LIMIT {RANK_LIMIT + 1})', params)
+        order = 'rank' if cursor.fetchone()[0] <= RANK_LIMIT else 'rowid DESC'
+        cursor.execute(
+            f"SELECT rowid, snippet({TABLE}, -1, %s, %s, '…', 16) FROM {TABLE} WHERE {where} ORDER BY {order} LIMIT %s",
+            [MARK_START, MARK_END, *params, limit])
+        return [(rowid % KIND_SLOTS, rowid // KIND_SLOTS, snippet) for rowid, snippet in cursor.fetchall()]
+
+
+def _fallback_ids(text, kinds, limit):
+    # Unranked substring match for backends without FTS5
+    found = []
+    for kind in kinds:
+        code, model, title_field, body_field = KINDS[kind]
+        matches = model.objects.filter(Q(**{f'{title_field}__icontains': text}) | Q(**{f'{body_field}__icontains': text}))
+        found += [(code, pk, '') for pk in matches.values_list('pk', flat=True)[:limit]]
+    return found[:limit]
+
+
+def search(text, kinds=None, roles=frozenset(), limit=DEFAULT_LIMIT):
+    """Best matches for ``text`` as a list of ``Hit``, most relevant first.
+
+    ``roles`` are the announcement audiences the user belongs to (see
+    ``feed.roles_for``); announcements aimed at other roles are left out.
+    """
+    kinds = [kind for kind in (kinds or KINDS) if kind in KINDS]
+    limit = max(1, min(limit, MAX_LIMIT))
+    if enabled():
+        query = to_match_query(text)
+        ids = _fts_ids(query, kinds, limit) if query and kinds else []
+    else:
+        ids = _fallback_ids(text.strip(), kinds, limit) if text.strip() and kinds else []
+
+    # One query per kind present in the hits
+    objects = {}
+    for code in {code for code, _, _ in ids}:
+        model = KINDS[KIND_BY_CODE[code]][1]
+        queryset = model.objects.all()
+        if model is StudyMaterial or model is Assignment:
+            queryset = queryset.select_related('course')
+        objects[code] = queryset.in_bulk([pk for c, pk, _ in ids if c == code])
+
+    hits = []
+    for code, pk, snippet in ids:
+        obj = objects[code].get(pk)
+        if obj is None:
+            continue
+        if isinstance(obj, Announcement) and not obj.for_all and obj.for_role not in roles:
+            continue
+        hits.append(Hit(KIND_BY_CODE[code], obj, _highlight(snippet)))
+    return hits
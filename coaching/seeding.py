@@ -0,0 +1,228 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import analytics, counters, enrollment, feed, fees, inbox, search
+from .models import (
+    Announcement, Assignment, Attendance, Conversation, ConversationMember, Course, Fee, FeeSchedule, Message, Result,
+    Student, StudyMaterial,
+)
+
+BATCH_SIZE = 2000
+# Seeded accounts share this prefix, so a second run can tell the database is already seeded
+USERNAME_PREFIX = 'seed-'
+DEFAULT_PASSWORD = 'seed-password'
+
+WORDS = (
+    'algebra calculus geometry physics chemistry biology optics mechanics thermodynamics statistics probability '
+    'vectors matrices kinematics organic inorganic genetics ecology grammar reading writing revision practice '
+    'mock test worksheet chapter notes summary formula problems solutions lecture lab project'
+).split()
+
+
+class SeedError(Exception):
+    pass
+
+
+class Seeder:
+    """Builds a synthetic institute with bulk inserts; derived tables are rebuilt at the end."""
+
+    def __init__(self, courses=20, students=1000, teachers=10, attendance_days=20, results=5000, messages=5000,
+                 announcements=200, materials_per_course=20, assignments_per_course=10, seed=0,
+                 password=DEFAULT_PASSWORD):
+        self.sizes = {
+            'courses': courses, 'students': students, 'teachers': teachers, 'attendance_days': attendance_days,
+            'results': results, 'messages': messages, 'announcements': announcements,
+            'materials_per_course': materials_per_course, 'assignments_per_course': assignments_per_course,
+        }
+        self.random = random.Random(seed)
+        self.password = password
+        self.today = timezone.localdate()
+        self.counts = {}
+
+    def _text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def _bulk(self, model, objects):
+        # Accepts a generator, so the largest tables are never held in memory at once
+        count = 0
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+            count += len(batch)
+        self.counts[model._meta.model_name] = self.counts.get(model._meta.model_name, 0) + count
+        return count
+
+    def _users(self, role, count, password, **fields):
+        users = [User(username=f'{USERNAME_PREFIX}{role}-{i}', email=f'{role}{i}@seed.example.com', password=password,
+                      first_name=role.title(), last_name=str(i), **fields) for i in range(count)]
+        return User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+
+    def run(self):
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise SeedError('The database already holds seeded data; seed a fresh database.')
+        sizes = self.sizes
+        with transaction.atomic():
+            self.seed_people()
+            self.seed_courses()
+            self.seed_enrollments()
+            self.seed_attendance(sizes['attendance_days'])
+            self.seed_results(sizes['results'])
+            self.seed_content(sizes['materials_per_course'], sizes['assignments_per_course'])
+            self.seed_fees()
+            self.seed_messages(sizes['messages'])
+            self.seed_announcements(sizes['announcements'])
+            # bulk_create sends no signals; rebuild what the signal handlers would have kept in step
+            self.counts['studentcoursestats'] = analytics.rebuild()
+            self.counts['search documents'] = search.rebuild()
+            self.counts['feemonthlytotal'] = fees.rebuild()
+        feed.invalidate()
+        counters.invalidate()
+        return self.counts
+
+    def seed_people(self):
+        # Hashing once keeps seeding thousands of accounts fast; every account shares the password
+        password = make_password(self.password)
+        self.admin = self._users('admin', 1, password, is_superuser=True, is_staff=True)[0]
+        self.teachers = self._users('teacher', self.sizes['teachers'], password)
+        self.student_users = self._users('student', self.sizes['students'], password)
+        Membership = User.groups.through
+        teacher_group, _ = Group.objects.get_or_create(name='Teachers')
+        student_group, _ = Group.objects.get_or_create(name='Students')
+        Membership.objects.bulk_create(
+            [Membership(user_id=user.pk, group_id=teacher_group.pk) for user in self.teachers]
+            + [Membership(user_id=user.pk, group_id=student_group.pk) for user in self.student_users],
+            batch_size=BATCH_SIZE)
+        self.counts['user'] = 1 + len(self.teachers) + len(self.student_users)
+        students = [
+            Student(user_id=user.pk, name=f'Student {i:05}', email=user.email, phone=f'555{i:07}'[:15],
+                    gender=self.random.choice(('Male', 'Female')),
+                    dob=self.today - datetime.timedelta(days=self.random.randint(15 * 365, 25 * 365)))
+            for i, user in enumerate(self.student_users)
+        ]
+        self.students = Student.objects.bulk_create(students, batch_size=BATCH_SIZE)
+        self.counts['student'] = len(self.students)
+
+    def seed_courses(self):
+        start = self.today - datetime.timedelta(days=self.sizes['attendance_days'])
+        courses = [
+            Course(name=f'{self.random.choice(WORDS).title()} {i:03}', description=self._text(30),
+                   start_date=start, end_date=start + datetime.timedelta(days=180))
+            for i in range(self.sizes['courses'])
+        ]
+        self.courses = Course.objects.bulk_create(courses)
+        self.counts['course'] = len(self.courses)
+
+    def seed_enrollments(self):
+        if not self.courses:
+            self.enrollments = []
+            return
+        self.enrollments = [
+            (student.pk, course.pk)
+            for student in self.students
+            for course in self.random.sample(self.courses, min(len(self.courses), self.random.randint(1, 3)))
+        ]
+        Enrollment = Student.enrolled_courses.through
+        self._bulk(Enrollment, (Enrollment(student_id=sid, course_id=cid) for sid, cid in self.enrollments))
+        enrollment.recount()
+
+    def seed_attendance(self, days):
+        dates = [self.today - datetime.timedelta(days=offset) for offset in range(days, 0, -1)]
+        self._bulk(Attendance, (
+            Attendance(student_id=sid, course_id=cid, date=date, status=self.random.random() < 0.85)
+            for date in dates for sid, cid in self.enrollments
+        ))
+
+    def seed_results(self, count):
+        if not self.enrollments:
+            return
+        self._bulk(Result, (
+            Result(student_id=sid, course_id=cid, marks=Decimal(self.random.randint(20, 100)), description=self._text(6))
+            for sid, cid in (self.random.choice(self.enrollments) for _ in range(count))
+        ))
+
+    def seed_content(self, materials, assignments):
+        if not self.teachers:
+            return
+        self._bulk(StudyMaterial, (
+            StudyMaterial(title=self._text(4).capitalize(), description=self._text(25), file=f'resources/seed-{course.pk}-{i}.pdf',
+                          uploaded_by=self.random.choice(self.teachers), course=course)
+            for course in self.courses for i in range(materials)
+        ))
+        self._bulk(Assignment, (
+            Assignment(title=self._text(4).capitalize(), description=self._text(25), file=f'assignments/seed-{course.pk}-{i}.pdf',
+                       assigned_by=self.random.choice(self.teachers), course=course, marks=100,
+                       due_date=self.today + datetime.timedelta(days=self.random.randint(-30, 60)))
+            for course in self.courses for i in range(assignments)
+        ))
+
+    def seed_fees(self):
+        # Three instalments per course, a month apart from its start; most students are paid up to date
+        schedules = {
+            course.pk: [FeeSchedule(course=course, description=f'Instalment {i + 1}', amount=amount,
+                                    due_date=course.start_date + datetime.timedelta(days=30 * i)) for i in range(3)]
+            for course in self.courses
+            for amount in [Decimal(self.random.choice((500, 750, 1000, 1500)))]
+        }
+        self._bulk(FeeSchedule, (item for items in schedules.values() for item in items))
+        self._bulk(Fee, (
+            Fee(student_id=sid, course_id=cid, amount=item.amount,
+                paid_on=item.due_date - datetime.timedelta(days=self.random.randint(0, 10)))
+            for sid, cid in self.enrollments
+            for item in schedules[cid][:self._instalments_paid()]
+            if item.due_date <= self.today
+        ))
+
+    def _instalments_paid(self):
+        return 3 if self.random.random() < 0.8 else self.random.randint(0, 2)
+
+    def seed_messages(self, count):
+        if not self.teachers or not self.student_users or not count:
+            return
+        # Each conversation pairs a student with one teacher; messages alternate between them
+        pairs = [(self.teachers[i % len(self.teachers)], user) for i, user in enumerate(self.student_users[:count])]
+        conversations = Conversation.objects.bulk_create(
+            [Conversation(key=inbox.conversation_key(teacher.pk, user.pk)) for teacher, user in pairs],
+            batch_size=BATCH_SIZE)
+        self._bulk(ConversationMember, (
+            ConversationMember(conversation=conversation, user=user, peer=peer)
+            for conversation, (teacher, student) in zip(conversations, pairs)
+            for user, peer in ((teacher, student), (student, teacher))
+        ))
+        self._bulk(Message, self._messages(list(zip(conversations, pairs)), count))
+        Conversation.objects.filter(pk__in=[conversation.pk for conversation in conversations]).update(
+            last_message=Subquery(Message.objects.filter(conversation=OuterRef('pk')).order_by('-id').values('id')[:1]))
+        self.counts['conversation'] = len(conversations)
+
+    def _messages(self, threads, count):
+        now = timezone.now()
+        for i in range(count):
+            conversation, (teacher, student) = threads[i % len(threads)]
+            sender, receiver = (teacher, student) if i // len(threads) % 2 == 0 else (student, teacher)
+            yield Message(conversation=conversation, sender=sender, receiver=receiver, content=self._text(12), read_at=now)
+
+    def seed_announcements(self, count):
+        roles = [value for value, _ in Announcement._meta.get_field('for_role').choices]
+        authors = self.teachers or [self.admin]
+        self._bulk(Announcement, (
+            Announcement(title=self._text(5).capitalize(), content=self._text(40), created_by=self.random.choice(authors),
+                         for_all=i % 3 == 0, for_role='' if i % 3 == 0 else self.random.choice(roles))
+            for i in range(count)
+        ))
+
+
+def seed(**sizes):
+    """Seed a synthetic institute into the default database; returns the rows created per model."""
+    return Seeder(**sizes).run()
@@ -0,0 +1,155 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import analytics, counters, enrollment, events, feed, fees, images, roles, search
+from .models import Announcement, Assignment, Attendance, Course, Fee, Message, Result, Student, StudyMaterial
+from .profiles import invalidate_enrollments
+
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def refresh_student_course_stats(sender, instance, **kwargs):
+    analytics.mark_dirty(instance.student_id, instance.course_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            instance.__dict__.pop('_coaching_roles', None)
+            roles.invalidate_roles(instance.pk)
+    elif action == 'pre_clear':
+        roles.invalidate_roles(*instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        roles.invalidate_roles(*pk_set)
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, instance, **kwargs):
+    # A rename or delete changes the role names of every member
+    if instance.pk:
+        roles.invalidate_roles(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Announcement)
+@receiver(post_delete, sender=Announcement)
+def invalidate_announcement_feed(sender, instance, **kwargs):
+    feed.invalidate_on_commit()
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_image_variants(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'image' in update_fields:
+        images.refresh_on_commit(instance)
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=StudyMaterial)
+@receiver(post_save, sender=Assignment)
+@receiver(post_save, sender=Announcement)
+def index_for_search(sender, instance, **kwargs):
+    search.index(instance)
+
+
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=StudyMaterial)
+@receiver(post_delete, sender=Assignment)
+@receiver(post_delete, sender=Announcement)
+def remove_from_search(sender, instance, **kwargs):
+    search.remove(instance)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_save, sender=Course)
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        counters.invalidate_on_commit(counters.NAME_BY_MODEL[sender])
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_delete, sender=Course)
+def count_deleted(sender, instance, **kwargs):
+    counters.invalidate_on_commit(counters.NAME_BY_MODEL[sender])
+
+
+@receiver(m2m_changed, sender=Student.enrolled_courses.through)
+def invalidate_enrollments_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_enrollments(instance.pk)
+    elif action == 'pre_clear':
+        invalidate_enrollments(*instance.student_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        invalidate_enrollments(*pk_set)
+
+
+@receiver(pre_delete, sender=Course)
+def invalidate_enrollments_on_course_delete(sender, instance, **kwargs):
+    # The cascade removes enrollment rows without m2m_changed
+    invalidate_enrollments(*instance.student_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Student.enrolled_courses.through)
+def resync_seats_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # enrollment.enroll()/unenroll() keep seats_taken themselves; this covers admin edits and .set()/.add() elsewhere
+    if action == 'pre_clear':
+        instance._coaching_cleared_courses = [instance.pk] if reverse else list(instance.enrolled_courses.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        enrollment.resync(instance.__dict__.pop('_coaching_cleared_courses', []))
+    elif action in ('post_add', 'post_remove'):
+        enrollment.resync([instance.pk] if reverse else pk_set)
+
+
+@receiver(pre_delete, sender=Student)
+def remember_courses_of_deleted_student(sender, instance, **kwargs):
+    instance._coaching_deleted_courses = list(instance.enrolled_courses.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Student)
+def free_seats_of_deleted_student(sender, instance, **kwargs):
+    # The cascade removes enrollment rows without m2m_changed
+    enrollment.resync(instance.__dict__.pop('_coaching_deleted_courses', []))
+
+
+@receiver(post_save, sender=Course)
+def promote_on_capacity_change(sender, instance, created, update_fields=None, **kwargs):
+    if not created and (update_fields is None or 'capacity' in update_fields):
+        enrollment.promote(instance.pk)
+
+
+@receiver(pre_save, sender=Fee)
+def refresh_previous_fee_bucket(sender, instance, raw=False, **kwargs):
+    # An edit may move a payment to another month or course; the bucket it leaves needs a refresh too
+    if instance.pk and not raw:
+        previous = Fee.objects.filter(pk=instance.pk).values_list('paid_on', 'course_id').first()
+        if previous and previous != (instance.paid_on, instance.course_id):
+            fees.mark_dirty(*previous)
+
+
+@receiver(post_save, sender=Fee)
+@receiver(post_delete, sender=Fee)
+def refresh_fee_bucket(sender, instance, **kwargs):
+    fees.mark_dirty(instance.paid_on, instance.course_id)
+
+
+@receiver(pre_delete, sender=Course)
+def refresh_unallocated_fee_buckets(sender, instance, **kwargs):
+    # SET_NULL moves the course's payments to the unallocated buckets without sending signals
+    for month in Fee.objects.filter(course=instance).dates('paid_on', 'month'):
+        fees.mark_dirty(month, None)
+
+
+@receiver(post_save, sender=Message)
+def push_message(sender, instance, created, **kwargs):
+    if created:
+        events.message_created(instance)
+
+
+@receiver(post_save, sender=Announcement)
+def push_announcement(sender, instance, created, **kwargs):
+    if created:
+        events.announcement_created(instance)
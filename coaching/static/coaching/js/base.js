@@ -0,0 +1,120 @@
+// Responsive navbar toggle for mobile
+document.addEventListener('DOMContentLoaded', function() {
+    const toggle = document.querySelector('.navbar-toggle');
+    const navLinks = document.querySelector('.nav-links');
+    if (toggle && navLinks) {
+        toggle.addEventListener('click', function(e) {
+            e.stopPropagation();
+            navLinks.classList.toggle('open');
+        });
+        // Close nav on link click (mobile UX)
+        navLinks.querySelectorAll('a').forEach(link => {
+            link.addEventListener('click', () => {
+                navLinks.classList.remove('open');
+            });
+        });
+        // Close nav if clicking outside
+        document.addEventListener('click', function(e) {
+            if (navLinks.classList.contains('open') && !navLinks.contains(e.target) && !toggle.contains(e.target)) {
+                navLinks.classList.remove('open');
+            }
+        });
+    }
+});
+
+// Live notices for new messages and announcements, pushed by the server (coaching/events.py)
+document.addEventListener('DOMContentLoaded', function() {
+    const url = document.body.dataset.eventsUrl;
+    if (!url || !window.EventSource) return;
+    const source = new EventSource(url);
+    let box = null;
+
+    function notify(text, href) {
+        if (!box) {
+            box = document.createElement('div');
+            box.className = 'live-notices';
+            document.body.appendChild(box);
+        }
+        const notice = document.createElement('a');
+        notice.className = 'live-notice';
+        notice.href = href;
+        notice.textContent = text;
+        box.appendChild(notice);
+        setTimeout(() => notice.remove(), 8000);
+    }
+
+    source.addEventListener('message', function(e) {
+        const data = JSON.parse(e.data);
+        notify('New message from ' + data.sender + ': ' + data.content, '/messages/' + data.conversation_id + '/');
+    });
+    source.addEventListener('announcement', function(e) {
+        const data = JSON.parse(e.data);
+        notify('Announcement: ' + data.title, document.body.dataset.announcementsUrl);
+    });
+    source.addEventListener('error', function() {
+        // Served only by the ASGI app; under WSGI the endpoint is missing, so stop retrying
+        if (source.readyState === EventSource.CLOSED) source.close();
+    });
+});
+
+// Resumable uploads (coaching/uploads.py): forms marked data-chunked-upload send their file in chunks
+// and resume from the server's offset after a dropped connection
+document.addEventListener('DOMContentLoaded', function() {
+    async function send(url, options) {
+        const response = await fetch(url, Object.assign({credentials: 'same-origin'}, options));
+        const data = await response.json();
+        if (!response.ok) throw Object.assign(new Error(data.error || response.statusText), {status: response.status});
+        return data;
+    }
+
+    async function sha256(file) {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    document.querySelectorAll('form[data-chunked-upload]').forEach(function(form) {
+        form.addEventListener('submit', async function(e) {
+            const input = form.querySelector('input[type=file]');
+            const file = input && input.files[0];
+            // Hashing needs WebCrypto (HTTPS or localhost); without it the form posts as usual
+            if (!file || !window.crypto || !crypto.subtle) return;
+            e.preventDefault();
+            const status = form.querySelector('.upload-status');
+            const headers = {'X-CSRFToken': form.querySelector('[name=csrfmiddlewaretoken]').value};
+            const chunkSize = Number(form.dataset.chunkSize);
+            try {
+                status.textContent = 'Preparing…';
+                const start = new FormData();
+                start.append('filename', file.name);
+                start.append('size', file.size);
+                start.append('sha256', await sha256(file));
+                let state = await send(form.dataset.uploadUrl, {method: 'POST', headers: headers, body: start});
+                const url = form.dataset.uploadUrl + state.upload_id + '/';
+                let failures = 0;
+                while (state.offset < file.size) {
+                    const end = Math.min(state.offset + chunkSize, file.size);
+                    try {
+                        state = await send(url, {
+                            method: 'PUT',
+                            headers: Object.assign({'Content-Range': `bytes ${state.offset}-${end - 1}/${file.size}`}, headers),
+                            body: file.slice(state.offset, end),
+                        });
+                        failures = 0;
+                    } catch (err) {
+                        // A dropped connection or a 409: ask the server where to carry on
+                        if (++failures > 5 || (err.status && err.status !== 409)) throw err;
+                        state = await send(url, {headers: headers});
+                    }
+                    status.textContent = `Uploading… ${Math.floor(100 * state.offset / file.size)}%`;
+                }
+                const fields = new FormData(form);
+                fields.delete(input.name);
+                fields.append('kind', form.dataset.chunkedUpload);
+                await send(url + 'complete/', {method: 'POST', headers: headers, body: fields});
+                window.location.reload();
+            } catch (err) {
+                status.textContent = 'Upload failed: ' + err.message;
+            }
+        });
+    });
+});
@@ -0,0 +1,77 @@
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods
+
+# Hashed names change whenever their content does, so browsers may keep them forever
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+# Preferred first; the copies are written by coaching.storage at collectstatic time
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_hashed_names = (None, frozenset())
+
+
+def _is_hashed(path):
+    global _hashed_names
+    manifest = getattr(staticfiles_storage, 'hashed_files', None)
+    if not manifest:
+        return False
+    if _hashed_names[0] is not manifest:
+        _hashed_names = (manifest, frozenset(manifest.values()))
+    return path in _hashed_names[1]
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.partition(';')
+        if params.replace(' ', '').lower() in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve(request, path):
+    """Serve a collected static file, precompressed when the client accepts it.
+
+    For deployments without a front proxy. Where nginx serves STATIC_ROOT,
+    ``gzip_static on;`` (and ``brotli_static on;``) with the same
+    Cache-Control give the same result without reaching Django.
+    """
+    try:
+        fullpath = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not path or not os.path.isfile(fullpath):
+        raise Http404
+    content_type, _ = mimetypes.guess_type(fullpath)
+    chosen, encoding = fullpath, None
+    accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    for name, ext in ENCODINGS:
+        if name in accepted and os.path.isfile(fullpath + ext):
+            chosen, encoding = fullpath + ext, name
+            break
+
+    stat = os.stat(chosen)
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = FileResponse(open(chosen, 'rb'), content_type=content_type or 'application/octet-stream')
+        # FileResponse names the file it sent, which may be the .br or .gz copy
+        del response['Content-Disposition']
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = IMMUTABLE if _is_hashed(path) else REVALIDATE
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
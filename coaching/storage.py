@@ -0,0 +1,54 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only .gz copies are written
+    brotli = None
+
+# Already-compressed formats (images, fonts, archives) gain nothing from another pass
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.mjs', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico', '.eot', '.ttf')
+# Copies smaller than the original by less than this fraction are not worth a second file
+MIN_SAVING = 0.05
+
+
+def compress(content):
+    """``{extension: compressed bytes}`` for the encodings that pay off on ``content``."""
+    candidates = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates['.br'] = brotli.compress(content, quality=11)
+    return {ext: data for ext, data in candidates.items() if len(data) < len(content) * (1 - MIN_SAVING)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Content-hashed static files, with .gz (and .br, if brotli is installed) copies written by collectstatic.
+
+    The hashed names never change content, so they can be served with a
+    far-future, immutable Cache-Control (see coaching.static_files).
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        # Compress the final names only; the manifest maps each source file to one of them
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self._write_compressed(name)
+
+    def _write_compressed(self, name):
+        with self.open(name) as source:
+            content = source.read()
+        for ext, data in compress(content).items():
+            if self.exists(name + ext):
+                self.delete(name + ext)
+            self._save(name + ext, ContentFile(data))
+
+    def url(self, name, force=False):
+        if not self.hashed_files and not force and not self.exists(self.manifest_name):
+            # collectstatic has not run (a development checkout, the test suite): use the plain
+            # names, as DEBUG does, rather than failing every page that links a static file
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
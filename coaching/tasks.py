@@ -0,0 +1,11 @@
+from .jobs import task
+from .models import Course
+
+
+@task('course_images.derive')
+def derive_course_images(course_id):
+    from . import images
+
+    course = Course.objects.filter(pk=course_id).first()
+    if course is not None:
+        images.refresh(course)
@@ -1,5 +1,8 @@
 from django import template
 
+from coaching import images
+from coaching.roles import has_role
+
 register = template.Library()
 
 @register.filter
@@ -7,6 +10,24 @@ def pluck(queryset, attr):
     """Usage: queryset|pluck:'field' returns a list of field values from a queryset."""
     return [getattr(obj, attr, None) for obj in queryset]
 
+@register.filter
+def get_item(mapping, key):
+    """Usage: dict|get_item:key looks up a key that is itself a variable."""
+    return mapping.get(key)
+
 @register.filter(name='has_group')
 def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+    """Role check served from the per-request role set; costs no query after the first."""
+    return has_role(user, group_name)
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor, param='cursor'):
+    """Current URL's query string with the pagination cursor replaced; keeps active filters."""
+    query = context['request'].GET.copy()
+    query[param] = cursor
+    return '?' + query.urlencode()
+
+@register.inclusion_tag('coaching/course_image.html')
+def course_image(course, size=74):
+    """Lazy-loaded <picture> with WebP and JPEG/PNG thumbnails; the original only until they exist."""
+    return {'course': course, 'size': size, 'sources': images.sources(course)}
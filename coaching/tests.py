@@ -1,3 +1,1686 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib import admin as admin_site
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser, Group, User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, router, transaction
+from django.http import FileResponse
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from PIL import Image
+
+from . import analytics, attendance, benchmark, counters, db, enrollment, events, feed, fees, importer, inbox, jobs, metrics, profiles, roles, search, uploads
+from .management.commands import run_worker
+from .pagination import encode_cursor
+from .models import Announcement, Assignment, Attendance, Conversation, ConversationMember, Course, Event, Fee, FeeMonthlyTotal, FeeSchedule, Job, WaitlistEntry, Message, Result, Student, StudentCourseStats, StudyMaterial, UploadSession
+
+
+class SeededDataMixin:
+    """Seeds an institute large enough that a per-row query shows up as thousands of queries."""
+
+    COURSES = 30
+    STUDENTS = 3000
+    ROWS = 2000
+
+    @classmethod
+    def setUpTestData(cls):
+        teachers, _ = Group.objects.get_or_create(name='Teachers')
+        students_group, _ = Group.objects.get_or_create(name='Students')
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.teacher.groups.add(teachers)
+        cls.student_user = User.objects.create_user('student', 'student0@example.com', 'pass')
+        cls.student_user.groups.add(students_group)
+
+        start = datetime.date(2025, 1, 1)
+        Course.objects.bulk_create([
+            Course(name=f'Course {i:03}', description='Seeded course', start_date=start, end_date=start + datetime.timedelta(days=180))
+            for i in range(cls.COURSES)
+        ])
+        course_ids = list(Course.objects.values_list('id', flat=True))
+        Student.objects.bulk_create([
+            Student(name=f'Student {i:05}', email=f'student{i}@example.com', phone='5550100')
+            for i in range(cls.STUDENTS)
+        ])
+        Student.objects.filter(email=cls.student_user.email).update(user=cls.student_user)
+        student_ids = list(Student.objects.values_list('id', flat=True))
+        Enrollment = Student.enrolled_courses.through
+        Enrollment.objects.bulk_create([
+            Enrollment(student_id=sid, course_id=course_ids[(i + offset) % len(course_ids)])
+            for i, sid in enumerate(student_ids) for offset in (0, 1)
+        ])
+        Result.objects.bulk_create([
+            Result(student_id=student_ids[i % len(student_ids)], course_id=course_ids[i % len(course_ids)], marks=i % 100)
+            for i in range(cls.ROWS)
+        ])
+        StudyMaterial.objects.bulk_create([
+            StudyMaterial(title=f'Material {i}', file=f'resources/m{i}.pdf', uploaded_by=cls.teacher, course_id=course_ids[i % len(course_ids)])
+            for i in range(cls.ROWS)
+        ])
+        Assignment.objects.bulk_create([
+            Assignment(title=f'Assignment {i}', file=f'assignments/a{i}.pdf', assigned_by=cls.teacher,
+                       course_id=course_ids[i % len(course_ids)], due_date=start + datetime.timedelta(days=i % 90))
+            for i in range(cls.ROWS)
+        ])
+        cls.conversation = inbox.send_message(cls.teacher, cls.student_user, 'Welcome').conversation
+        Message.objects.bulk_create([
+            Message(sender=cls.teacher if i % 2 else cls.student_user, receiver=cls.student_user if i % 2 else cls.teacher,
+                    content=f'Message {i}', conversation=cls.conversation)
+            for i in range(cls.ROWS)
+        ])
+        for i in range(cls.COURSES):
+            peer = User.objects.create(username=f'peer{i}', email=f'peer{i}@example.com')
+            inbox.send_message(peer, cls.teacher, f'Hello from peer {i}')
+        Announcement.objects.bulk_create([
+            Announcement(title=f'Announcement {i}', content='Seeded', created_by=cls.teacher, for_all=i % 2 == 0, for_role='teacher')
+            for i in range(200)
+        ])
+
+
+class QueryBudgetTests(SeededDataMixin, TestCase):
+    """Every list view must stay within a fixed number of queries regardless of table size."""
+
+    # Session and user lookups done by the auth middleware for a logged-in request
+    AUTH_QUERIES = 2
+
+    def setUp(self):
+        cache.clear()
+
+    def assertQueryBudget(self, user, url, budget):
+        """Budgets are for the steady state, with the user's roles already cached."""
+        self.client.force_login(user)
+        roles.get_roles(user)
+        with self.assertNumQueries(self.AUTH_QUERIES + budget):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_course_list(self):
+        # courses page, student lookup, enrolled ids; role checks in the navbar and cards are free
+        self.assertQueryBudget(self.student_user, reverse('course_list'), 3)
+
+    def test_student_list(self):
+        self.assertQueryBudget(self.teacher, reverse('student_list'), 2)
+
+    def test_teacher_list_prefetches_enrolled_courses(self):
+        response = self.assertQueryBudget(self.teacher, reverse('teacher_list'), 3)
+        self.assertContains(response, 'Course 000')
+
+    def test_results_view(self):
+        self.assertQueryBudget(self.teacher, reverse('results_view'), 2)
+
+    def test_results_view_for_student(self):
+        self.assertQueryBudget(self.student_user, reverse('results_view'), 3)
+
+    def test_study_materials(self):
+        self.assertQueryBudget(self.teacher, reverse('study_materials'), 2)
+
+    def test_assignments_list(self):
+        self.assertQueryBudget(self.teacher, reverse('assignments_list'), 2)
+
+    def test_announcements(self):
+        # 'all' and 'teacher' partitions on a cold feed cache, nothing once they are cached
+        self.assertQueryBudget(self.teacher, reverse('announcements_view'), 2)
+        self.assertQueryBudget(self.teacher, reverse('announcements_view'), 0)
+
+    def test_view_analytics(self):
+        self.assertQueryBudget(self.teacher, reverse('view_analytics'), 1)
+
+    def test_messages_inbox(self):
+        # inbox page, unread total, recipient list
+        response = self.assertQueryBudget(self.teacher, reverse('messages_view'), 3)
+        self.assertContains(response, 'peer0')
+
+    def test_message_thread(self):
+        # membership, mark read (savepoint, two updates, release), thread page
+        url = reverse('message_thread', args=[self.conversation.pk])
+        self.assertQueryBudget(self.student_user, url, 6)
+        self.assertQueryBudget(self.student_user, url, 2)
+
+    def test_pages_cost_the_same_deep_in_the_listing(self):
+        self.client.force_login(self.teacher)
+        url = reverse('results_view')
+        first = self.client.get(url)
+        with self.assertNumQueries(self.AUTH_QUERIES + 2):
+            self.client.get(url, {'cursor': first.context['page'].next_cursor})
+
+    def test_tampered_cursors_fall_back_to_the_first_page(self):
+        self.client.force_login(self.teacher)
+        first = [r.pk for r in self.client.get(reverse('results_view')).context['page']]
+        for values in (['abc', 1], [{'a': 1}, 2], [None, None], ['2025-01-01T00:00:00+00:00', 'zzz'], [1]):
+            cursor = encode_cursor(values)
+            for name in ('results_view', 'study_materials', 'assignments_list', 'student_list', 'messages_view', 'course_list'):
+                response = self.client.get(reverse(name), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200, (name, values))
+            self.assertEqual([r.pk for r in self.client.get(reverse('results_view'), {'cursor': cursor}).context['page']], first)
+            response = self.client.get(reverse('api_list', args=['results']), {'cursor': encode_cursor(['zzz', 1])})
+            self.assertEqual(response.status_code, 200)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_every_route_is_benchmarked_or_skipped(self):
+        names = {pattern.name for pattern in get_resolver('coaching.urls').url_patterns}
+        self.assertEqual(names, set(benchmark.ROUTES) | set(benchmark.SKIPPED))
+
+    def test_seed_and_benchmark_smoke(self):
+        # Roles cached for the seeded users would outlive their rolled-back rows
+        self.addCleanup(cache.clear)
+        call_command('seed_data', courses=3, students=20, teachers=2, attendance_days=2, results=40, messages=30,
+                     announcements=6, materials_per_course=3, assignments_per_course=2, stdout=io.StringIO())
+        self.assertEqual(Student.objects.count(), 20)
+        self.assertEqual(Result.objects.count(), 40)
+        self.assertEqual(Message.objects.count(), 30)
+        with self.assertRaises(CommandError):
+            call_command('seed_data', students=1, stdout=io.StringIO())
+
+        output = os.path.join(tempfile.mkdtemp(), 'report.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        call_command('benchmark', repeat=1, output=output, stderr=io.StringIO())
+        with open(output) as source:
+            report = json.load(source)
+        self.assertEqual(set(report['routes']), set(benchmark.ROUTES))
+        for name, result in report['routes'].items():
+            self.assertLess(result['status'], 500, name)
+            self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+
+        # A run compared with itself passes; one with an extra query per route fails
+        call_command('benchmark', 'course_list', repeat=1, baseline=output, tolerance=100, stdout=io.StringIO(), stderr=io.StringIO())
+        report['routes']['course_list']['queries'] -= 1
+        with open(output, 'w') as target:
+            json.dump(report, target)
+        with self.assertRaisesMessage(CommandError, 'course_list: queries'):
+            call_command('benchmark', 'course_list', repeat=1, baseline=output, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+class APITests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.teacher.groups.add(Group.objects.create(name='Teachers'))
+        cls.user = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        cls.courses = [
+            Course.objects.create(name=name, description='', start_date='2025-01-01', end_date='2025-06-01')
+            for name in ('Biology', 'Chemistry', 'Physics')
+        ]
+        cls.students = [
+            Student.objects.create(name=f'Student {i}', email=f's{i}@example.com', phone=str(i), user=cls.user if i == 0 else None)
+            for i in range(20)
+        ]
+        for i, student in enumerate(cls.students):
+            student.enrolled_courses.set(cls.courses[:i % 3 + 1])
+        cls.results = [
+            Result.objects.create(student=cls.students[i % 4], course=cls.courses[i % 3], marks=50 + i) for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        return response.status_code, response.json()
+
+    def test_sparse_fields_are_read_without_model_instances(self):
+        self.client.force_login(self.teacher)
+        with mock.patch.object(Result, 'from_db', side_effect=AssertionError('instantiated')):
+            status, body = self.get(reverse('api_list', args=['results']), fields='id,marks,course_name')
+        self.assertEqual(status, 200)
+        self.assertEqual(set(body['results'][0]), {'id', 'marks', 'course_name'})
+        status, body = self.get(reverse('api_list', args=['results']), fields='id,secret')
+        self.assertEqual(status, 400)
+        self.assertIn('secret', body['error'])
+
+    def test_cursor_pages_walk_every_row_once(self):
+        self.client.force_login(self.teacher)
+        seen, cursor = [], None
+        while True:
+            params = {'per_page': 3, 'fields': 'id'}
+            if cursor:
+                params['cursor'] = cursor
+            status, body = self.get(reverse('api_list', args=['results']), **params)
+            seen += [row['id'] for row in body['results']]
+            cursor = body['next']
+            if not cursor:
+                break
+        self.assertEqual(seen, [result.pk for result in reversed(self.results)])
+
+    def test_batch_keeps_order_reports_missing_and_loads_relations_per_page(self):
+        self.client.force_login(self.teacher)
+        url = reverse('api_batch', args=['students'])
+        ids = [self.students[2].pk, 999999, self.students[0].pk]
+        status, body = self.get(url, ids=','.join(map(str, ids)), fields='id,course_ids')
+        self.assertEqual([row['id'] for row in body['results']], [ids[0], ids[2]])
+        self.assertEqual(body['results'][0]['course_ids'], [course.pk for course in self.courses])
+        self.assertEqual(body['missing'], [999999])
+
+        with CaptureQueriesContext(connection) as few:
+            self.get(url, ids=','.join(str(s.pk) for s in self.students[:2]), fields='id,course_ids')
+        with CaptureQueriesContext(connection) as many:
+            self.get(url, ids=','.join(str(s.pk) for s in self.students), fields='id,course_ids')
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(self.get(url, ids=','.join(map(str, range(1, 102))))[0], 400)
+
+    def test_students_only_see_their_own_records(self):
+        self.assertEqual(self.get(reverse('api_list', args=['results']))[0], 401)
+        self.client.force_login(self.user)
+        status, body = self.get(reverse('api_list', args=['results']), fields='student_id')
+        self.assertEqual({row['student_id'] for row in body['results']}, {self.students[0].pk})
+        other = [r.pk for r in self.results if r.student_id != self.students[0].pk]
+        status, body = self.get(reverse('api_batch', args=['results']), ids=','.join(map(str, other)))
+        self.assertEqual((body['results'], body['missing']), ([], other))
+        self.assertEqual(self.get(reverse('api_list', args=['fees']))[0], 404)
+
+
+@override_settings(EVENTS_POLL_INTERVAL=0.01)
+class EventStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        cls.teacher.groups.add(Group.objects.create(name='Teachers'))
+        cls.student = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        cls.student.groups.add(Group.objects.create(name='Students'))
+
+    def setUp(self):
+        cache.clear()
+
+    def scope(self, user=None, last_event_id=None):
+        headers = []
+        if user is not None:
+            self.client.force_login(user)
+            headers.append((b'cookie', f'sessionid={self.client.session.session_key}'.encode()))
+        if last_event_id is not None:
+            headers.append((b'last-event-id', str(last_event_id).encode()))
+        return {'type': 'http', 'method': 'GET', 'path': events.PATH, 'query_string': b'', 'headers': headers}
+
+    async def open(self, scope):
+        stream = ApplicationCommunicator(events.route(None), scope)
+        await stream.send_input({'type': 'http.request', 'body': b''})
+        start = await stream.receive_output(timeout=5)
+        return stream, start
+
+    async def frame(self, stream):
+        while True:
+            body = (await stream.receive_output(timeout=5))['body'].decode()
+            if body.startswith('id:'):
+                return dict(line.split(': ', 1) for line in body.strip().split('\n'))
+
+    def test_messages_and_announcements_record_events_for_their_audience(self):
+        inbox.send_message(self.teacher, self.student, 'Homework is due Friday')
+        Announcement.objects.create(title='Holiday', content='', created_by=self.teacher, for_all=False, for_role='student')
+        message, announcement = Event.objects.order_by('id')
+        self.assertEqual((message.kind, message.user, message.payload['content']), ('message', self.student, 'Homework is due Friday'))
+        self.assertEqual((announcement.kind, announcement.user, announcement.role), ('announcement', None, 'student'))
+        Event.objects.update(created_at=timezone.now() - datetime.timedelta(days=3))
+        call_command('purge_events', stdout=io.StringIO())
+        self.assertFalse(Event.objects.exists())
+
+    async def test_new_message_is_pushed_to_its_receiver_only(self):
+        scope = await sync_to_async(self.scope)(self.student)
+        stream, start = await self.open(scope)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        await sync_to_async(inbox.send_message)(self.student, self.teacher, 'Not for the sender')
+        await sync_to_async(inbox.send_message)(self.teacher, self.student, 'Hello')
+        frame = await self.frame(stream)
+        self.assertEqual(frame['event'], 'message')
+        self.assertEqual(json.loads(frame['data'])['content'], 'Hello')
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(timeout=5)
+        self.assertFalse(events.broker.subscriptions)
+
+    async def test_reconnect_replays_missed_events_for_the_users_roles(self):
+        await sync_to_async(Announcement.objects.create)(title='Teachers only', content='', created_by=self.teacher,
+                                                         for_all=False, for_role='teacher')
+        first = await sync_to_async(Announcement.objects.create)(title='Everyone', content='', created_by=self.teacher, for_all=True)
+        scope = await sync_to_async(self.scope)(self.student, last_event_id=0)
+        stream, _ = await self.open(scope)
+        frame = await self.frame(stream)
+        self.assertEqual((frame['event'], json.loads(frame['data'])['id']), ('announcement', first.pk))
+        await stream.send_input({'type': 'http.disconnect'})
+        await stream.wait(timeout=5)
+
+    async def test_anonymous_clients_are_refused(self):
+        stream, start = await self.open(self.scope())
+        self.assertEqual(start['status'], 401)
+
+
+class DashboardCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        self.user = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        self.student = Student.objects.create(user=self.user, name='Asha', email='asha@example.com', phone='1')
+        self.courses = [
+            Course.objects.create(name=name, description='', start_date='2025-01-01', end_date='2025-06-01')
+            for name in ('Physics', 'Chemistry', 'Biology')
+        ]
+
+    def test_teacher_dashboard_counts_come_from_the_cache(self):
+        self.client.force_login(self.teacher)
+        self.assertContains(self.client.get(reverse('teacher_dashboard')), '<b>1</b> Students')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('teacher_dashboard'))
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(name='Ravi', email='ravi@example.com', phone='2')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.courses[0].delete()
+        self.assertEqual(counters.get_counts('students', 'courses'), {'students': 2, 'courses': 2})
+        response = self.client.get(reverse('teacher_dashboard'))
+        self.assertContains(response, '<b>2</b> Students')
+        self.assertContains(response, '<b>2</b> Courses')
+
+    def test_invalidation_reaches_other_processes(self):
+        other = caches.create_connection('default')
+        counters.get_counts('students')
+        self.assertEqual(other.get(counters.COUNTER_KEY.format('students')), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Student.objects.create(name='Ravi', email='ravi@example.com', phone='2')
+        self.assertIsNone(other.get(counters.COUNTER_KEY.format('students')))
+        profiles.enrolled_course_ids(self.student.pk)
+        self.assertEqual(other.get(profiles.ENROLLED_KEY.format(self.student.pk)), set())
+        self.courses[1].student_set.add(self.student)
+        self.assertIsNone(other.get(profiles.ENROLLED_KEY.format(self.student.pk)))
+
+    def test_student_dashboard_follows_enrollments(self):
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('student_dashboard')), '<b>0</b> enrolled &middot; <b>3</b> available')
+        self.client.post(reverse('enroll_course', args=[self.courses[0].pk]))
+        self.assertContains(self.client.get(reverse('student_dashboard')), '<b>1</b> enrolled &middot; <b>2</b> available')
+        # Reverse-side changes and cascades from a deleted course reach the cached set too
+        self.courses[1].student_set.add(self.student)
+        self.assertContains(self.client.get(reverse('student_dashboard')), '<b>2</b> enrolled')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.courses[0].delete()
+        self.assertContains(self.client.get(reverse('student_dashboard')), '<b>1</b> enrolled &middot; <b>1</b> available')
+
+    def test_import_keeps_counters_in_step(self):
+        self.assertEqual(counters.get_counts('students')['students'], 1)
+        rows = [(2, {'name': 'Ravi', 'email': 'ravi@example.com', 'phone': '2', 'courses': 'Physics'}),
+                (3, {'name': 'Asha', 'email': 'asha@example.com', 'phone': '1', 'courses': 'Biology'})]
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_students(rows)
+        self.assertEqual(counters.get_counts('students')['students'], 2)
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(reverse('student_dashboard')), '<b>1</b> enrolled')
+
+
+class StaticAssetTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.static_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.static_root)
+        cls.enterClassContext(override_settings(STATIC_ROOT=cls.static_root))
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    def stylesheet_url(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotContains(response, 'html, body {')
+        href = response.content.decode().split('rel="stylesheet" href="', 1)[1].split('"', 1)[0]
+        self.assertRegex(href, r'^/static/coaching/css/base\.[0-9a-f]{12}\.css$')
+        return href
+
+    def test_pages_link_hashed_assets_served_immutable_and_compressed(self):
+        href = self.stylesheet_url()
+        with open(os.path.join(self.static_root, 'coaching', 'css', 'base.css'), 'rb') as source:
+            original = source.read()
+
+        response = self.client.get(href, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), original)
+
+        plain = self.client.get(href, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(plain.streaming_content), original)
+        self.assertEqual(self.client.get(href, HTTP_IF_NONE_MATCH=plain['ETag']).status_code, 304)
+
+    def test_unhashed_names_revalidate_and_paths_stay_inside_static_root(self):
+        response = self.client.get('/static/coaching/css/base.css')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get('/static/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/static/coaching/css/missing.css').status_code, 404)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.admin = User.objects.create_superuser('root', 'root@example.com', 'pass')
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        cache.clear()
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_url_name(self):
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('course_list'))
+        self.client.get(reverse('course_list'))
+        self.client.get('/no-such-page/')
+        self.client.force_login(self.admin)
+        body = self.scrape()
+        self.assertIn('coaching_requests_total{view="course_list",method="GET",status="200"} 2', body)
+        self.assertIn('coaching_requests_total{view="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('coaching_request_duration_seconds_bucket{view="course_list",le="+Inf"} 2', body)
+        self.assertIn('coaching_request_template_seconds_count{view="course_list"} 2', body)
+        values = metrics.registry.collect()
+        self.assertGreater(values[('coaching_request_queries', (('view', 'course_list'),))][-2], 0)
+        self.assertGreater(values[('coaching_request_template_seconds', (('view', 'course_list'),))][-2], 0)
+        self.assertGreater(values[('coaching_response_size_bytes', (('view', 'course_list'),))][-2], 1000)
+
+    def test_streamed_responses_are_measured_when_consumed(self):
+        course = Course.objects.create(name='Physics', description='', start_date='2025-01-01', end_date='2025-06-01')
+        student = Student.objects.create(name='Asha', email='asha@example.com', phone='1')
+        Result.objects.create(student=student, course=course, marks=80)
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('export_data', args=['results']))
+        key = ('coaching_response_size_bytes', (('view', 'export_data'),))
+        self.assertNotIn(key, metrics.registry.collect())
+        body = b''.join(response.streaming_content)
+        self.assertEqual(metrics.registry.collect()[key][-2], len(body))
+        self.assertGreater(metrics.registry.collect()[('coaching_request_queries', (('view', 'export_data'),))][-2], 0)
+
+    def test_file_responses_keep_their_file_for_the_server(self):
+        with tempfile.NamedTemporaryFile() as upload:
+            upload.write(b'x' * 1000)
+            upload.flush()
+            handle = open(upload.name, 'rb')
+            middleware = metrics.MetricsMiddleware(lambda request: FileResponse(handle))
+            response = middleware(RequestFactory().get('/media/notes.pdf'))
+            # wsgi.file_wrapper reads file_to_stream; wrapping streaming_content would hide it
+            self.assertIs(response.file_to_stream, handle)
+            self.assertEqual(metrics.registry.collect()[('coaching_response_size_bytes', (('view', 'unmatched'),))][-2], 1000)
+            self.assertEqual(b''.join(response.streaming_content), b'x' * 1000)
+            response.close()
+
+    def test_scrape_requires_token_or_superuser(self):
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.logout()
+        with override_settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertIn('# TYPE coaching_requests_total counter', self.scrape(HTTP_AUTHORIZATION='Bearer s3cret'))
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0, METRICS_SLOW_SQL_COUNT=2)
+    def test_slow_requests_log_their_slowest_statements(self):
+        self.client.force_login(self.teacher)
+        with self.assertLogs('coaching.metrics.slow', 'WARNING') as logs:
+            self.client.get(reverse('course_list'))
+        self.assertIn('Slow request GET course_list (200)', logs.output[0])
+        self.assertEqual(logs.output[0].count('ms  SELECT'), 2)
+
+    def test_processes_share_totals_through_metrics_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = [['coaching_requests_total', [['view', 'home'], ['method', 'GET'], ['status', '200']], 5]]
+        with open(os.path.join(directory, 'metrics-1.json'), 'w') as target:
+            json.dump(other, target)
+        with override_settings(METRICS_DIR=directory):
+            self.client.get(reverse('home'))
+            metrics.registry.flush(force=True)
+            self.assertTrue(os.path.exists(os.path.join(directory, f'metrics-{os.getpid()}.json')))
+            values = metrics.registry.collect()
+        self.assertEqual(values[('coaching_requests_total', (('view', 'home'), ('method', 'GET'), ('status', '200')))], 6)
+
+
+class QueryPlanTests(SeededDataMixin, TestCase):
+    """The queries behind each view must reach the large tables through an index, never a full scan."""
+
+    # Tables that grow with the institute; scanning the handful of courses or groups is fine
+    LARGE_TABLES = {
+        'coaching_student', 'coaching_student_enrolled_courses', 'coaching_result', 'coaching_studymaterial',
+        'coaching_assignment', 'coaching_message', 'coaching_announcement', 'coaching_attendance',
+        'coaching_studentcoursestats', 'coaching_conversation', 'coaching_conversationmember',
+    }
+
+    def setUp(self):
+        cache.clear()
+
+    def capture(self, user, url, params=None):
+        captured = []
+
+        def record(execute, sql, sql_params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                captured.append((sql, sql_params))
+            return execute(sql, sql_params, many, context)
+
+        self.client.force_login(user)
+        with connection.execute_wrapper(record):
+            self.assertEqual(self.client.get(url, params).status_code, 200)
+        return captured
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+        return [
+            detail for detail in details
+            if detail.startswith('SCAN ') and detail.split()[1] in self.LARGE_TABLES and 'INDEX' not in detail
+        ]
+
+    def assertIndexed(self, user, url, params=None):
+        for sql, sql_params in self.capture(user, url, params):
+            scans = self.full_scans(sql, sql_params)
+            self.assertFalse(scans, f'{url} {params or ""}: {scans} in\n{sql}')
+
+    def test_listing_views_use_indexes(self):
+        course = Course.objects.order_by('id').first().pk
+        cases = [
+            (self.student_user, 'course_list', None),
+            (self.teacher, 'student_list', None),
+            (self.teacher, 'student_list', {'course': course}),
+            (self.teacher, 'teacher_list', None),
+            (self.teacher, 'results_view', None),
+            (self.teacher, 'results_view', {'course': course}),
+            (self.student_user, 'results_view', None),
+            (self.student_user, 'results_view', {'course': course}),
+            (self.teacher, 'study_materials', None),
+            (self.teacher, 'study_materials', {'course': course}),
+            (self.teacher, 'assignments_list', None),
+            (self.teacher, 'assignments_list', {'course': course}),
+            (self.teacher, 'announcements_view', None),
+            (self.student_user, 'view_analytics', None),
+            (self.teacher, 'messages_view', None),
+        ]
+        for user, name, params in cases:
+            with self.subTest(view=name, params=params, user=user.username):
+                self.assertIndexed(user, reverse(name), params)
+
+    def test_deep_pages_and_threads_use_indexes(self):
+        self.client.force_login(self.teacher)
+        cursor = self.client.get(reverse('results_view')).context['page'].next_cursor
+        self.assertTrue(cursor)
+        self.assertIndexed(self.teacher, reverse('results_view'), {'cursor': cursor})
+        self.assertIndexed(self.student_user, reverse('message_thread', args=[self.conversation.pk]))
+
+
+class AnnouncementFeedTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        self.student = User.objects.create_user('student', 'student@example.com', 'pass')
+        self.student.groups.add(Group.objects.create(name='Students'))
+        Announcement.objects.create(title='Holiday', content='Closed', created_by=self.teacher, for_all=True)
+        Announcement.objects.create(title='Staff meeting', content='Room 4', created_by=self.teacher, for_all=False, for_role='teacher')
+
+    def test_feed_is_partitioned_by_role(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('announcements_view'))
+        self.assertContains(response, 'Holiday')
+        self.assertNotContains(response, 'Staff meeting')
+        self.client.force_login(self.teacher)
+        self.assertContains(self.client.get(reverse('announcements_view')), 'Staff meeting')
+
+    def test_conditional_get_returns_304_without_feed_queries(self):
+        self.client.force_login(self.teacher)
+        etag = self.client.get(reverse('announcements_view'))['ETag']
+        # only the session and user lookups of the auth middleware
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('announcements_view'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_new_announcement_invalidates_feed(self):
+        self.client.force_login(self.teacher)
+        etag = self.client.get(reverse('announcements_view'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title='Exam dates', content='Soon', created_by=self.teacher, for_all=True)
+        response = self.client.get(reverse('announcements_view'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Exam dates')
+
+    def test_etag_covers_the_user_csrf_token_and_messages(self):
+        url = reverse('announcements_view')
+        anonymous = self.client.get(url)['ETag']
+        self.client.force_login(User.objects.create_user('nobody', 'nobody@example.com', 'pass'))
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(etag, anonymous)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Logging in or out rotates the CSRF token, so the cached form would be rejected
+        self.client.cookies.pop(settings.CSRF_COOKIE_NAME)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # A page showing flash messages consumes them, so it is never a 304
+        request = RequestFactory().get(url)
+        request.user = self.student
+        request._messages = CookieStorage(request)
+        self.assertIsNotNone(feed.etag(request))
+        messages.info(request, 'Posted.')
+        self.assertIsNone(feed.etag(request))
+
+    def test_invalidation_reaches_other_processes(self):
+        other = caches.create_connection('default')
+        self.client.force_login(self.teacher)
+        self.client.get(reverse('announcements_view'))
+        stamp = other.get(feed.STAMP_KEY)
+        self.assertIsNotNone(other.get(feed.FEED_KEY.format(feed.ALL)))
+        with self.captureOnCommitCallbacks(execute=True):
+            Announcement.objects.create(title='Exam dates', content='Soon', created_by=self.teacher, for_all=True)
+        self.assertIsNone(other.get(feed.FEED_KEY.format(feed.ALL)))
+        self.assertNotEqual(other.get(feed.STAMP_KEY), stamp)
+
+
+class RoleCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(name='Teachers')
+        self.user = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.user.groups.add(self.group)
+
+    def test_roles_resolved_once_per_request(self):
+        self.client.force_login(self.user)
+        # session, user, results page, course filter, plus one role lookup shared by the navbar and the view
+        with self.assertNumQueries(5):
+            self.client.get(reverse('results_view'))
+        with self.assertNumQueries(4):
+            self.client.get(reverse('results_view'))
+
+    def test_membership_change_invalidates_cache(self):
+        self.assertTrue(roles.is_teacher(User.objects.get(pk=self.user.pk)))
+        self.user.groups.remove(self.group)
+        self.assertFalse(roles.is_teacher(User.objects.get(pk=self.user.pk)))
+        self.group.user_set.add(self.user)
+        self.assertTrue(roles.is_teacher(User.objects.get(pk=self.user.pk)))
+        self.group.name = 'Staff'
+        self.group.save()
+        self.assertFalse(roles.is_teacher(User.objects.get(pk=self.user.pk)))
+
+    def test_invalidation_reaches_other_processes(self):
+        # Each process opens its own connection to the cache; a revoked role must be dropped for all of them
+        self.assertNotIsInstance(cache, LocMemCache)
+        other = caches.create_connection('default')
+        key = roles.ROLE_CACHE_KEY.format(self.user.pk)
+        roles.get_roles(User.objects.get(pk=self.user.pk))
+        self.assertEqual(other.get(key), frozenset({'Teachers'}))
+        self.user.groups.remove(self.group)
+        self.assertIsNone(other.get(key))
+
+
+class MediaServingTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root, MEDIA_SENDFILE=None)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        self.student_user = User.objects.create_user('student', 'student@example.com', 'pass')
+        start = datetime.date(2025, 1, 1)
+        self.course = Course.objects.create(name='Physics', description='', start_date=start, end_date=start)
+        other = Course.objects.create(name='Chemistry', description='', start_date=start, end_date=start)
+        student = Student.objects.create(name='Asha', email='student@example.com', phone='1', user=self.student_user)
+        student.enrolled_courses.add(self.course)
+        self.body = bytes(range(256)) * 4
+        self.material = StudyMaterial(title='Lecture', course=self.course, uploaded_by=self.teacher)
+        self.material.file.save('lecture.mp4', ContentFile(self.body))
+        self.hidden = StudyMaterial(title='Other', course=other, uploaded_by=self.teacher)
+        self.hidden.file.save('other.pdf', ContentFile(b'%PDF'))
+        self.url = reverse('serve_file', args=['material', self.material.pk])
+
+    def test_access_follows_enrollment(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.force_login(self.student_user)
+        response = self.client.get(self.url)
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+        self.assertEqual(self.client.get(reverse('serve_file', args=['material', self.hidden.pk])).status_code, 403)
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(reverse('serve_file', args=['material', self.hidden.pk])).status_code, 200)
+
+    def test_range_requests(self):
+        self.client.force_login(self.student_user)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(b''.join(response.streaming_content), self.body[100:200])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-24')
+        self.assertEqual(b''.join(response.streaming_content), self.body[-24:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+        # A stale If-Range falls back to the whole file
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_revalidation(self):
+        self.client.force_login(self.student_user)
+        etag = self.client.get(self.url)['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_sendfile_offload(self):
+        self.client.force_login(self.teacher)
+        with self.settings(MEDIA_SENDFILE='x-accel-redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/' + self.material.file.name)
+        self.assertEqual(response.content, b'')
+
+
+class ChunkedUploadTests(TestCase):
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.settings_override = override_settings(
+            MEDIA_ROOT=os.path.join(root, 'media'), CHUNKED_UPLOAD_DIR=os.path.join(root, 'parts'))
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        cache.clear()
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        self.course = Course.objects.create(name='Physics', description='', start_date='2025-01-01', end_date='2025-06-01')
+        self.client.force_login(self.teacher)
+        self.data = b'0123456789' * 10
+
+    def start(self, data=None, sha256=None):
+        data = self.data if data is None else data
+        response = self.client.post(reverse('upload_start'), {
+            'filename': 'notes.pdf', 'size': len(data), 'sha256': sha256 or hashlib.sha256(data).hexdigest()})
+        self.assertEqual(response.status_code, 201)
+        return reverse('upload_chunk', args=[response.json()['upload_id']])
+
+    def put(self, url, first, last, total=None):
+        return self.client.put(url, self.data[first:last + 1], content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{total or len(self.data)}')
+
+    def complete(self, url, **data):
+        return self.client.post(url + 'complete/', data)
+
+    def test_upload_resumes_from_the_received_offset(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 39).json()['offset'], 40)
+        # The connection dropped; the client asks where to carry on
+        self.assertEqual(self.client.get(url).json()['offset'], 40)
+        self.assertEqual(self.put(url, 40, 99).json()['offset'], 100)
+        response = self.complete(url, kind='study_material', title='Notes', course=self.course.pk)
+        self.assertEqual(response.status_code, 201)
+        material = StudyMaterial.objects.get(pk=response.json()['id'])
+        with material.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertTrue(self.client.get(url).json()['complete'])
+        self.assertFalse(os.listdir(settings.CHUNKED_UPLOAD_DIR))
+
+    def test_out_of_order_chunk_is_rejected(self):
+        url = self.start()
+        self.put(url, 0, 39)
+        response = self.put(url, 60, 99)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['offset'], 40)
+        self.assertEqual(self.put(url, 0, 39).status_code, 409)
+
+    def test_bad_content_range_is_rejected(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 100, total=101).status_code, 400)
+        self.assertEqual(self.put(url, 90, 100).status_code, 416)
+        self.assertEqual(self.put(url, 40, 20).status_code, 416)
+        response = self.client.put(url, b'abc', content_type='application/octet-stream', HTTP_CONTENT_RANGE='0-2')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).json()['offset'], 0)
+
+    def test_checksum_mismatch_creates_nothing(self):
+        url = self.start(sha256=hashlib.sha256(b'something else').hexdigest())
+        self.put(url, 0, 99)
+        response = self.complete(url, kind='study_material', title='Notes', course=self.course.pk)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(StudyMaterial.objects.exists())
+
+    def test_concurrent_completes_attach_the_file_once(self):
+        url = self.start()
+        self.put(url, 0, 99)
+        session = UploadSession.objects.get()
+        # Both requests loaded the session before either finished
+        stale = UploadSession.objects.get()
+        data = {'title': 'Notes', 'course': self.course.pk}
+        uploads.complete(session, 'study_material', data)
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.complete(stale, 'study_material', data)
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(StudyMaterial.objects.count(), 1)
+
+    def test_failed_complete_releases_its_claim(self):
+        url = self.start()
+        self.put(url, 0, 99)
+        data = {'title': 'Notes', 'course': self.course.pk}
+        with mock.patch.object(uploads.AssembledFile, 'temporary_file_path', side_effect=OSError('disk full')), \
+                self.assertRaises(OSError):
+            uploads.complete(UploadSession.objects.get(), 'study_material', data)
+        self.assertIsNone(UploadSession.objects.get().completed_at)
+        self.assertEqual(self.complete(url, kind='study_material', **data).status_code, 201)
+
+    def test_complete_failing_after_the_move_cleans_up(self):
+        url = self.start()
+        self.put(url, 0, 99)
+        data = {'title': 'Notes', 'course': self.course.pk}
+        with mock.patch.object(StudyMaterial, 'save', side_effect=OSError('database is locked')), \
+                self.assertRaises(OSError):
+            uploads.complete(UploadSession.objects.get(), 'study_material', data)
+        self.assertFalse(os.listdir(os.path.join(settings.MEDIA_ROOT, 'resources')))
+        # The part file is gone, so a retry is told to start over rather than failing with a 500
+        self.assertEqual(self.complete(url, kind='study_material', **data).status_code, 410)
+        self.assertFalse(StudyMaterial.objects.exists())
+
+    def test_study_material_form_uses_resumable_uploads(self):
+        response = self.client.get(reverse('study_materials'))
+        self.assertContains(response, 'data-chunked-upload="study_material"')
+        self.assertContains(response, f'data-upload-url="{reverse("upload_start")}"')
+
+    def test_incomplete_upload_cannot_be_completed(self):
+        url = self.start()
+        self.put(url, 0, 49)
+        response = self.complete(url, kind='study_material', title='Notes', course=self.course.pk)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(StudyMaterial.objects.exists())
+
+    def test_complete_upload_creates_an_assignment(self):
+        url = self.start()
+        self.put(url, 0, 99)
+        response = self.complete(url, kind='assignment', title='Homework', course=self.course.pk, due_date='2025-03-01')
+        self.assertEqual(response.status_code, 201)
+        assignment = Assignment.objects.get(pk=response.json()['id'])
+        self.assertEqual((assignment.course, assignment.assigned_by), (self.course, self.teacher))
+        self.assertEqual(assignment.file.size, len(self.data))
+        self.assertEqual(self.complete(url, kind='assignment', title='Again', course=self.course.pk,
+                                       due_date='2025-03-01').status_code, 409)
+
+
+class CourseImageTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        start = datetime.date(2025, 1, 1)
+        self.course = Course.objects.create(name='Physics', description='', start_date=start, end_date=start)
+
+    def upload(self, name, fmt, **kwargs):
+        buffer = io.BytesIO()
+        frames = [Image.new('RGB', (900, 600), colour) for colour in ('red', 'blue')]
+        frames[0].save(buffer, fmt, save_all=fmt == 'GIF', append_images=frames[1:], **kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('edit_course', args=[self.course.pk]), {
+                'name': 'Physics', 'description': '', 'image': SimpleUploadedFile(name, buffer.getvalue()),
+            })
+        self.assertEqual(jobs.run_pending(), 1)
+        self.course.refresh_from_db()
+        return self.course.image_variants
+
+    def test_thumbnails_follow_the_source_image(self):
+        variants = self.upload('poster.gif', 'GIF')
+        self.assertEqual(variants['source'], self.course.image.name)
+        storage = self.course.image.storage
+        with storage.open(variants['webp']['74']) as thumb:
+            image = Image.open(thumb)
+            self.assertEqual((image.format, image.size), ('WEBP', (74, 74)))
+            # first frame of the animation
+            self.assertGreater(image.convert('RGB').getpixel((37, 37))[0], 200)
+        old = variants['jpeg']['148']
+
+        variants = self.upload('poster.png', 'PNG')
+        self.assertTrue(variants['webp']['148'].startswith('course_images/poster'))
+        self.assertFalse(storage.exists(old))
+
+        response = self.client.get(reverse('course_list'))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertNotContains(response, self.course.image.url + '"')
+
+
+class StudentImportTests(TestCase):
+
+    def setUp(self):
+        start = datetime.date(2025, 1, 1)
+        self.physics = Course.objects.create(name='Physics', description='', start_date=start, end_date=start)
+        self.chemistry = Course.objects.create(name='Chemistry', description='', start_date=start, end_date=start)
+        Student.objects.create(name='Existing', email='old@example.com', phone='1').enrolled_courses.add(self.physics)
+
+    def run_import(self, text, chunk_size=2):
+        rows = importer.read_rows(io.BytesIO(text.encode()), 'students.csv')
+        return importer.import_students(rows, chunk_size=chunk_size)
+
+    def test_import_dedupes_and_reports_bad_rows(self):
+        report = self.run_import(
+            'Name,Email,Phone,DOB,Courses\n'
+            'Asha,asha@example.com,111,2001-02-03,Physics;chemistry\n'
+            'Ravi,not-an-email,222,,Physics\n'
+            'Old,old@EXAMPLE.com,333,,Chemistry\n'
+            '\n'
+            'Asha again,asha@example.com,111,,Physics\n'
+            'Mina,mina@example.com,444,yesterday,\n'
+            'Zoe,zoe@example.com,555,,Biology\n'
+        )
+        self.assertEqual((report.created, report.existing, report.enrollments, report.error_count), (1, 2, 3, 3))
+        self.assertEqual([line for line, _ in report.errors], [3, 7, 8])
+        self.assertIn('Biology', report.errors[2][1])
+        asha = Student.objects.get(email='asha@example.com')
+        self.assertEqual(asha.name, 'Asha')
+        self.assertEqual(set(asha.enrolled_courses.all()), {self.physics, self.chemistry})
+        self.assertEqual(set(Student.objects.get(email='old@example.com').enrolled_courses.all()), {self.physics, self.chemistry})
+
+    def test_queries_scale_with_chunks_not_rows(self):
+        lines = ''.join(f'Student {i},s{i}@example.com,1,,Physics\n' for i in range(300))
+        # course lookup, then per chunk: savepoint, existing, insert, ids, enrolled pairs, free seats, links,
+        # seat recount, waitlist cleanup, release
+        with self.assertNumQueries(1 + 10 * 3):
+            report = self.run_import('name,email,phone,dob,courses\n' + lines, chunk_size=100)
+        self.assertEqual((report.created, report.enrollments), (300, 300))
+
+
+class AttendanceTests(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Physics', description='', start_date='2025-01-01', end_date='2025-06-01')
+        self.students = [Student.objects.create(name=name, email=f'{name}@example.com', phone='1') for name in ('Asha', 'Ravi')]
+        self.outsider = Student.objects.create(name='Meera', email='meera@example.com', phone='1')
+        self.course.student_set.add(*self.students)
+        self.date = datetime.date(2025, 2, 3)
+
+    def marks(self):
+        return set(Attendance.objects.values_list('student_id', 'date', 'status'))
+
+    def test_resubmitting_a_session_overwrites_its_marks(self):
+        asha, ravi = self.students
+        self.assertEqual(attendance.mark_session(self.course, self.date, [asha.pk]), 2)
+        self.assertEqual(attendance.mark_session(self.course, self.date, [ravi.pk]), 2)
+        self.assertEqual(self.marks(), {(asha.pk, self.date, False), (ravi.pk, self.date, True)})
+        stats = StudentCourseStats.objects.get(student=ravi, course=self.course)
+        self.assertEqual((stats.sessions_total, stats.sessions_present), (1, 1))
+
+    def test_students_outside_the_roster_are_ignored(self):
+        asha, ravi = self.students
+        attendance.mark_session(self.course, self.date, [asha.pk, self.outsider.pk, 999999])
+        self.assertEqual(self.marks(), {(asha.pk, self.date, True), (ravi.pk, self.date, False)})
+
+    def test_course_picker_does_not_post_the_csrf_token(self):
+        teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.client.force_login(teacher)
+        response = self.client.get(reverse('mark_attendance'), {'course_id': self.course.pk, 'date': '2025-02-03'})
+        content = response.content.decode()
+        picker = content[content.index('<form method="get">'):content.index('<form method="post">')]
+        self.assertIn('name="course_id"', picker)
+        self.assertNotIn('csrfmiddlewaretoken', picker)
+        self.assertNotIn("form.method", content)
+        response = self.client.post(reverse('mark_attendance'), {
+            'course_id': self.course.pk, 'date': '2025-02-03', 'present': [self.students[0].pk]})
+        self.assertRedirects(response, f"{reverse('mark_attendance')}?course_id={self.course.pk}&date=2025-02-03")
+        self.assertEqual(len(self.marks()), 2)
+
+
+class AnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.course = Course.objects.create(name='Physics', description='', start_date='2025-01-01', end_date='2025-06-01')
+        self.student = Student.objects.create(name='Asha', email='asha@example.com', phone='1')
+        self.other = Student.objects.create(name='Ravi', email='ravi@example.com', phone='2')
+
+    def stats(self, student=None):
+        row = StudentCourseStats.objects.get(student=student or self.student, course=self.course)
+        return row.sessions_total, row.sessions_present, row.results_count, row.marks_total
+
+    def test_saves_and_deletes_keep_stats_in_step(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            absent = Attendance.objects.create(student=self.student, course=self.course, date='2025-02-03', status=False)
+            Attendance.objects.create(student=self.student, course=self.course, date='2025-02-04', status=True)
+            result = Result.objects.create(student=self.student, course=self.course, marks=40)
+        self.assertEqual(self.stats(), (2, 1, 1, 40))
+        with self.captureOnCommitCallbacks(execute=True):
+            absent.status = True
+            absent.save()
+            result.marks = 55
+            result.save()
+            Result.objects.create(student=self.student, course=self.course, marks=25)
+        self.assertEqual(self.stats(), (2, 2, 2, 80))
+        with self.captureOnCommitCallbacks(execute=True):
+            absent.delete()
+            result.delete()
+        self.assertEqual(self.stats(), (1, 1, 1, 25))
+
+        before = set(StudentCourseStats.objects.values_list(
+            'student_id', 'course_id', 'sessions_total', 'sessions_present', 'results_count', 'marks_total'))
+        call_command('rebuild_analytics', stdout=io.StringIO())
+        self.assertEqual(set(StudentCourseStats.objects.values_list(
+            'student_id', 'course_id', 'sessions_total', 'sessions_present', 'results_count', 'marks_total')), before)
+
+    def test_rolled_back_writes_are_not_refreshed_later(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Attendance.objects.create(student=self.student, course=self.course, date='2025-02-03', status=True)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        with mock.patch.object(analytics, 'refresh_course') as refresh:
+            with self.captureOnCommitCallbacks(execute=True):
+                Attendance.objects.create(student=self.other, course=self.course, date='2025-02-03', status=True)
+        refresh.assert_called_once_with(self.course.pk, {self.other.pk})
+
+
+class MigrationTestMixin:
+    """Migrate the test database back to ``migrate_from`` so a data migration can be run on hand-made rows."""
+
+    migrate_from = None
+    migrate_to = None
+
+    def setUp(self):
+        super().setUp()
+        self.executor = MigrationExecutor(connection)
+        self.executor.migrate([('coaching', self.migrate_from)])
+        self.old_apps = self.executor.loader.project_state([('coaching', self.migrate_from)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def migrate(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('coaching', self.migrate_to)])
+        return executor.loader.project_state([('coaching', self.migrate_to)]).apps
+
+
+class StudentProfileTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        self.student = Student.objects.create(name='Asha', email='asha@example.com', phone='1', user=self.user)
+        course = Course.objects.create(name='Physics', description='', start_date='2025-01-01', end_date='2025-06-01')
+        self.student.enrolled_courses.add(course)
+        self.course = course
+        cache.clear()
+
+    def test_profile_and_enrollments_load_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        # The profile, then the enrollment set (cached across requests afterwards)
+        with self.assertNumQueries(2):
+            self.assertEqual(profiles.get_student(request), self.student)
+            self.assertEqual(profiles.get_student(request), self.student)
+            self.assertEqual(profiles.get_enrolled_ids(request), {self.course.pk})
+            self.assertEqual(profiles.get_enrolled_ids(request), {self.course.pk})
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with self.assertNumQueries(1):
+            profiles.get_enrolled_ids(request)
+
+    def test_anonymous_users_have_no_profile(self):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        with self.assertNumQueries(0):
+            self.assertIsNone(profiles.get_student(request))
+            self.assertEqual(profiles.get_enrolled_ids(request), set())
+
+
+class StudentUserMigrationTests(MigrationTestMixin, TransactionTestCase):
+    migrate_from = '0008_listing_indexes'
+    migrate_to = '0009_student_user'
+
+    def test_students_are_linked_to_users_by_email(self):
+        User = self.old_apps.get_model('auth', 'User')
+        Student = self.old_apps.get_model('coaching', 'Student')
+        first = User.objects.create(username='asha', email='asha@example.com')
+        User.objects.create(username='asha2', email='asha@example.com')
+        ravi = User.objects.create(username='ravi', email='ravi@example.com')
+        User.objects.create(username='blank', email='')
+        for name, email in (('Asha', 'asha@example.com'), ('Ravi', 'ravi@example.com'), ('Mina', 'mina@example.com')):
+            Student.objects.create(name=name, email=email, phone='1')
+
+        Student = self.migrate().get_model('coaching', 'Student')
+        links = dict(Student.objects.values_list('name', 'user_id'))
+        # The lowest pk wins when accounts share an email; students without an account stay unlinked
+        self.assertEqual(links, {'Asha': first.pk, 'Ravi': ravi.pk, 'Mina': None})
+
+
+class InboxTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.asha = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        self.ravi = User.objects.create_user('ravi', 'ravi@example.com', 'pass')
+
+    def unread(self, user, peer):
+        return ConversationMember.objects.get(user=user, peer=peer).unread_count
+
+    def test_send_message_counts_unread_for_the_receiver_only(self):
+        inbox.send_message(self.teacher, self.asha, 'Homework is due Friday')
+        reply = inbox.send_message(self.asha, self.teacher, 'Thanks')
+        inbox.send_message(self.asha, self.teacher, 'Which chapter?')
+        self.assertEqual((self.unread(self.asha, self.teacher), self.unread(self.teacher, self.asha)), (1, 2))
+        # Both directions share one conversation, pointing at the newest message
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.key, inbox.conversation_key(self.asha.pk, self.teacher.pk))
+        self.assertEqual(Message.objects.filter(conversation=conversation).count(), 3)
+        self.assertEqual(conversation.last_message.content, 'Which chapter?')
+        self.assertGreaterEqual(conversation.last_message_at, reply.sent_at)
+
+    def test_mark_read_resets_the_count_and_stamps_the_messages(self):
+        inbox.send_message(self.teacher, self.asha, 'First')
+        inbox.send_message(self.teacher, self.asha, 'Second')
+        inbox.send_message(self.asha, self.teacher, 'Reply')
+        membership = inbox.get_membership(self.asha, Conversation.objects.get().pk)
+        inbox.mark_read(membership)
+        self.assertEqual((membership.unread_count, self.unread(self.asha, self.teacher)), (0, 0))
+        self.assertFalse(Message.objects.filter(receiver=self.asha, read_at__isnull=True).exists())
+        # The teacher has not read the reply yet
+        self.assertEqual(self.unread(self.teacher, self.asha), 1)
+        self.assertIsNone(Message.objects.get(receiver=self.teacher).read_at)
+        with self.assertNumQueries(0):
+            inbox.mark_read(membership)
+
+    def test_unread_total_sums_every_conversation(self):
+        self.assertEqual(inbox.unread_total(self.teacher), 0)
+        inbox.send_message(self.asha, self.teacher, 'Hello')
+        inbox.send_message(self.asha, self.teacher, 'Are you there?')
+        inbox.send_message(self.ravi, self.teacher, 'Hi')
+        self.assertEqual(inbox.unread_total(self.teacher), 3)
+        inbox.mark_read(inbox.get_membership(self.teacher, inbox.get_conversation(self.teacher, self.asha).pk))
+        self.assertEqual(inbox.unread_total(self.teacher), 1)
+        self.assertEqual(inbox.unread_total(self.asha), 0)
+
+
+class InboxMigrationTests(MigrationTestMixin, TransactionTestCase):
+    migrate_from = '0009_student_user'
+    migrate_to = '0010_inbox'
+
+    def test_messages_are_grouped_into_one_conversation_per_pair(self):
+        User = self.old_apps.get_model('auth', 'User')
+        Message = self.old_apps.get_model('coaching', 'Message')
+        teacher, asha, ravi = (User.objects.create(username=name) for name in ('teacher', 'asha', 'ravi'))
+        start = timezone.now() - datetime.timedelta(days=1)
+        sent = [(teacher, asha), (asha, teacher), (ravi, teacher), (teacher, asha)]
+        ids = []
+        for minutes, (sender, receiver) in enumerate(sent):
+            message = Message.objects.create(sender=sender, receiver=receiver, content=f'Message {minutes}')
+            # sent_at is auto_now_add; spread the history out so the newest message is unambiguous
+            Message.objects.filter(pk=message.pk).update(sent_at=start + datetime.timedelta(minutes=minutes))
+            ids.append(message.pk)
+
+        apps = self.migrate()
+        Conversation = apps.get_model('coaching', 'Conversation')
+        ConversationMember = apps.get_model('coaching', 'ConversationMember')
+        Message = apps.get_model('coaching', 'Message')
+        conversations = {conversation.key: conversation for conversation in Conversation.objects.all()}
+        teacher_asha = conversations.pop(inbox.conversation_key(teacher.pk, asha.pk))
+        ravi_teacher = conversations.pop(inbox.conversation_key(ravi.pk, teacher.pk))
+        self.assertEqual(conversations, {})
+        self.assertEqual((teacher_asha.last_message_id, ravi_teacher.last_message_id), (ids[3], ids[2]))
+        self.assertEqual(teacher_asha.last_message_at, start + datetime.timedelta(minutes=3))
+        threads = dict(Message.objects.values_list('pk', 'conversation_id'))
+        self.assertEqual(threads, {ids[0]: teacher_asha.pk, ids[1]: teacher_asha.pk, ids[2]: ravi_teacher.pk,
+                                   ids[3]: teacher_asha.pk})
+        # History counts as read: every member exists, with nothing unread and the thread's latest time
+        members = ConversationMember.objects.values_list('conversation_id', 'user_id', 'peer_id', 'unread_count',
+                                                         'last_message_at')
+        self.assertEqual(set(members), {
+            (teacher_asha.pk, teacher.pk, asha.pk, 0, teacher_asha.last_message_at),
+            (teacher_asha.pk, asha.pk, teacher.pk, 0, teacher_asha.last_message_at),
+            (ravi_teacher.pk, ravi.pk, teacher.pk, 0, ravi_teacher.last_message_at),
+            (ravi_teacher.pk, teacher.pk, ravi.pk, 0, ravi_teacher.last_message_at),
+        })
+        self.assertFalse(Message.objects.filter(read_at__isnull=True).exists())
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        self.teacher.groups.add(Group.objects.create(name='Teachers'))
+        start = datetime.date(2025, 1, 1)
+        self.course = Course.objects.create(name='Physics', description='', start_date=start, end_date=start)
+        other = Course.objects.create(name='Chemistry', description='', start_date=start, end_date=start)
+        students = Student.objects.bulk_create([Student(name=f'S{i}', email=f's{i}@example.com', phone='1') for i in range(50)])
+        Attendance.objects.bulk_create([
+            Attendance(student=student, course=course, date=start + datetime.timedelta(days=day), status=day % 2 == 0)
+            for student in students for course in (self.course, other) for day in range(10)
+        ])
+
+    def test_attendance_csv_is_streamed_and_filtered(self):
+        self.client.force_login(self.teacher)
+        url = reverse('export_data', args=['attendance'])
+        response = self.client.get(url, {'course': self.course.pk, 'from': '2025-01-03', 'to': '2025-01-05'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Attendance ID,Date,Student ID,Student,Course,Present')
+        self.assertEqual(len(lines), 1 + 50 * 3)
+        self.assertTrue(all(',Physics,' in line for line in lines[1:]))
+        self.assertEqual(self.client.get(url, {'from': 'yesterday'}).status_code, 400)
+
+    def test_csv_cells_cannot_inject_formulas(self):
+        student = Student.objects.create(name='=HYPERLINK("http://evil.example","x")', email='e@example.com', phone='1')
+        Result.objects.create(student=student, course=self.course, marks=-1, description='@SUM(A1:A9)')
+        Result.objects.create(student=student, course=self.course, marks=50, description='+1 and -2')
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('export_data', args=['results']))
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row[2] for row in rows[1:]], ['\'=HYPERLINK("http://evil.example","x")'] * 2)
+        self.assertEqual([row[6] for row in rows[1:]], ["'@SUM(A1:A9)", "'+1 and -2"])
+        # Numbers are not text, so a negative mark stays a number
+        self.assertEqual(rows[1][5], '-1.00')
+
+    def test_students_cannot_export(self):
+        self.client.force_login(User.objects.create_user('student', 'student@example.com', 'pass'))
+        self.assertEqual(self.client.get(reverse('export_data', args=['fees'])).status_code, 403)
+
+
+class FeeLedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        start = datetime.date(2025, 1, 1)
+        cls.physics, cls.chemistry = [
+            Course.objects.create(name=name, description='', start_date=start, end_date=start) for name in ('Physics', 'Chemistry')
+        ]
+        FeeSchedule.objects.create(course=cls.physics, amount=1000, due_date=start)
+        FeeSchedule.objects.create(course=cls.physics, amount=500, due_date=start + datetime.timedelta(days=30))
+        FeeSchedule.objects.create(course=cls.chemistry, amount=800, due_date=start)
+        # Not due yet, so it counts towards nobody's balance
+        FeeSchedule.objects.create(course=cls.chemistry, amount=9999, due_date=datetime.date(2999, 1, 1))
+        cls.user = User.objects.create_user('asha', 'asha@example.com', 'pass')
+        cls.paid_up, cls.partial, cls.both, cls.unenrolled = [
+            Student.objects.create(name=name, email=f'{name}@example.com', phone='1', user=cls.user if name == 'partial' else None)
+            for name in ('paid_up', 'partial', 'both', 'unenrolled')
+        ]
+        cls.paid_up.enrolled_courses.add(cls.physics)
+        cls.partial.enrolled_courses.add(cls.physics)
+        cls.both.enrolled_courses.add(cls.physics, cls.chemistry)
+        Fee.objects.create(student=cls.paid_up, course=cls.physics, amount=1500, paid_on=start)
+        Fee.objects.create(student=cls.partial, course=cls.physics, amount=600, paid_on=start)
+
+    def test_balances_and_defaulters_are_computed_in_sql(self):
+        with self.assertNumQueries(1):
+            balances = {s.name: (s.due, s.paid, s.balance) for s in fees.with_balances()}
+        self.assertEqual(balances['paid_up'], (1500, 1500, 0))
+        self.assertEqual(balances['partial'], (1500, 600, 900))
+        self.assertEqual(balances['both'], (2300, 0, 2300))
+        self.assertEqual(balances['unenrolled'], (0, 0, 0))
+        self.assertEqual([s.name for s in fees.defaulters().order_by('-balance', 'id')], ['both', 'partial'])
+        self.assertEqual([s.name for s in fees.defaulters(self.chemistry.pk)], ['both'])
+
+    def test_monthly_totals_follow_every_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            fee = Fee.objects.create(student=self.both, course=self.chemistry, amount=300, paid_on=datetime.date(2025, 2, 14))
+            Fee.objects.create(student=self.both, amount=50, paid_on=datetime.date(2025, 2, 20))
+        with self.captureOnCommitCallbacks(execute=True):
+            fee.paid_on = datetime.date(2025, 3, 1)
+            fee.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            Fee.objects.filter(student=self.partial).get().delete()
+
+        def snapshot():
+            rows = FeeMonthlyTotal.objects.values_list('month', 'course_id', 'payments', 'amount')
+            return sorted(rows, key=lambda row: (row[0], row[1] or 0))
+        incremental = snapshot()
+        self.assertIn((datetime.date(2025, 3, 1), self.chemistry.pk, 1, 300), incremental)
+        self.assertIn((datetime.date(2025, 1, 1), self.physics.pk, 1, 1500), incremental)
+        fees.rebuild()
+        self.assertEqual(snapshot(), incremental)
+
+    def test_deleting_a_course_moves_its_totals_to_unallocated(self):
+        fees.rebuild()
+        january = datetime.date(2025, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Fee.objects.create(student=self.both, amount=50, paid_on=datetime.date(2025, 1, 20))
+        unallocated = FeeMonthlyTotal.objects.get(month=january, course__isnull=True)
+        self.assertEqual((unallocated.payments, unallocated.amount), (1, 50))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.physics.delete()
+        # Upserted in place, not replaced
+        row = FeeMonthlyTotal.objects.get(month=january, course__isnull=True)
+        self.assertEqual((row.pk, row.payments, row.amount), (unallocated.pk, 3, 2150))
+        self.assertEqual(FeeMonthlyTotal.objects.count(), 1)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            FeeMonthlyTotal.objects.create(month=january, payments=1, amount=1)
+
+    def test_fee_report_pages_through_defaulters(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse('fee_report'), {'per_page': 1})
+        self.assertEqual([s.name for s in response.context['defaulters']], ['both'])
+        response = self.client.get(reverse('fee_report'), {'per_page': 1, 'cursor': response.context['page'].next_cursor})
+        self.assertEqual([s.name for s in response.context['defaulters']], ['partial'])
+        self.assertFalse(response.context['page'].has_next)
+
+    def test_students_see_only_their_own_ledger(self):
+        self.client.force_login(self.user)
+        self.assertNotEqual(self.client.get(reverse('fee_report')).status_code, 200)
+        response = self.client.get(reverse('student_fees'))
+        self.assertEqual((response.context['due'], response.context['paid'], response.context['balance']), (1500, 600, 900))
+        self.assertEqual(len(response.context['payments']), 1)
+
+
+class EnrollmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime.date(2025, 1, 1)
+        cls.course = Course.objects.create(name='Physics', description='', start_date=start, end_date=start, capacity=2)
+        cls.students = [
+            Student.objects.create(name=f'Student {i}', email=f's{i}@example.com', phone='1',
+                                   user=User.objects.create_user(f'student{i}', f's{i}@example.com', 'pass'))
+            for i in range(4)
+        ]
+        group = Group.objects.create(name='Students')
+        for student in cls.students:
+            student.user.groups.add(group)
+
+    def setUp(self):
+        cache.clear()
+
+    def seats(self):
+        self.course.refresh_from_db()
+        return self.course.seats_taken
+
+    def test_full_course_waitlists_and_promotes_in_order(self):
+        first, second, third, fourth = self.students
+        outcomes = [enrollment.enroll(student, self.course) for student in self.students]
+        self.assertEqual(outcomes, [enrollment.ENROLLED, enrollment.ENROLLED, enrollment.WAITLISTED, enrollment.WAITLISTED])
+        self.assertEqual(enrollment.enroll(first, self.course), enrollment.ALREADY_ENROLLED)
+        self.assertEqual(enrollment.waitlist_positions(fourth), {self.course.pk: 2})
+        self.assertIn(self.course.pk, profiles.enrolled_course_ids(first.pk))
+        self.assertNotIn(self.course.pk, profiles.enrolled_course_ids(third.pk))
+
+        self.assertEqual(enrollment.unenroll(first, self.course), enrollment.UNENROLLED)
+        self.assertEqual(self.seats(), 2)
+        self.assertIn(self.course.pk, profiles.enrolled_course_ids(third.pk))
+        self.assertEqual(enrollment.waitlist_positions(fourth), {self.course.pk: 1})
+        self.assertEqual(enrollment.unenroll(fourth, self.course), enrollment.LEFT_WAITLIST)
+        self.assertFalse(WaitlistEntry.objects.exists())
+
+    def test_seat_check_reads_the_database_not_the_instance(self):
+        stale = Course.objects.get(pk=self.course.pk)
+        for student in self.students[:2]:
+            enrollment.enroll(student, self.course)
+        # A request that loaded the course before the last seat went must still be turned away
+        self.assertEqual(enrollment.enroll(self.students[2], stale), enrollment.WAITLISTED)
+
+    def test_editing_a_course_keeps_its_seat_count(self):
+        for student in self.students[:2]:
+            enrollment.enroll(student, self.course)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        self.client.post(reverse('edit_course', args=[self.course.pk]), {'name': 'Physics I', 'description': '', 'capacity': '3'})
+        self.assertEqual(self.seats(), 2)
+        self.assertEqual(self.course.name, 'Physics I')
+        # The admin form is not loaded with seats_taken either, so it writes only what changed
+        with mock.patch.object(Course, 'save') as save:
+            form = mock.Mock(changed_data=['name'])
+            admin_site.site._registry[Course].save_model(None, self.course, form, change=True)
+        save.assert_called_once_with(update_fields=['name'])
+        # Plain saves behave as usual: copying a course inserts a new row
+        copy = Course.objects.get(pk=self.course.pk)
+        copy.pk = None
+        copy.save()
+        self.assertEqual(Course.objects.count(), 2)
+
+    def test_changes_outside_enroll_keep_seats_and_waitlist_in_step(self):
+        first, second, third, fourth = self.students
+        for student in self.students:
+            enrollment.enroll(student, self.course)
+        first.enrolled_courses.remove(self.course)
+        self.assertEqual(self.seats(), 2)
+        self.assertTrue(third.enrolled_courses.filter(pk=self.course.pk).exists())
+        second.delete()
+        self.assertEqual(self.seats(), 2)
+        self.assertTrue(fourth.enrolled_courses.filter(pk=self.course.pk).exists())
+
+        WaitlistEntry.objects.create(course=self.course, student=first)
+        self.course.capacity = 3
+        self.course.save()
+        self.assertEqual(self.seats(), 3)
+        self.assertTrue(first.enrolled_courses.filter(pk=self.course.pk).exists())
+
+    def test_course_list_enrolls_waitlists_and_leaves(self):
+        for student in self.students[:2]:
+            enrollment.enroll(student, self.course)
+        self.client.force_login(self.students[2].user)
+        response = self.client.post(reverse('enroll_course', args=[self.course.pk]), follow=True)
+        self.assertContains(response, 'Waitlisted #1')
+        self.client.force_login(self.students[0].user)
+        self.client.post(reverse('unenroll_course', args=[self.course.pk]))
+        self.client.force_login(self.students[2].user)
+        self.assertContains(self.client.get(reverse('course_list')), '>Enrolled<')
+
+    def test_enrolling_requires_post(self):
+        self.client.force_login(self.students[0].user)
+        self.assertEqual(self.client.get(reverse('enroll_course', args=[self.course.pk])).status_code, 405)
+        self.assertEqual(self.seats(), 0)
+
+    def test_import_waitlists_students_past_capacity(self):
+        enrollment.enroll(self.students[0], self.course)
+        rows = [
+            (line, {'name': student.name, 'email': student.email, 'phone': '1', 'courses': 'Physics'})
+            for line, student in enumerate(self.students, start=2)
+        ]
+        report = importer.import_students(rows)
+        self.assertEqual((report.enrollments, report.waitlisted), (1, 2))
+        self.assertIn('2 waitlisted', str(report))
+        self.assertEqual(self.seats(), 2)
+        self.assertEqual(set(self.course.student_set.all()), set(self.students[:2]))
+        self.assertEqual(enrollment.waitlist_positions(self.students[3]), {self.course.pk: 2})
+
+    def test_import_clears_the_waitlist_entries_it_fills(self):
+        enrollment.enroll(self.students[0], self.course)
+        waiting = self.students[1]
+        WaitlistEntry.objects.create(course=self.course, student=waiting)
+        rows = [(2, {'name': waiting.name, 'email': waiting.email, 'phone': '1', 'courses': 'Physics'})]
+        importer.import_students(rows)
+        self.assertTrue(waiting.enrolled_courses.filter(pk=self.course.pk).exists())
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(self.seats(), 2)
+
+calls = []
+
+
+@jobs.task('tests.record')
+def record(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_by_priority_then_age(self):
+        jobs.enqueue('tests.record', value='low')
+        jobs.enqueue('tests.record', value='high', priority=5)
+        jobs.enqueue('tests.record', value='later', delay=datetime.timedelta(hours=1))
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(calls, ['high', 'low'])
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue('tests.record', value='x', fail=True, max_attempts=2)
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertGreater(job.run_at, timezone.now())
+        # not due yet
+        self.assertEqual(jobs.run_pending(), 0)
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.enqueue('tests.record', value='x')
+        self.assertEqual(jobs.claim('dead-worker').pk, job.pk)
+        # Started long ago but still beating: a slow job, not a dead worker
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - datetime.timedelta(days=1))
+        self.assertEqual(jobs.requeue_stale(), 0)
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(calls, ['x'])
+
+    def test_jobs_that_keep_killing_their_worker_fail(self):
+        job = jobs.enqueue('tests.record', value='x', max_attempts=2)
+        for attempt in (1, 2):
+            self.assertEqual(jobs.claim('dead-worker').pk, job.pk)
+            Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=1))
+            self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertEqual(job.last_error, 'The worker stopped responding.')
+        self.assertEqual(jobs.run_pending(), 0)
+
+    @override_settings(JOB_HEARTBEAT_INTERVAL=0.01)
+    def test_running_jobs_send_heartbeats(self):
+        job = jobs.enqueue('tests.record', value='x')
+        claimed = jobs.claim('worker')
+        beats = []
+        heartbeat = jobs.Heartbeat(claimed)
+        with mock.patch.object(jobs.Job.objects, 'filter', side_effect=lambda **kw: beats.append(kw) or Job.objects.none()):
+            heartbeat.start()
+            while not beats:
+                time.sleep(0.01)
+            heartbeat.stop()
+        self.assertEqual(beats[0], {'pk': job.pk, 'status': Job.RUNNING, 'locked_by': 'worker'})
+
+    @override_settings(JOB_HEARTBEAT_INTERVAL=0.01)
+    def test_heartbeat_survives_a_failed_update(self):
+        jobs.enqueue('tests.record', value='x')
+        claimed = jobs.claim('worker')
+        beats = []
+
+        def beat(**kwargs):
+            beats.append(kwargs)
+            if len(beats) == 1:
+                raise OperationalError('database is locked')
+            return Job.objects.none()
+        heartbeat = jobs.Heartbeat(claimed)
+        with mock.patch.object(jobs.Job.objects, 'filter', side_effect=beat), self.assertLogs('coaching.jobs', 'ERROR'):
+            heartbeat.start()
+            while len(beats) < 2:
+                time.sleep(0.01)
+            heartbeat.stop()
+
+    def test_released_job_does_not_overwrite_the_new_owner(self):
+        job = jobs.enqueue('tests.record', value='x')
+        first = jobs.claim('slow-worker')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=1))
+        jobs.requeue_stale()
+        self.assertEqual(jobs.claim('other-worker').pk, job.pk)
+        with self.assertLogs('coaching.jobs', 'WARNING'):
+            jobs.run(first)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by), (Job.RUNNING, 'other-worker'))
+
+    def test_single_worker_requeues_stale_jobs(self):
+        job = jobs.enqueue('tests.record', value='x')
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - datetime.timedelta(hours=1))
+        with mock.patch.object(run_worker, 'STALE_CHECK_INTERVAL', -1), \
+                mock.patch.object(run_worker.connections, 'close_all'):
+            run_worker._work(0, 0, burst=True, requeue=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(calls, ['x'])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('teacher', 'teacher@example.com', 'pass')
+        start = datetime.date(2025, 1, 1)
+        self.course = Course.objects.create(name='Organic Chemistry', description='Reactions of carbon compounds',
+                                            start_date=start, end_date=start)
+        self.material = StudyMaterial.objects.create(title='Lab safety', description='Handling chemicals in the organic lab',
+                                                     file='resources/lab.pdf', uploaded_by=self.teacher, course=self.course)
+        Announcement.objects.create(title='Organic quiz', content='Staff only', created_by=self.teacher, for_all=False, for_role='teacher')
+
+    def test_ranked_prefix_search_with_highlighting(self):
+        hits = search.search('organ')
+        # title matches outrank body matches
+        self.assertEqual([hit.kind for hit in hits], ['course', 'material'])
+        self.assertIn('<mark>organic</mark>', hits[1].snippet)
+        self.assertEqual([hit.object for hit in search.search('organic', kinds=['material'])], [self.material])
+        self.assertEqual(len(search.search('organic', roles={'teacher'})), 3)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.course.name = 'Inorganic Chemistry'
+        self.course.description = 'Metals'
+        self.course.save()
+        self.assertEqual(search.search('reactions'), [])
+        self.assertEqual([hit.object for hit in search.search('metals')], [self.course])
+        self.material.delete()
+        self.assertEqual(search.search('handling'), [])
+
+    def test_query_syntax_is_treated_as_text(self):
+        self.assertEqual(search.search('"lab" OR NEAR( *'), search.search('lab or near'))
+        self.assertContains(self.client.get(reverse('search'), {'q': 'chemicals'}), '<mark>chemicals</mark>')
+        response = self.client.get(reverse('search'), {'q': '<script>alert(1)</script>'})
+        self.assertNotContains(response, '<script>alert')
+
+
+class DatabaseLayerTests(TestCase):
+
+    def test_sqlite_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_reads_stay_on_primary_inside_transactions(self):
+        # TestCase wraps each test in a transaction on the primary
+        with mock.patch.object(db, 'replica_configured', return_value=True), db.replica_reads():
+            self.assertEqual(router.db_for_read(Course), 'default')
+
+    def test_writes_pin_reads_to_primary(self):
+        with mock.patch.object(db, 'replica_configured', return_value=True):
+            response = self.client.post(reverse('course_list'))
+            self.assertIn(db.PIN_COOKIE, response.cookies)
+            self.assertNotIn(db.PIN_COOKIE, self.client.get(reverse('course_list')).cookies)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def test_replica_reads_routing(self):
+        with db.replica_reads():
+            # no replica configured
+            self.assertEqual(router.db_for_read(Course), 'default')
+        with mock.patch.object(db, 'replica_configured', return_value=True):
+            self.assertEqual(router.db_for_read(Course), 'default')
+            with db.replica_reads():
+                self.assertEqual(router.db_for_read(Course), 'replica')
+                self.assertEqual(router.db_for_write(Course), 'default')
@@ -0,0 +1,194 @@
+import hashlib
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.utils import timezone
+
+from .models import Announcement, Assignment, Course, Result, Student, StudyMaterial, UploadSession
+
+# Bytes read from the request or disk at a time; memory use never grows past this
+BLOCK_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """Raised for an upload request the client must correct; ``status`` is the HTTP code."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class AssembledFile(File):
+    """A finished upload on local disk; storage backends move it into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(session):
+    return os.path.join(settings.CHUNKED_UPLOAD_DIR, f'{session.pk}.part')
+
+
+def start(user, filename, size, sha256):
+    filename = os.path.basename(filename or '')
+    sha256 = (sha256 or '').lower()
+    if not filename:
+        raise UploadError('A filename is required.')
+    if not SHA256_RE.match(sha256):
+        raise UploadError('sha256 must be a hex SHA-256 digest.')
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError('size must be an integer.')
+    if not 0 < size <= settings.CHUNKED_UPLOAD_MAX_FILE_SIZE:
+        raise UploadError('File size is out of range.', status=413)
+    session = UploadSession.objects.create(user=user, filename=filename, size=size, sha256=sha256)
+    os.makedirs(settings.CHUNKED_UPLOAD_DIR, exist_ok=True)
+    open(part_path(session), 'wb').close()
+    return session
+
+
+def parse_content_range(header, session):
+    """Return ``(offset, length)`` from a ``Content-Range: bytes start-end/total`` header."""
+    match = CONTENT_RANGE_RE.match(header or '')
+    if not match:
+        raise UploadError('A Content-Range header of the form "bytes start-end/total" is required.')
+    first, last, total = match.groups()
+    first, last = int(first), int(last)
+    if total != '*' and int(total) != session.size:
+        raise UploadError('Content-Range total does not match the upload size.')
+    if last < first or last >= session.size:
+        raise UploadError('Content-Range is outside the upload.', status=416)
+    length = last - first + 1
+    if length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError('Chunk is too large.', status=413)
+    return first, length
+
+
+def append_chunk(session, offset, length, stream):
+    """Write ``length`` bytes from ``stream`` at ``offset``; chunks must arrive in order.
+
+    A chunk that does not start at the current offset is rejected with 409 and
+    the client resumes from ``session.received``.
+    """
+    if session.completed_at:
+        raise UploadError('Upload is already complete.', status=409)
+    if offset != session.received:
+        raise UploadError(f'Expected offset {session.received}.', status=409)
+    written = 0
+    with open(part_path(session), 'r+b') as part:
+        part.seek(offset)
+        while written < length:
+            block = stream.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            part.write(block)
+            written += len(block)
+        part.truncate()
+    if written != length:
+        raise UploadError('Chunk body is shorter than its Content-Range.')
+    # Conditional update: if another request already advanced the offset, this chunk loses
+    updated = UploadSession.objects.filter(pk=session.pk, received=offset).update(
+        received=offset + written, updated_at=timezone.now())
+    if not updated:
+        session.refresh_from_db()
+        raise UploadError(f'Expected offset {session.received}.', status=409)
+    session.received = offset + written
+    return session
+
+
+def verify(session):
+    if session.received != session.size:
+        raise UploadError(f'Upload is incomplete: {session.received} of {session.size} bytes received.', status=409)
+    digest = hashlib.sha256()
+    try:
+        with open(part_path(session), 'rb') as part:
+            for block in iter(lambda: part.read(BLOCK_SIZE), b''):
+                digest.update(block)
+    except FileNotFoundError:
+        # Purged, or moved into storage by a complete that then failed
+        raise UploadError('Upload data is gone; restart the upload.', status=410)
+    if digest.hexdigest() != session.sha256:
+        raise UploadError('Checksum mismatch; restart the upload.', status=422)
+
+
+def _get(model, pk):
+    try:
+        return model.objects.get(pk=pk)
+    except (model.DoesNotExist, ValueError, TypeError):
+        raise UploadError(f'{model._meta.verbose_name.capitalize()} not found.')
+
+
+def _build_study_material(user, data):
+    return StudyMaterial(title=data.get('title'), description=data.get('description', ''),
+                         course=_get(Course, data.get('course')), uploaded_by=user)
+
+
+def _build_assignment(user, data):
+    return Assignment(title=data.get('title'), description=data.get('description', ''),
+                      course=_get(Course, data.get('course')), assigned_by=user, due_date=data.get('due_date'))
+
+
+def _build_result(user, data):
+    return Result(student=_get(Student, data.get('student')), course=_get(Course, data.get('course')),
+                  marks=data.get('marks') or None, description=data.get('description', ''))
+
+
+def _build_announcement(user, data):
+    return Announcement(title=data.get('title'), content=data.get('content'), created_by=user,
+                        for_all=bool(data.get('for_all')), for_role=data.get('for_role', ''))
+
+
+# Upload targets: the same fields the regular multipart forms post
+TARGETS = {
+    'study_material': _build_study_material,
+    'assignment': _build_assignment,
+    'result': _build_result,
+    'announcement': _build_announcement,
+}
+
+
+def complete(session, kind, data):
+    """Verify the assembled file and attach it to a new object of ``kind``."""
+    if session.completed_at:
+        raise UploadError('Upload is already complete.', status=409)
+    if kind not in TARGETS:
+        raise UploadError(f'Unknown upload target {kind!r}.')
+    instance = TARGETS[kind](session.user, data)
+    try:
+        instance.full_clean(exclude=['file'])
+    except ValidationError as exc:
+        raise UploadError('; '.join(f'{field}: {" ".join(errors)}' for field, errors in exc.message_dict.items()))
+    # Claim the session first, so a retried or concurrent complete gets 409 instead of a missing part file
+    now = timezone.now()
+    if not UploadSession.objects.filter(pk=session.pk, completed_at__isnull=True).update(completed_at=now):
+        raise UploadError('Upload is already complete.', status=409)
+    try:
+        verify(session)
+        with open(part_path(session), 'rb') as part:
+            instance.file.save(session.filename, AssembledFile(part), save=False)
+        try:
+            instance.save()
+        except BaseException:
+            # The part file was already moved into storage; don't leave it behind without an object
+            instance.file.delete(save=False)
+            raise
+    except BaseException:
+        UploadSession.objects.filter(pk=session.pk, completed_at=now).update(completed_at=None)
+        raise
+    session.completed_at = now
+    discard(session)
+    return instance
+
+
+def discard(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
@@ -21,15 +21,29 @@ urlpatterns = [
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'),
     path('mark-attendance/', views.mark_attendance, name='mark_attendance'),
     path('view-analytics/', views.view_analytics, name='view_analytics'),
+    path('search/', views.search_view, name='search'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('api/<str:resource>/', views.api_list, name='api_list'),
+    path('api/<str:resource>/batch/', views.api_batch, name='api_batch'),
+    path('fees/', views.fee_report, name='fee_report'),
+    path('fees/mine/', views.student_fees, name='student_fees'),
+    path('exports/<str:name>/', views.export_data, name='export_data'),
     path('upload-study-material/', views.upload_study_material, name='upload_study_material'),
     path('assignments/', views.assignments_list, name='assignments_list'),
     path('logout/', LogoutView.as_view(next_page='/'), name='logout'),
     path('study-materials/', views.study_materials, name='study_materials'),
     path('assignments/upload/', views.upload_assignment, name='upload_assignment'),
+    path('messages/', views.messages_view, name='messages_view'),
+    path('messages/<int:conversation_id>/', views.message_thread, name='message_thread'),
     path('results/', views.results_view, name='results_view'),
     path('results/upload/', views.upload_result, name='upload_result'),
+    path('uploads/', views.upload_start, name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.upload_chunk, name='upload_chunk'),
+    path('uploads/<uuid:upload_id>/complete/', views.upload_complete, name='upload_complete'),
+    path('files/<str:kind>/<int:pk>/', views.serve_file, name='serve_file'),
     path('announcements/', views.announcements_view, name='announcements_view'),
     path('courses/edit/<int:course_id>/', views.edit_course, name='edit_course'),
     path('courses/delete/<int:course_id>/', views.delete_course, name='delete_course'),
     path('courses/enroll/<int:course_id>/', views.enroll_course, name='enroll_course'),
+    path('courses/unenroll/<int:course_id>/', views.unenroll_course, name='unenroll_course'),
 ]
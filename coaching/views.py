@@ -1,45 +1,82 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login
-from django.shortcuts import render, redirect
-from .models import Course, Student, StudyMaterial, Assignment, Message, Result, Announcement, Attendance
+from django.shortcuts import get_object_or_404, render, redirect
+from .models import Course, Student, StudyMaterial, Assignment, Message, Result, Announcement, Attendance, StudentCourseStats, UploadSession
 from django.contrib.auth.decorators import user_passes_test, login_required
 from django.contrib import messages
 from django.shortcuts import redirect
 from django.contrib.auth.models import User, Group
 import os
-from django.http import HttpResponseRedirect
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.urls import reverse
+from django.db.models import Prefetch
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from django.utils.dateparse import parse_date
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods, require_POST
+from . import api, attendance, counters, enrollment, exports, feed, fees, inbox, media, metrics, search, uploads
+from .profiles import forget_enrollments, get_enrolled_ids, get_student
+from .db import read_from_replica
+from .roles import is_teacher
+from .pagination import paginate
 
 # Global flag for admin approval (in production, use a model or setting)
 ALLOW_TEACHER_REGISTRATION = True
 
+def _selected_course_id(request):
+    course_id = request.GET.get('course', '')
+    return int(course_id) if course_id.isdigit() else None
+
 def home(request):
     return render(request, 'coaching/home.html')
 
+@read_from_replica
 def course_list(request):
-    courses = Course.objects.all()
-    enrolled = []
-    if request.user.is_authenticated:
-        try:
-            student = Student.objects.get(email=request.user.email)
-            enrolled = student.enrolled_courses.values_list('id', flat=True)
-            if request.method == 'POST':
-                course_id = request.POST.get('course_id')
-                if course_id:
-                    course = Course.objects.get(id=course_id)
-                    student.enrolled_courses.add(course)
-                    enrolled = student.enrolled_courses.values_list('id', flat=True)
-        except Student.DoesNotExist:
-            pass
-    return render(request, 'coaching/course_list.html', {'courses': courses, 'enrolled': enrolled})
+    student = get_student(request)
+    if student is not None and request.method == 'POST':
+        course_id = request.POST.get('course_id', '')
+        course = Course.objects.filter(id=course_id).first() if course_id.isdigit() else None
+        if course is not None:
+            _enroll(request, student, course)
+    courses = paginate(request, Course.objects.all(), ('name', 'id'))
+    enrolled = get_enrolled_ids(request)
+    # Students only wait for full courses; skip the lookup when this page has none
+    full = [course.pk for course in courses if course.capacity is not None and not course.seats_left]
+    waitlisted = enrollment.waitlist_positions(student, full) if student is not None and full else {}
+    context = {'courses': courses, 'page': courses, 'enrolled': enrolled, 'waitlisted': waitlisted}
+    return render(request, 'coaching/course_list.html', context)
+
+def _enroll(request, student, course):
+    outcome = enrollment.enroll(student, course)
+    forget_enrollments(request)
+    if outcome == enrollment.ENROLLED:
+        messages.success(request, f"Enrolled in {course.name} successfully!")
+    elif outcome == enrollment.WAITLISTED:
+        messages.info(request, f"{course.name} is full; you are on the waitlist and will be enrolled when a seat frees up.")
+    elif outcome == enrollment.ALREADY_WAITLISTED:
+        messages.info(request, f"You are already on the waitlist for {course.name}.")
+    else:
+        messages.info(request, f"You are already enrolled in {course.name}.")
+
+def _student_page(request, template, students):
+    course_id = _selected_course_id(request)
+    if course_id:
+        students = students.filter(enrolled_courses=course_id)
+    page = paginate(request, students, ('name', 'id'))
+    context = {'students': page, 'page': page, 'courses': Course.objects.all(), 'selected_course_id': course_id}
+    return render(request, template, context)
 
+@read_from_replica
 def student_list(request):
-    students = Student.objects.all()
-    return render(request, 'coaching/student_list.html', {'students': students})
+    return _student_page(request, 'coaching/student_list.html', Student.objects.all())
 
+@read_from_replica
 def teacher_list(request):
-    students = Student.objects.all()
-    return render(request, 'coaching/teacher_list.html', {'students': students})
+    # The template lists each student's courses; fetch them for the whole page in one query
+    students = Student.objects.prefetch_related(Prefetch('enrolled_courses', queryset=Course.objects.only('id', 'name')))
+    return _student_page(request, 'coaching/teacher_list.html', students)
 
 def contact(request):
     return render(request, 'coaching/contact.html')
@@ -53,19 +90,20 @@ def teacher_login(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
         user = authenticate(request, username=username, password=password)
-        if user is not None and user.groups.filter(name='Teachers').exists():
+        if user is not None and is_teacher(user):
             login(request, user)
             return redirect('teacher_dashboard')
         else:
             error = 'Invalid credentials or not a teacher account.'
     return render(request, 'coaching/teacher_login.html', {'error': error})
 
+@read_from_replica
 def teacher_dashboard(request):
-    students_count = Student.objects.count()
-    courses_count = Course.objects.count()
+    counts = counters.get_counts('students', 'courses')
     context = {
-        'students_count': students_count,
-        'courses_count': courses_count,
+        'students_count': counts['students'],
+        'courses_count': counts['courses'],
+        'fragment_timeout': counters.FRAGMENT_TIMEOUT,
     }
     return render(request, 'coaching/teacher_dashboard.html', context)
 
@@ -79,29 +117,28 @@ def add_course(request):
         start_date = request.POST.get('start_date')
         end_date = request.POST.get('end_date')
         image = request.FILES.get('image')
+        capacity = request.POST.get('capacity', '').strip()
         if not name:
             error = 'Course name is required.'
         elif not start_date or not end_date:
             error = 'Start date and end date are required.'
+        elif capacity and not capacity.isdigit():
+            error = 'Capacity must be a whole number, or blank for unlimited seats.'
         else:
-            Course.objects.create(name=name, description=description, start_date=start_date, end_date=end_date, image=image)
+            Course.objects.create(name=name, description=description, start_date=start_date, end_date=end_date, image=image,
+                                  capacity=int(capacity) if capacity else None)
             success = 'Course added successfully!'
     return render(request, 'coaching/add_course.html', {'error': error, 'success': success})
 
+@read_from_replica
 def student_dashboard(request):
-    enrolled_courses = []
-    available_courses = []
-    if request.user.is_authenticated:
-        try:
-            student = Student.objects.get(email=request.user.email)
-            enrolled_courses = student.enrolled_courses.all()
-            enrolled_ids = enrolled_courses.values_list('id', flat=True)
-            available_courses = Course.objects.exclude(id__in=enrolled_ids)
-        except Student.DoesNotExist:
-            available_courses = Course.objects.all()
+    # Both numbers come from the cache; the course tables are only read when it is cold
+    enrolled_count = len(get_enrolled_ids(request))
+    courses_count = counters.get_counts('courses')['courses']
     context = {
-        'enrolled_courses': enrolled_courses,
-        'available_courses': available_courses,
+        'enrolled_count': enrolled_count,
+        'available_count': max(courses_count - enrolled_count, 0),
+        'fragment_timeout': counters.FRAGMENT_TIMEOUT,
     }
     return render(request, 'coaching/student_dashboard.html', context)
 
@@ -137,7 +174,10 @@ def student_register(request):
     success = None
     courses = Course.objects.all()
     if request.method == 'POST':
-        name = request.POST.get('first_name', '') + ' ' + request.POST.get('last_name', '')
+        username = request.POST.get('username')
+        first_name = request.POST.get('first_name', '')
+        last_name = request.POST.get('last_name', '')
+        name = first_name + ' ' + last_name
         email = request.POST.get('email')
         phone = request.POST.get('phone')
         address = request.POST.get('address')
@@ -147,8 +187,16 @@ def student_register(request):
         selected_courses = request.POST.getlist('courses')
         if Student.objects.filter(email=email).exists():
             error = 'Email already exists.'
+        elif not username:
+            error = 'Username is required.'
+        elif User.objects.filter(username=username).exists():
+            error = 'Username already exists.'
         else:
+            user = User.objects.create_user(username=username, email=email, password=password, first_name=first_name, last_name=last_name)
+            group, _ = Group.objects.get_or_create(name='Students')
+            user.groups.add(group)
             student = Student.objects.create(
+                user=user,
                 name=name.strip(),
                 email=email,
                 phone=phone,
@@ -156,10 +204,13 @@ def student_register(request):
                 dob=dob if dob else None,
                 gender=gender
             )
-            if selected_courses:
-                student.enrolled_courses.set(selected_courses)
-            student.save()
+            waitlisted = []
+            for course in Course.objects.filter(id__in=[pk for pk in selected_courses if pk.isdigit()]):
+                if enrollment.enroll(student, course) == enrollment.WAITLISTED:
+                    waitlisted.append(course.name)
             success = 'Account created successfully! You can now log in.'
+            if waitlisted:
+                success += f" {', '.join(waitlisted)} {'is' if len(waitlisted) == 1 else 'are'} full; you are on the waitlist."
     return render(request, 'coaching/student_register.html', {'error': error, 'success': success, 'courses': courses})
 
 def student_login(request):
@@ -205,30 +256,126 @@ def admin_dashboard(request):
     return render(request, 'coaching/admin_dashboard.html')
 
 def mark_attendance(request):
-    students = Student.objects.all()
     courses = Course.objects.all()
+    data = request.POST if request.method == 'POST' else request.GET
+    course_id = data.get('course_id')
+    try:
+        date = parse_date(data.get('date') or '') or timezone.localdate()
+    except ValueError:
+        date = timezone.localdate()
+    course = Course.objects.filter(id=course_id).first() if course_id and course_id.isdigit() else None
     if request.method == 'POST':
-        course_id = request.POST.get('course_id')
-        date = request.POST.get('date')
-        present_ids = request.POST.getlist('present')
-        course = Course.objects.get(id=course_id) if course_id else None
-        for student in students:
-            if str(student.id) in present_ids:
-                Attendance.objects.create(student=student, date=date, status=True)
-            else:
-                Attendance.objects.create(student=student, date=date, status=False)
-        messages.success(request, 'Attendance marked successfully!')
-        return redirect('mark_attendance')
-    return render(request, 'coaching/mark_attendance.html', {'students': students, 'courses': courses})
+        if course is None:
+            messages.error(request, 'Please select a valid course.')
+            return redirect('mark_attendance')
+        present_ids = [int(pk) for pk in request.POST.getlist('present') if pk.isdigit()]
+        marked = attendance.mark_session(course, date, present_ids)
+        messages.success(request, f'Attendance marked successfully for {marked} students!')
+        return redirect(f"{reverse('mark_attendance')}?course_id={course.id}&date={date.isoformat()}")
+    students = attendance.course_roster(course) if course else Student.objects.none()
+    present = attendance.present_student_ids(course, date) if course else set()
+    context = {
+        'students': students,
+        'courses': courses,
+        'selected_course': course,
+        'present': present,
+        'today': date.isoformat(),
+    }
+    return render(request, 'coaching/mark_attendance.html', context)
 
+@read_from_replica
 def view_analytics(request):
-    return render(request, 'coaching/view_analytics.html')
+    analytics = StudentCourseStats.objects.select_related('student', 'course')
+    if not request.user.is_authenticated:
+        analytics = analytics.none()
+    elif not request.user.is_superuser and not is_teacher(request.user):
+        student = get_student(request)
+        analytics = analytics.filter(student=student) if student else analytics.none()
+    course_id = request.GET.get('course')
+    if course_id and course_id.isdigit():
+        analytics = analytics.filter(course_id=course_id)
+    analytics = analytics.order_by('student__name', 'course__name')
+    return render(request, 'coaching/view_analytics.html', {'analytics': analytics})
+
+@read_from_replica
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    kind = request.GET.get('kind', '')
+    kinds = [kind] if kind in search.KINDS else None
+    hits = search.search(query, kinds=kinds, roles=feed.roles_for(request.user)) if query else []
+    context = {'query': query, 'kind': kind, 'kinds': search.KINDS, 'hits': hits}
+    return render(request, 'coaching/search.html', context)
+
+def _api_response(request, name, build):
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required.'}, status=401)
+    try:
+        return JsonResponse(build(request, api.get_resource(name)))
+    except api.APIError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+
+@read_from_replica
+@require_http_methods(['GET', 'HEAD'])
+def api_list(request, resource):
+    return _api_response(request, resource, api.list_rows)
+
+@read_from_replica
+@require_http_methods(['GET', 'HEAD'])
+def api_batch(request, resource):
+    return _api_response(request, resource, api.batch_rows)
+
+@cache_control(no_store=True)
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_superuser:
+        raise PermissionDenied
+    body = metrics.render(metrics.registry.collect())
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@read_from_replica
+@user_passes_test(lambda u: u.is_superuser)
+def fee_report(request):
+    course_id = _selected_course_id(request)
+    page = paginate(request, fees.defaulters(course_id), ('-balance', 'id'))
+    context = {
+        'defaulters': page, 'page': page, 'months': fees.monthly_totals(course_id=course_id),
+        'courses': Course.objects.all(), 'selected_course_id': course_id,
+    }
+    return render(request, 'coaching/fee_report.html', context)
+
+@read_from_replica
+@login_required
+def student_fees(request):
+    student = get_student(request)
+    if student is None:
+        raise PermissionDenied
+    return render(request, 'coaching/student_fees.html', {'student': student, **fees.ledger(student)})
+
+@read_from_replica
+def export_data(request, name):
+    if not request.user.is_authenticated or not (request.user.is_superuser or is_teacher(request.user)):
+        raise PermissionDenied
+    fmt = request.GET.get('format', 'csv')
+    try:
+        export = exports.get_export(name)
+        if fmt not in exports.FORMATS:
+            raise exports.ExportError(f'Unknown format {fmt!r}; choose csv or xlsx.')
+        rows = export.rows(**exports.parse_filters(request.GET))
+        filename = f'{name}-{timezone.localdate():%Y%m%d}.{fmt}'
+        if fmt == 'xlsx':
+            return FileResponse(exports.write_xlsx(export, rows), as_attachment=True, filename=filename)
+    except exports.ExportError as exc:
+        return HttpResponseBadRequest(str(exc))
+    response = StreamingHttpResponse(exports.iter_csv(export, rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 def upload_study_material(request):
     return render(request, 'coaching/upload_study_material.html')
 
+@read_from_replica
 def study_materials(request):
-    materials = StudyMaterial.objects.all()
     if request.method == 'POST' and request.FILES.get('file'):
         title = request.POST.get('title')
         description = request.POST.get('description', '')
@@ -237,7 +384,17 @@ def study_materials(request):
         course = Course.objects.get(id=course_id)
         StudyMaterial.objects.create(title=title, description=description, file=file, uploaded_by=request.user, course=course)
         return HttpResponseRedirect(reverse('study_materials'))
-    return render(request, 'coaching/study_materials.html', {'materials': materials})
+    materials = StudyMaterial.objects.select_related('course', 'uploaded_by')
+    course_id = _selected_course_id(request)
+    if course_id:
+        materials = materials.filter(course_id=course_id)
+    page = paginate(request, materials, ('-uploaded_at', '-id'))
+    context = {
+        'materials': page, 'page': page, 'courses': Course.objects.all(), 'selected_course_id': course_id,
+        # Uploaders send the file through the resumable upload API (base.js); others post the form
+        'chunked_upload': _can_upload(request.user), 'chunk_size': settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE,
+    }
+    return render(request, 'coaching/study_materials.html', context)
 
 def assignments(request):
     from django.core.files.storage import FileSystemStorage
@@ -269,9 +426,15 @@ def assignments(request):
         assignments = []
     return render(request, 'coaching/assignments.html', {'success': success, 'error': error, 'assignments': assignments})
 
+@read_from_replica
 def assignments_list(request):
-    assignments = Assignment.objects.all()
-    return render(request, 'coaching/assignments_list.html', {'assignments': assignments})
+    assignments = Assignment.objects.select_related('course', 'assigned_by')
+    course_id = _selected_course_id(request)
+    if course_id:
+        assignments = assignments.filter(course_id=course_id)
+    page = paginate(request, assignments, ('due_date', 'id'))
+    context = {'assignments': page, 'page': page, 'courses': Course.objects.all(), 'selected_course_id': course_id}
+    return render(request, 'coaching/assignments_list.html', context)
 
 def upload_assignment(request):
     if request.method == 'POST' and request.FILES.get('file'):
@@ -286,28 +449,117 @@ def upload_assignment(request):
     courses = Course.objects.all()
     return render(request, 'coaching/upload_assignment.html', {'courses': courses})
 
+@login_required
 def messages_view(request):
-    messages_qs = Message.objects.filter(receiver=request.user) | Message.objects.filter(sender=request.user)
-    messages_qs = messages_qs.order_by('-sent_at')
     if request.method == 'POST':
-        content = request.POST.get('content')
-        receiver_id = request.POST.get('receiver')
-        receiver = User.objects.get(id=receiver_id)
-        Message.objects.create(sender=request.user, receiver=receiver, content=content)
-        return HttpResponseRedirect(reverse('messages_view'))
-    users = User.objects.exclude(id=request.user.id)
-    return render(request, 'coaching/messages.html', {'messages': messages_qs, 'users': users})
+        content = request.POST.get('content', '').strip()
+        receiver = User.objects.filter(id=request.POST.get('receiver')).first()
+        if receiver is None or not content:
+            messages.error(request, 'Choose a recipient and write a message.')
+            return HttpResponseRedirect(reverse('messages_view'))
+        message = inbox.send_message(request.user, receiver, content)
+        return HttpResponseRedirect(reverse('message_thread', args=[message.conversation_id]))
+    page = paginate(request, inbox.inbox(request.user), ('-last_message_at', '-id'))
+    users = User.objects.exclude(id=request.user.id).only('id', 'username').order_by('username')
+    context = {
+        'conversations': page,
+        'page': page,
+        'users': users,
+        'unread_total': inbox.unread_total(request.user),
+    }
+    return render(request, 'coaching/messages.html', context)
+
+@login_required
+def message_thread(request, conversation_id):
+    membership = inbox.get_membership(request.user, conversation_id)
+    if membership is None:
+        raise Http404('Conversation not found.')
+    if request.method == 'POST':
+        content = request.POST.get('content', '').strip()
+        if content:
+            inbox.send_message(request.user, membership.peer, content, reply_to=membership.conversation.last_message)
+        return HttpResponseRedirect(reverse('message_thread', args=[conversation_id]))
+    inbox.mark_read(membership)
+    page = paginate(request, inbox.thread(membership.conversation), ('-sent_at', '-id'))
+    context = {'membership': membership, 'thread': page, 'page': page}
+    return render(request, 'coaching/message_thread.html', context)
+
+def _upload_state(session):
+    return {
+        'upload_id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'complete': session.completed_at is not None,
+    }
+
+def _can_upload(user):
+    return user.is_superuser or is_teacher(user)
 
+@login_required
+@require_POST
+def upload_start(request):
+    if not _can_upload(request.user):
+        return JsonResponse({'error': 'Only teachers can upload files.'}, status=403)
+    try:
+        session = uploads.start(request.user, request.POST.get('filename'), request.POST.get('size'), request.POST.get('sha256'))
+    except uploads.UploadError as exc:
+        return JsonResponse({'error': str(exc)}, status=exc.status)
+    return JsonResponse(_upload_state(session), status=201)
+
+@login_required
+@require_http_methods(['GET', 'HEAD', 'PUT', 'PATCH'])
+def upload_chunk(request, upload_id):
+    """GET reports the resume offset; PUT/PATCH appends one chunk described by Content-Range."""
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if request.method in ('PUT', 'PATCH'):
+        try:
+            offset, length = uploads.parse_content_range(request.headers.get('Content-Range'), session)
+            uploads.append_chunk(session, offset, length, request)
+        except uploads.UploadError as exc:
+            return JsonResponse(dict(_upload_state(session), error=str(exc)), status=exc.status)
+    return JsonResponse(_upload_state(session))
+
+@login_required
+@require_POST
+def upload_complete(request, upload_id):
+    session = get_object_or_404(UploadSession, pk=upload_id, user=request.user)
+    if not _can_upload(request.user):
+        return JsonResponse({'error': 'Only teachers can upload files.'}, status=403)
+    try:
+        instance = uploads.complete(session, request.POST.get('kind'), request.POST)
+    except uploads.UploadError as exc:
+        return JsonResponse(dict(_upload_state(session), error=str(exc)), status=exc.status)
+    return JsonResponse({'id': instance.pk, 'kind': request.POST.get('kind'), 'file': instance.file.name}, status=201)
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_file(request, kind, pk):
+    model = media.KINDS.get(kind)
+    if model is None:
+        raise Http404
+    obj = get_object_or_404(model, pk=pk)
+    if not obj.file:
+        raise Http404
+    if not media.can_access(request, kind, obj):
+        raise PermissionDenied
+    try:
+        return media.serve(request, obj.file)
+    except FileNotFoundError:
+        raise Http404
+
+@read_from_replica
 def results_view(request):
-    if request.user.groups.filter(name='Teachers').exists():
-        results = Result.objects.all()
+    if is_teacher(request.user):
+        results = Result.objects.select_related('student', 'course')
     else:
-        try:
-            student = Student.objects.get(email=request.user.email)
-            results = Result.objects.filter(student=student)
-        except Student.DoesNotExist:
-            results = Result.objects.none()
-    return render(request, 'coaching/results.html', {'results': results})
+        student = get_student(request)
+        results = Result.objects.filter(student=student).select_related('student', 'course') if student else Result.objects.none()
+    course_id = _selected_course_id(request)
+    if course_id:
+        results = results.filter(course_id=course_id)
+    page = paginate(request, results, ('-uploaded_at', '-id'))
+    context = {'results': page, 'page': page, 'courses': Course.objects.all(), 'selected_course_id': course_id}
+    return render(request, 'coaching/results.html', context)
 
 def upload_result(request):
     if request.method == 'POST' and request.FILES.get('file'):
@@ -324,17 +576,14 @@ def upload_result(request):
     courses = Course.objects.all()
     return render(request, 'coaching/upload_result.html', {'students': students, 'courses': courses})
 
+@cache_control(private=True, no_cache=True)
+# ETag only: a Last-Modified date could not tell two users, or a rotated CSRF token, apart
+@condition(etag_func=feed.etag)
 def announcements_view(request):
     # Only allow creation if not a student
-    is_student = False
-    if request.user.is_authenticated:
-        for group in request.user.groups.all():
-            if group.name.lower() == 'students':
-                is_student = True
-                break
-    announcements = Announcement.objects.filter(for_all=True) | Announcement.objects.filter(for_role__in=[g.name.lower() for g in request.user.groups.all()])
-    announcements = announcements.order_by('-created_at')
-    if request.method == 'POST' and not is_student:
+    user_roles = feed.roles_for(request.user)
+    is_student = 'student' in user_roles
+    if request.method == 'POST' and request.user.is_authenticated and not is_student:
         title = request.POST.get('title')
         content = request.POST.get('content')
         file = request.FILES.get('file')
@@ -342,6 +591,7 @@ def announcements_view(request):
         for_role = request.POST.get('for_role', '')
         Announcement.objects.create(title=title, content=content, file=file, created_by=request.user, for_all=for_all, for_role=for_role)
         return HttpResponseRedirect(reverse('announcements_view'))
+    announcements = feed.get_feed(user_roles)
     return render(request, 'coaching/announcements.html', {'announcements': announcements, 'is_student': is_student})
 
 def edit_course(request, course_id):
@@ -349,9 +599,21 @@ def edit_course(request, course_id):
     if request.method == 'POST':
         name = request.POST.get('name')
         description = request.POST.get('description')
+        capacity = request.POST.get('capacity', '').strip()
+        if capacity and not capacity.isdigit():
+            messages.error(request, 'Capacity must be a whole number, or blank for unlimited seats.')
+            return render(request, 'coaching/edit_course.html', {'course': course})
         course.name = name
         course.description = description
-        course.save()
+        # Lowering it below seats_taken keeps current students; raising it promotes from the waitlist
+        course.capacity = int(capacity) if capacity else None
+        fields = ['name', 'description', 'capacity']
+        image = request.FILES.get('image')
+        if image:
+            course.image = image
+            fields.append('image')
+        # Not seats_taken: an enrollment may have moved it since the course was loaded
+        course.save(update_fields=fields)
         messages.success(request, 'Course updated successfully!')
         return redirect('course_list')
     return render(request, 'coaching/edit_course.html', {'course': course})
@@ -366,20 +628,35 @@ def delete_course(request, course_id):
         return redirect('course_list')
     return redirect('course_list')
 
+@require_POST
 def enroll_course(request, course_id):
     if not request.user.is_authenticated:
         messages.error(request, "You must be logged in to enroll in a course.")
         return redirect('course_list')
-    try:
-        student = Student.objects.get(email=request.user.email)
-        course = Course.objects.get(id=course_id)
-        if course not in student.enrolled_courses.all():
-            student.enrolled_courses.add(course)
-            messages.success(request, f"Enrolled in {course.name} successfully!")
-        else:
-            messages.info(request, f"You are already enrolled in {course.name}.")
-    except Student.DoesNotExist:
+    student = get_student(request)
+    if student is None:
         messages.error(request, "Student profile not found.")
-    except Course.DoesNotExist:
+        return redirect('course_list')
+    course = Course.objects.filter(id=course_id).first()
+    if course is None:
         messages.error(request, "Course not found.")
+    else:
+        _enroll(request, student, course)
+    return redirect('course_list')
+
+@require_POST
+@login_required
+def unenroll_course(request, course_id):
+    student = get_student(request)
+    course = get_object_or_404(Course, id=course_id)
+    if student is None:
+        messages.error(request, "Student profile not found.")
+        return redirect('course_list')
+    outcome = enrollment.unenroll(student, course)
+    if outcome == enrollment.UNENROLLED:
+        messages.success(request, f"You have left {course.name}.")
+    elif outcome == enrollment.LEFT_WAITLIST:
+        messages.success(request, f"You have left the waitlist for {course.name}.")
+    else:
+        messages.info(request, f"You are not enrolled in {course.name}.")
     return redirect('course_list')
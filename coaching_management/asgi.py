@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'coaching_management.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after setup: the event stream uses models and settings
+from coaching import events  # noqa: E402
+
+# /events/ is streamed by an async handler, so idle connections hold no worker thread
+application = events.route(django_application)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'coaching.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,16 +50,23 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'coaching.db.PinPrimaryMiddleware',
 ]
 
 ROOT_URLCONF = 'coaching_management.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'coaching.backends.templates.DjangoTemplates',  # Times renders for coaching.metrics
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Parse each template once per process; the dev server's autoreloader resets the cache on edits
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -74,13 +83,65 @@ WSGI_APPLICATION = 'coaching_management.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# coaching.backends.sqlite3 is Django's SQLite backend plus SQLITE_PRAGMAS and BEGIN IMMEDIATE
+# write transactions. Connections are kept for CONN_MAX_AGE seconds and checked before reuse.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'coaching.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DATABASE_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Optional read replica for list and dashboard views (coaching.db.read_from_replica). Any
+# database kept in sync with the primary works, e.g. a copy of db.sqlite3 maintained by
+# Litestream, or a Postgres streaming replica configured here with its own ENGINE.
+if os.environ.get('DATABASE_REPLICA'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA'],
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['coaching.db.ReplicaRouter']
+# Seconds a browser keeps reading from the primary after it wrote, to cover replication lag
+DATABASE_REPLICA_LAG = 5
+
+# Run on every new SQLite connection
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',  # Readers no longer block the writer or each other
+    'synchronous': 'normal',  # Durable with WAL; skips an fsync per commit
+    'busy_timeout': 5000,  # Milliseconds to wait for the write lock before "database is locked"
+    'cache_size': -20000,  # 20 MB page cache per connection
+    'temp_store': 'memory',
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/ref/settings/#caches
+
+# Cached roles, enrollments, dashboard counts and the announcement feed are invalidated by
+# whichever process writes the rows (a web worker, run_worker, import or seed commands), so
+# every process must share one cache; a per-process memory cache would keep serving revoked
+# roles and stale announcements. Files under CACHE_DIR are shared by all processes on this
+# host, like db.sqlite3 itself. Set REDIS_URL (needs the redis package) when serving from
+# several hosts.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_DIR') or BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
@@ -117,10 +178,59 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/4.1/howto/static-files/
 
 STATIC_URL = 'static/'
+# `manage.py collectstatic` writes content-hashed copies here, with .gz (and .br, if the
+# brotli package is installed) versions next to them. Without DEBUG, coaching.static_files
+# serves them with far-future caching; a front proxy may serve STATIC_ROOT directly instead.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_STORAGE = 'coaching.storage.CompressedManifestStaticFilesStorage'
+
+# login_required sends anonymous users to the home page, which links every role's login
+LOGIN_URL = 'home'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Uploaded files are served by coaching.views.serve_file after an access check.
+# Set to 'x-sendfile' (Apache, lighttpd) or 'x-accel-redirect' (nginx) to let the
+# front proxy send the bytes. For nginx, map the prefix to MEDIA_ROOT as internal:
+#   location /protected-media/ { internal; alias /path/to/media/; }
+MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE') or None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# Resumable uploads: parts are assembled here, then moved into MEDIA_ROOT.
+# Keep it on the same filesystem as MEDIA_ROOT so the final move is a rename.
+CHUNKED_UPLOAD_DIR = BASE_DIR / 'chunked_uploads'
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 8 * 1024 * 1024
+CHUNKED_UPLOAD_MAX_FILE_SIZE = 4 * 1024 * 1024 * 1024
+
+# Background jobs (coaching.jobs), run by `manage.py run_worker`.
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = 1.0  # Seconds an idle worker sleeps between polls
+JOB_RETRY_BACKOFF = 30  # Seconds before the first retry; doubles on each attempt
+JOB_HEARTBEAT_INTERVAL = 30  # Seconds between a running job's heartbeats
+# A running job with no heartbeat for this many seconds lost its worker; it is requeued, or failed
+# once it has used max_attempts
+JOB_HEARTBEAT_TIMEOUT = 5 * 60
+
+# Request metrics (coaching.metrics), scraped in Prometheus format from /metrics/.
+METRICS_ENABLED = True
+# Scrapers authenticate with "Authorization: Bearer <token>"; superusers may also view the page
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN') or None
+# With several worker processes, each writes its metrics here so any one can serve the totals
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5  # Seconds between a process's writes to METRICS_DIR
+# Log requests slower than this many milliseconds with their slowest SQL statements; None disables
+METRICS_SLOW_REQUEST_MS = int(os.environ['METRICS_SLOW_REQUEST_MS']) if os.environ.get('METRICS_SLOW_REQUEST_MS') else None
+METRICS_SLOW_SQL_COUNT = 5
+
+# Server-sent events (coaching.events), streamed from /events/ by the ASGI application.
+EVENTS_POLL_INTERVAL = 1.0  # Seconds between each process's checks for new events
+EVENTS_POLL_BATCH = 500  # Most events fetched per check
+EVENTS_HEARTBEAT = 15  # Seconds between keep-alive comments on an idle stream
+EVENTS_QUEUE_SIZE = 100  # Events buffered per connection before a slow client is dropped
+EVENTS_REPLAY_LIMIT = 500  # Most missed events sent to a reconnecting client
+EVENTS_RETENTION_DAYS = 2  # Default for `manage.py purge_events`
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -13,15 +13,23 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from coaching import static_files
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('coaching.urls')),
 ]
 
+# Only course images are public; every other upload goes through coaching.views.serve_file
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    urlpatterns += static(settings.MEDIA_URL + 'course_images/', document_root=settings.MEDIA_ROOT / 'course_images')
+else:
+    # The dev server serves static files itself under DEBUG; otherwise serve the collected, hashed copies
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % re.escape(settings.STATIC_URL.lstrip('/')), static_files.serve)]